@@ -1,6 +1,10 @@
-from . import commands
-from . import server
-from . import snmp
-from . import cli
-from . import requests
-from . import responses
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API lazy loading sub module
+:author: Ronan Delacroix
+"""
+import tbx.code
+tbx.code.lazy_load_module(__name__)
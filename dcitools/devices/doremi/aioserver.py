@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API asyncio Server class (Python 3 only)
+:author: Ronan Delacroix
+"""
+import time
+import asyncio
+import functools
+import logging
+from tbx.bytes import bytes_to_int, decode_ber
+from . import commands
+from . import requests
+from . import responses
+from .server import TIMEOUT
+from . import watcher
+from . import trace
+
+
+class AsyncDoremiServer:
+    """asyncio Doremi Server Class
+
+    Same commands as DoremiServer, but every command is a coroutine, so that many servers can be
+    polled from a single event loop :
+
+        server = await AsyncDoremiServer('172.17.10.109').connect()
+        cpl_list = await server.GetCPLList()
+
+    Commands sent to the same server are serialized on its connection.
+    """
+
+    def __init__(self, host, port=11730, debug=False, timeout=TIMEOUT):
+        """
+        Create the server object. Connection is made by the connect() coroutine.
+        """
+        self.host = host
+        self.port = port
+        self.debug = debug
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        # Created once, by the first command : commands waiting for it must still be serialized with those issued
+        # after a reconnection, and before Python 3.10 a lock is bound to the loop current at its creation.
+        self.lock = None
+
+    async def connect(self):
+        """
+        Connect to the server.
+        """
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        return self
+
+    async def command(self, key, *args, **kwargs):
+        """
+        Execute a command request response from a command key and command parameters.
+        """
+        request_definition = requests.get(key)
+        if not request_definition:
+            raise Exception("Request key %s is unknown" % key)
+        if not self.writer:
+            raise Exception("%s is not connected" % self)
+
+        request_bin = commands.construct_message(request_definition, *args, **kwargs)
+        request_id = commands.get_message_id(request_bin)
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            # Checked once the lock is held : a failed exchange of another command may have closed the connection.
+            if not self.writer:
+                raise Exception("%s is not connected" % self)
+            try:
+                response_definition, response_id, response_payload = await asyncio.wait_for(
+                    self._send_and_receive(request_bin), self.timeout
+                )
+                if response_id != request_id:
+                    raise Exception("Response ID %d received from %s does not match request ID %d" % (
+                        response_id, self, request_id))
+            except Exception:
+                # The stream position is unknown after a failed exchange, the connection can not be reused.
+                await self.close()
+                raise
+
+        if not response_definition or response_definition.name != request_definition.name:
+            raise Exception("Response received from %s does not answer a %s request" % (
+                self, request_definition.name))
+        return commands.parse_message(response_definition, response_payload)
+
+    async def _send_and_receive(self, request_bin):
+        """
+        Send a request and read the response KLV frame.
+
+        :return: a (response_definition, response_id, response_payload) tuple.
+        """
+        self.writer.write(request_bin)
+        await self.writer.drain()
+
+        if trace.recorder is not None:
+            trace.recorder.record(trace.SENT, self.host, self.port, commands.get_message_id(request_bin), request_bin)
+
+        if self.debug and commands.debug_enabled():
+            logging.debug("REQUEST SENT TO %s:%d : \n%s", self.host, self.port, commands.LazyExplanation(request_bin))
+
+        # Header (13), key (3) and first BER byte.
+        response_start = await self.reader.readexactly(17)
+        response_ber = response_start[16:17]
+        if response_ber[0] > 127:
+            response_ber += await self.reader.readexactly(response_ber[0] & 127)
+        response_payload_size, ber_size = decode_ber(response_ber)
+        response_id = await self.reader.readexactly(4)
+        response_payload = await self.reader.readexactly(response_payload_size - 4)
+
+        response_definition = responses.get_by_key(response_start[13:16])
+
+        if trace.recorder is not None or (self.debug and commands.debug_enabled()):
+            full_message = response_start[:16] + response_ber + response_id + response_payload
+            if trace.recorder is not None:
+                trace.recorder.record(trace.RECEIVED, self.host, self.port, bytes_to_int(response_id), full_message)
+            if self.debug and commands.debug_enabled():
+                result = response_payload[-1] if len(response_payload) > 0 else '---'
+                logging.debug("RESPONSE RECEIVE FROM %s:%d :\n RESPONSE %s %sResult : %s\n", self.host, self.port,
+                              response_definition.name if response_definition else '?',
+                              commands.LazyExplanation(full_message), result)
+
+        return response_definition, bytes_to_int(response_id), response_payload
+
+    async def close(self):
+        """
+        Close the connection.
+        """
+        writer, self.writer, self.reader = self.writer, None, None
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def __str__(self):
+        return "DCP2000@{}:{}".format(self.host, self.port)
+
+    def __getattr__(self, key):
+        """
+        Allows retrieval of awaitable command.
+        """
+        if key in requests.list_names():
+            return functools.partial(self.command, key)
+        else:
+            raise AttributeError(key)
+
+
+
+class AsyncPlaybackWatcher:
+    """asyncio Playback watcher
+
+    Same polling and change events as watcher.PlaybackWatcher, as an async iterator :
+
+        async for event in AsyncPlaybackWatcher(AsyncDoremiServer('172.17.10.109')):
+            print(event.kind, event.values)
+
+    The server is connected (and reconnected after failures) by the watcher.
+    """
+
+    def __init__(self, server, fast_interval=watcher.FAST_INTERVAL, slow_interval=watcher.SLOW_INTERVAL,
+                 schedule_interval=watcher.SCHEDULE_INTERVAL, jump_tolerance=watcher.JUMP_TOLERANCE,
+                 status_command=watcher.STATUS_COMMAND):
+        self.server = server
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.schedule_interval = schedule_interval
+        self.status_command = status_command
+        self.tracker = watcher.PlaybackTracker('%s:%s' % (server.host, server.port), jump_tolerance=jump_tolerance)
+        self.next_schedule_poll = 0
+
+    @property
+    def interval(self):
+        return self.fast_interval if self.tracker.playing else self.slow_interval
+
+    async def poll(self):
+        """
+        Poll the server once (the schedules only when due).
+
+        :return: the list of change events.
+        """
+        now = time.time()
+        try:
+            if not self.server.writer:
+                await self.server.connect()
+            args = (0, ) if self.status_command == 'StatusSPL2' else ()
+            events = self.tracker.update_status(await self.server.command(self.status_command, *args), now)
+            if events or now >= self.next_schedule_poll:
+                self.next_schedule_poll = now + self.schedule_interval
+                for command, event_class in (('GetCurrentSchedule', watcher.CurrentScheduleEvent),
+                                             ('GetNextSchedule', watcher.NextScheduleEvent)):
+                    schedule_id = (await self.server.command(command))['schedule_id']
+                    events += self.tracker.update_schedule(event_class, schedule_id, now)
+        except Exception as e:
+            logging.warning("Polling %s failed (%s)" % (self.server, e))
+            await self.server.close()
+            return self.tracker.update_error(e, now)
+        return events
+
+    async def __aiter__(self):
+        while True:
+            for event in await self.poll():
+                yield event
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    async def watch_many(watchers):
+        """
+        Merge the events of many watchers in a single async iterator.
+        """
+        queue = asyncio.Queue()
+
+        async def forward(w):
+            async for event in w:
+                await queue.put(event)
+
+        tasks = [asyncio.ensure_future(forward(w)) for w in watchers]
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Command response cache
+:author: Ronan Delacroix
+"""
+import collections
+import threading
+import time
+
+
+class CommandCache(object):
+    """
+    LRU cache of command responses.
+
+    Only successful responses of commands whose request definition has a `ttl` (in seconds) are cached, and
+    commands whose definition lists `invalidates` drop the cached responses of those commands on the same
+    server once executed.
+    Cached responses are shared between callers and should be treated as read only.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()  # key -> (expiry timestamp, result)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(command_call, args, kwargs):
+        return (
+            command_call.host,
+            command_call.port,
+            command_call.request_definition.name,
+            tuple(str(a) for a in args),
+            tuple(sorted((k, str(v)) for k, v in kwargs.items())),
+            tuple(sorted(command_call.decode_options.items())),
+        )
+
+    def get(self, key):
+        """
+        Cached result of a key, or None if missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.entries[key] = entry  # Most recently used go last.
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, result, ttl):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + ttl, result)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    @staticmethod
+    def successful(result):
+        """
+        False if the response code of a result is an error.
+        """
+        get = getattr(result, 'get', None)
+        return get is None or not get('response')
+
+    def invalidate(self, host=None, port=None, names=None):
+        """
+        Drop cached results, optionally only those of a server and/or of some command names.
+        """
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if host is not None and key[0] != host:
+                    continue
+                if port is not None and key[1] != port:
+                    continue
+                if names is not None and key[2] not in names:
+                    continue
+                del self.entries[key]
+
+    def call(self, command_call, args, kwargs):
+        """
+        Execute a command call through the cache.
+        """
+        definition = command_call.request_definition
+        if definition.ttl:
+            key = self.make_key(command_call, args, kwargs)
+            result = self.get(key)
+            if result is None:
+                result = command_call.send_and_receive(*args, **kwargs)
+                if self.successful(result):
+                    self.set(key, result, definition.ttl)
+            return result
+
+        result = command_call.send_and_receive(*args, **kwargs)
+        if definition.invalidates:
+            self.invalidate(command_call.host, command_call.port, definition.invalidates)
+        return result
+
+    def __len__(self):
+        return len(self.entries)
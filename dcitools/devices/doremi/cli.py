@@ -13,6 +13,7 @@ import shlex
 import tbx.text
 from . import server as server
 from . import requests
+from . import cache
 import six
 
 
@@ -22,7 +23,7 @@ class CLI(cmd.Cmd, object):
     intro = '\n<< Welcome to Doremi API CLI >>\n'
     doc_leader = '\n<<Doremi API CLI Help Section>>\n'
 
-    def __init__(self, address, port, debug=False, format='text'):
+    def __init__(self, address, port, debug=False, format='text', cache_size=0):
         """
         Constructor
         """
@@ -30,10 +31,7 @@ class CLI(cmd.Cmd, object):
         import readline
         import rlcompleter
         readline.parse_and_bind("set show-all-if-ambiguous on")
-        if six.PY3:
-            import importlib
-            importlib.reload(sys)
-        else:
+        if six.PY2:
             reload(sys)  ## So as to enable setdefaultencoding
         if 'libedit' in readline.__doc__:
             readline.parse_and_bind("bind ^I rl_complete")
@@ -47,6 +45,7 @@ class CLI(cmd.Cmd, object):
         self.debug = debug
         self.client = None
         self.format = format
+        self.cache = cache.CommandCache(max_size=cache_size) if cache_size else None
         super(CLI, self).__init__(completekey='tab')
 
     def preloop(self):
@@ -56,7 +55,7 @@ class CLI(cmd.Cmd, object):
 
         print("Connection...")
         try:
-            self.client = server.DoremiServer(self.address, port=self.port, debug=self.debug)
+            self.client = server.DoremiServer(self.address, port=self.port, debug=self.debug, cache=self.cache)
         except:
             print("Connection to %s:%s failed." % (self.address, self.port))
             self.do_exit('')
@@ -7,10 +7,13 @@ Doremi API Commands definition
 :author: Ronan Delacroix
 """
 import collections
+import struct
 from tbx.bytes import *
-from .message import MessageDefinition
+from .message import MessageDefinition, ResponseBatch, LazyTextDict, text_translations
 from . import requests
 from . import responses
+from . import metrics
+from . import trace
 import logging
 
 """
@@ -35,11 +38,17 @@ else:
     HEADER = str('060E2B340205010A0E10010101').decode('hex')
 
 REQUEST_ID = 0
+MAX_REQUEST_ID = 60000
+
+# Received payloads are given as memoryviews over the receive buffer where the element decoding functions accept them.
+# Python 2 memoryviews do not convert to bytes (bytes(view) gives its repr) and are indexed as strings : payloads are
+# copied to bytearrays there, indexed as integers like Python 3 bytes.
+PAYLOAD_VIEWS = six.PY3
 
 
 def get_new_request_id():
     global REQUEST_ID
-    REQUEST_ID = (REQUEST_ID + 1) % 60000
+    REQUEST_ID = (REQUEST_ID + 1) % MAX_REQUEST_ID
     return REQUEST_ID
 
 
@@ -47,6 +56,18 @@ def get_new_request_id_bytes():
     return int_to_bytes(get_new_request_id(), bit=32)
 
 
+def get_message_id(data):
+    """
+    Read the request ID stamped in a KLV message.
+
+    :param data: a full KLV message (header, key, ber, id and payload).
+    :return: the request ID as an integer.
+    """
+    ber, ber_size = decode_ber(data[16:])
+    id_start = 16 + ber_size
+    return bytes_to_int(data[id_start:id_start+4])
+
+
 def explain_klv(data):
     header_hex = bytes_to_hex(data[0:13])
     key_hex = bytes_to_hex(data[13:16])
@@ -79,22 +100,58 @@ def explain_klv(data):
     """.format(header_hex, key_hex, key_name, ber_hex, str(ber), id_hex, str(id), short_hex, (header_hex+key_hex+ber_hex+id_hex+short_hex))
 
 
-def parse_message(message, payload):
+class LazyExplanation(object):
+    """
+    Logging argument explaining a KLV frame only when the record is formatted.
+    """
+    __slots__ = ('data', )
+
+    def __init__(self, data):
+        # Copy : received frames are views over a reused buffer.
+        self.data = data.tobytes() if isinstance(data, memoryview) else bytes(data)
+
+    def __str__(self):
+        return explain_klv(self.data)
+
+
+def debug_enabled():
+    return logging.root.isEnabledFor(logging.DEBUG)
+
+
+def parse_message(message, payload, batch_mode=None, record=False, text_mode=None):
     """
     Parse a byte array and gives the data back in form of a dict.
 
     :param message: A MessageDefinitionObject
     :param payload: a bytes object of the message to read.
-    :return: an ordered dictionary of parsed data.
+    :param batch_mode: decoding mode of batch elements, 'list' by default (see ResponseBatch.decode).
+    :param record: return a slotted record (see MessageDefinition.record_class) instead of a dict.
+    :param text_mode: '_text' translations mode, 'eager' by default (see message.TEXT_MODES).
+    :return: an ordered dictionary (or record) of parsed data.
     """
-    result = collections.OrderedDict()
+    record_class = message.record_class if record else None
+    if message.decoder:
+        result = message.decoder(payload, batch_mode=batch_mode, record_class=record_class, text_mode=text_mode)
+        if result is not None:
+            return result
+
+    eager = not text_mode or text_mode == 'eager'
+    result = LazyTextDict(text_translations(message.elements)) if text_mode == 'lazy' else collections.OrderedDict()
     if message.elements:
         for elem in message.elements:
             payload_chunk = payload[elem.start:elem.end]
-            result[elem.name] = elem.func(payload_chunk)
+            if (batch_mode or text_mode) and isinstance(elem, ResponseBatch):
+                result[elem.name] = elem.decode(payload_chunk, batch_mode, text_mode)
+            else:
+                result[elem.name] = elem.func(payload_chunk)
             if elem.text_translate:
-                result[elem.name+'_text'] = elem.text_translate.get(result[elem.name], 'unknown value')
+                if eager:
+                    result[elem.name+'_text'] = elem.text_translate.get(result[elem.name], 'unknown value')
+                elif text_mode == 'lazy' and elem.enum:
+                    result[elem.name] = elem.enum.get(result[elem.name])
 
+    if record_class:
+        return record_class(**result)
     return result
 
 #Python 3 annotations provoke syntax error in Python 2... hence this seems the only way to do that for both... Ugly!
@@ -142,17 +199,84 @@ def construct_message(message, *args, **kwargs):
 construct_message.__annotations__ = {'message': MessageDefinition, 'return': bytearray}
 
 
+class FrameReader(object):
+    """
+    KLV frame reader filling a single reusable receive buffer.
+
+    Header, key and BER length are parsed in place from the buffer and the payload is given back as a memoryview,
+    so that large responses are not copied on their way to the decoder (copied on Python 2, see PAYLOAD_VIEWS).
+    """
+    def __init__(self, sock, buffer_size=4096):
+        self.sock = getattr(sock, 'sock', sock)  # tbx SocketClient or plain socket
+        self.buffer = bytearray(buffer_size)
+
+    def _fill(self, start, end):
+        """
+        Receive bytes from the socket into buffer[start:end], growing the buffer if needed.
+        """
+        if end > len(self.buffer):
+            # A new buffer is allocated rather than resized, as views of the previous frame may still be alive.
+            buffer = bytearray(max(end, 2 * len(self.buffer)))
+            buffer[:start] = self.buffer[:start]
+            self.buffer = buffer
+        view = memoryview(self.buffer)[start:end]
+        while len(view):
+            received = self.sock.recv_into(view)
+            if received == 0:
+                raise Exception('Error receiving data. %d bytes received' % (end - start - len(view)))
+            view = view[received:]
+
+    def read(self, timed=False):
+        """
+        Read one KLV frame.
+
+        Returned views are only valid until the next read.
+
+        :param timed: set header_time to the metrics clock once the frame header is received.
+        :return: a (key, request_id, payload, frame) tuple, payload and frame being memoryviews over the buffer
+                 (copies when PAYLOAD_VIEWS is False).
+        """
+        # Header (13), key (3) and first BER byte.
+        self._fill(0, 17)
+        if timed:
+            self.header_time = metrics.clock()
+        ber_size = 1
+        if self.buffer[16] > 127:
+            ber_size += self.buffer[16] & 127
+            self._fill(17, 16 + ber_size)
+        length, ber_size = decode_ber(self.buffer[16:16 + ber_size])
+        if length < 4:
+            raise Exception('Invalid KLV frame, payload length is %d' % length)
+
+        payload_start = 16 + ber_size
+        frame_end = payload_start + length
+        self._fill(payload_start, frame_end)
+
+        request_id = struct.unpack_from('>I', self.buffer, payload_start)[0]
+        key = bytes(self.buffer[13:16])
+        if not PAYLOAD_VIEWS:
+            return key, request_id, self.buffer[payload_start + 4:frame_end], self.buffer[:frame_end]
+        view = memoryview(self.buffer)
+        return key, request_id, view[payload_start + 4:frame_end], view[:frame_end]
+
+
 class CommandCall():
     """
     Command Call class.
 
     Represents a pair of request sent and response received.
     """
-    def __init__(self, sock, key_or_name, debug, host, port):
+    def __init__(self, sock, key_or_name, debug, host, port, reader=None, decode_options=None, cache=None):
         """
         Init function.
+
+        decode_options are keyword arguments given to parse_message (batch_mode...).
+        cache is an optional CommandCache the call goes through.
         """
         self.sock = sock
+        self.reader = reader
+        self.decode_options = decode_options or {}
+        self.cache = cache
         self.key_or_name = key_or_name
         try:
             self.request_definition = requests.get(key_or_name)
@@ -163,40 +287,101 @@ class CommandCall():
         self.debug = debug
         self.host = host
         self.port = port
+        self.request_id = None
+        self.sent_time = None
+
+    @property
+    def server_label(self):
+        return '%s:%s' % (self.host, self.port)
 
     def send(self, *args, **kwargs):
         """
         Send a command request with formatted parameters.
         """
+        hook = metrics.hook
+        if hook is not None:
+            start = metrics.clock()
         request_bin = construct_message(self.request_definition, *args, **kwargs)
+        self.request_id = get_message_id(request_bin)
+        if hook is not None:
+            constructed = metrics.clock()
 
         self.sock.send(request_bin)
 
-        if self.debug:
-            logging.debug("REQUEST SENT TO %s:%d : \n%s" % ( self.host, self.port, explain_klv(request_bin)))
+        recorder = trace.recorder
+        if recorder is not None:
+            recorder.record(trace.SENT, self.host, self.port, self.request_id, request_bin)
+
+        if hook is not None:
+            self.sent_time = metrics.clock()
+            name, server = self.request_definition.name, self.server_label
+            hook.observe('construct', name, server, constructed - start)
+            hook.observe('send', name, server, self.sent_time - constructed)
+            hook.count('bytes_out', name, server, len(request_bin))
+
+        if self.debug and debug_enabled():
+            logging.debug("REQUEST SENT TO %s:%d : \n%s", self.host, self.port, LazyExplanation(request_bin))
         return 0
 
-    def receive(self):
+    def receive_response(self):
         """
-        Receive and parse a command response.
+        Receive a command response without parsing it.
+
+        The payload is a memoryview over the receive buffer, only valid until the next response is received.
+
+        :return: a (response_definition, response_id, response_payload) tuple.
         """
-        response_header = self.sock.receive(13)
-        response_key = self.sock.receive(3)
-        response_payload_size, ber_size, response_ber = ber_from_socket(self.sock)
-        response_id = self.sock.receive(4)
-        response_payload = self.sock.receive(response_payload_size-4)
+        if self.reader is None:
+            self.reader = FrameReader(self.sock)
+        timed = metrics.hook is not None
+        frame = self.reader.read(timed=timed)
+        return self.accept_response(frame, self.reader.header_time if timed else None)
+
+    def accept_response(self, frame, header_time=None):
+        """
+        Record a response frame read for this call : metrics, trace and debug log.
+
+        Pipelined calls share the reader, so frames are read once and accepted by the call matching their
+        request ID.
+
+        :param frame: a (key, request_id, payload, frame) tuple given by FrameReader.read.
+        :param header_time: metrics clock when the frame header was received (None not to observe the frame).
+        :return: a (response_definition, response_id, response_payload) tuple.
+        """
+        response_key, response_id, response_payload, full_message = frame
+        hook = metrics.hook
+        if hook is not None and header_time is not None:
+            name, server = self.request_definition.name, self.server_label
+            hook.observe('wait', name, server, header_time - (self.sent_time or header_time))
+            hook.observe('read', name, server, metrics.clock() - header_time)
+            hook.count('bytes_in', name, server, len(full_message))
+
+        recorder = trace.recorder
+        if recorder is not None:
+            recorder.record(trace.RECEIVED, self.host, self.port, response_id, full_message)
 
         response_definition = responses.get_by_key(response_key)
 
-        if self.debug:
-            full_message = response_header+response_key+response_ber+response_id+response_payload
+        if self.debug and debug_enabled():
             result = response_payload[-1] if len(response_payload) > 0 else '---'
-            logging.debug("RESPONSE RECEIVE FROM %s:%d :\n RESPONSE %s %sResult : %s\n" % (
-                self.host, self.port,
-                response_definition.name, explain_klv(full_message), result
-            ))
+            logging.debug("RESPONSE RECEIVE FROM %s:%d :\n RESPONSE %s %sResult : %s\n", self.host, self.port,
+                          response_definition.name if response_definition else '?', LazyExplanation(full_message),
+                          result)
 
-        return parse_message(response_definition, response_payload)
+        return response_definition, response_id, response_payload
+
+    def receive(self):
+        """
+        Receive and parse a command response.
+        """
+        response_definition, response_id, response_payload = self.receive_response()
+        hook = metrics.hook
+        if hook is None:
+            return parse_message(response_definition, response_payload, **self.decode_options)
+        start = metrics.clock()
+        result = parse_message(response_definition, response_payload, **self.decode_options)
+        hook.observe('parse', self.request_definition.name, self.server_label, metrics.clock() - start)
+        return result
 
     def send_and_receive(self, *args, **kwargs):
         """
@@ -209,4 +394,14 @@ class CommandCall():
         """
          Callable object. Send a command request, receive and parse response.
         """
+        if metrics.hook is not None:
+            try:
+                if self.cache is not None:
+                    return self.cache.call(self, args, kwargs)
+                return self.send_and_receive(*args, **kwargs)
+            except Exception:
+                metrics.hook.count('errors', self.request_definition.name, self.server_label)
+                raise
+        if self.cache is not None:
+            return self.cache.call(self, args, kwargs)
         return self.send_and_receive(*args, **kwargs)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Daemon - warm server connections behind a local control socket
+:author: Ronan Delacroix
+"""
+import os
+import json
+import stat
+import socket
+import logging
+import tempfile
+import threading
+from six.moves import socketserver
+
+
+SOCKET_ENV = 'DOREMIAPI_SOCKET'
+CLIENT_TIMEOUT = 120
+
+
+def default_socket_path():
+    """
+    Control socket path : $DOREMIAPI_SOCKET, else doremiapi.sock in the user runtime (or temporary) directory.
+    """
+    if os.environ.get(SOCKET_ENV):
+        return os.environ[SOCKET_ENV]
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'doremiapi.sock')
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), 'doremiapi-%d.sock' % uid)
+
+
+def check_owner(path):
+    """
+    Refuse a control socket that is not a socket owned by the current user : in a shared directory, another
+    user could create it first and receive the forwarded commands.
+    """
+    if not hasattr(os, 'getuid'):
+        return
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise Exception("Refusing daemon socket %s : not a socket owned by uid %d" % (path, os.getuid()))
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Control connection : one JSON request per line, answered by one JSON response per line.
+
+    Requests are {"host", "port", "command", "args", "kwargs"} objects, or {"op": "ping"} and {"op": "shutdown"}.
+    Responses are {"status": "success", "result": ...} or {"status": "error", "message": ...} objects.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.daemon.dispatch(json.loads(line.decode('utf-8')))
+            except Exception as e:
+                response = {"status": "error", "message": str(e) or e.__class__.__name__}
+            self.wfile.write((self.server.daemon.encode(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+            if response.get("shutdown"):
+                self.server.daemon.stop(wait=False)
+                break
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DoremiDaemon(object):
+    """
+    Local daemon executing commands for short lived processes (doremiapi execute...).
+
+    Connections to Doremi servers stay open between commands (one ServerWorker per server, see worker.py), so
+    that a command costs a local socket round trip instead of a TCP connection and handshake.
+    The control socket is only accessible by the user running the daemon.
+    """
+
+    def __init__(self, path=None, debug=False, timeout=None):
+        from . import server
+        from . import worker
+        from .jsonencoder import MyJsonEncoder
+        self.path = path or default_socket_path()
+        self.debug = debug
+        self.encoder = MyJsonEncoder()
+        self.workers = worker.WorkerGroup(debug=debug, timeout=timeout or server.TIMEOUT)
+        self.server = None
+
+    def encode(self, response):
+        return self.encoder.encode(response)
+
+    def dispatch(self, request):
+        op = request.get("op", "command")
+        if op == "ping":
+            return {"status": "success", "result": "pong", "pid": os.getpid()}
+        if op == "shutdown":
+            return {"status": "success", "result": "stopping", "shutdown": True}
+        if op != "command":
+            raise Exception("Unknown operation %s" % op)
+        result = self.workers.command((request["host"], int(request["port"])), request["command"],
+                                      *request.get("args", []), **request.get("kwargs", {}))
+        return {"status": "success", "result": result}
+
+    def start(self):
+        """
+        Bind the control socket, removing the stale socket of a daemon that did not exit properly.
+        """
+        if os.path.exists(self.path):
+            with DaemonClient(self.path, timeout=5) as client:
+                if client.available():
+                    raise Exception("A daemon is already listening on %s" % self.path)
+            os.remove(self.path)
+        umask = os.umask(0o177)
+        try:
+            self.server = DaemonServer(self.path, DaemonHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, stat.S_IRUSR | stat.S_IWUSR)
+        self.server.daemon = self
+        return self
+
+    def serve_forever(self):
+        if self.server is None:
+            self.start()
+        logging.info("Doremi API daemon listening on %s" % self.path)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def stop(self, wait=True):
+        """
+        Stop serving. From a request handler thread, wait must be False (serve_forever is waiting for it).
+        """
+        if self.server is None:
+            return
+        if wait:
+            self.server.shutdown()
+        else:
+            threading.Thread(target=self.server.shutdown).start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.workers.close()
+
+
+class DaemonClient(object):
+    """
+    Client of a DoremiDaemon control socket.
+    """
+
+    def __init__(self, path=None, timeout=CLIENT_TIMEOUT):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+        self.sock = None
+        self.file = None
+
+    def connect(self):
+        check_owner(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        try:
+            self.sock.connect(self.path)
+        except Exception:
+            self.close()
+            raise
+        self.file = self.sock.makefile('rb')
+        return self
+
+    def available(self):
+        """
+        True if a daemon of the current user answers on the control socket.
+        """
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(self.path):
+            return False
+        try:
+            if self.sock is None:
+                self.connect()
+            return self.request({"op": "ping"})["status"] == "success"
+        except (socket.error, ValueError):
+            self.close()
+            return False
+        except Exception as e:
+            logging.warning(str(e))
+            self.close()
+            return False
+
+    def request(self, request):
+        self.sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        line = self.file.readline()
+        if not line:
+            raise socket.error("Connection to the daemon on %s closed" % self.path)
+        return json.loads(line.decode('utf-8'))
+
+    def command(self, host, port, key, *args, **kwargs):
+        """
+        Execute a command through the daemon.
+
+        :return: the JSON decoded result (uuids and dates as text...).
+        """
+        if self.sock is None:
+            self.connect()
+        response = self.request({"host": host, "port": port, "command": key, "args": args, "kwargs": kwargs})
+        if response["status"] != "success":
+            raise Exception(response.get("message"))
+        return response["result"]
+
+    def shutdown(self):
+        if self.sock is None:
+            self.connect()
+        return self.request({"op": "shutdown"})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
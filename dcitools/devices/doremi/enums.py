@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Enumerations - coded values of responses, with their text labels
+:author: Ronan Delacroix
+"""
+from enum import IntEnum
+
+
+UNKNOWN_TEXT = 'unknown value'
+
+
+class TextEnum(IntEnum):
+    """
+    Integer enumeration whose members carry the text label given by the Doremi API documentation.
+
+    Members compare (and serialize to JSON) as plain integers.
+    """
+
+    @property
+    def text(self):
+        return self.labels[self.value]
+
+    @classmethod
+    def get(cls, value):
+        """
+        Member of a value, or the value itself if it is not part of the enumeration.
+        """
+        return cls.members.get(value, value)
+
+    @classmethod
+    def get_text(cls, value):
+        return cls.labels.get(value, UNKNOWN_TEXT)
+
+
+def text_enum(name, members):
+    """
+    Create a TextEnum.
+
+    :param members: a list of (member name, value, text label) tuples.
+    """
+    enum = TextEnum(name, [(member, value) for member, value, label in members])
+    enum.labels = dict((value, label) for member, value, label in members)  # value -> label, as text_translate dicts
+    enum.members = dict(enum._value2member_map_)  # value -> member, for fast lookups while decoding
+    enum.__module__ = __name__
+    return enum
+
+
+Storage = text_enum('Storage', [
+    ('LOCAL', 1, 'local'),
+    ('REMOTE', 2, 'remote'),
+    ('LOCAL_REMOTE', 3, 'local+remote'),
+])
+
+ContentKind = text_enum('ContentKind', [
+    ('UNKNOWN', 0, 'Unknown'),
+    ('FEATURE', 1, 'Feature'),
+    ('TRAILER', 2, 'Trailer'),
+    ('TEST', 3, 'Test'),
+    ('TEASER', 4, 'Teaser'),
+    ('RATING', 5, 'Rating'),
+    ('ADVERTISEMENT', 6, 'Advertisement'),
+    ('SHORT', 7, 'Short'),
+    ('TRANSITIONAL', 8, 'Transitional'),
+    ('PSA', 9, 'PSA'),
+    ('POLICY', 10, 'Policy'),
+    ('LIVE_CPL', 128, 'Live CPL'),
+])
+
+Encoding = text_enum('Encoding', [
+    ('UNKNOWN', 0, 'Unknown'),
+    ('MPEG2', 1, 'MPEG2'),
+    ('JPEG2000', 2, 'JPEG2000'),
+    ('AUDIO_PCM', 3, 'Audio PCM'),
+])
+
+Encryption = text_enum('Encryption', [
+    ('NONE', 0, 'No Encryption'),
+    ('AES_128_CBC', 1, 'AES 128 CBC'),
+])
+
+Schema = text_enum('Schema', [
+    ('UNKNOWN', 0, 'Unknown'),
+    ('INTEROP', 1, 'Digicine (Interop)'),
+    ('SMPTE', 2, 'SMPTE'),
+])
+
+StreamType = text_enum('StreamType', [
+    ('NONE', 0, 'None'),
+    ('FTP_STREAM', 1, 'FTP Stream'),
+    ('FTP_STREAM_INGEST', 2, 'FTP Stream + Ingest'),
+])
+
+CPLValidationError = text_enum('CPLValidationError', [
+    ('NO_ERROR', 0, 'No Error nor warning'),
+    ('NOT_REGISTERED', 1, 'CPL is not registered on this server'),
+    ('PARTIALLY_REGISTERED', 2, 'CPL is partially registered on this server'),
+    ('CANNOT_BE_LOADED', 3, 'CPL is registered on this server but cannot be loaded'),
+    ('NO_KDM', 4, 'CPL requires at least one KDL to play; no KDM found'),
+    ('KDM_OUTDATED', 5, 'CPL requires at least one KDL to play; out-dated KDM found'),
+    ('KDM_WRONG_CERTIFICATE', 6, 'CPL requires at least one KDL to play; KDM built with a wrong certificate'),
+    ('KDM_REJECTED_RTC', 7, 'CPL requires at least one KDL to play; all KDM are rejected (the RTC is no longer secured)'),
+    ('KDM_REJECTED_FORBIDDEN', 8, 'CPL requires at least one KDL to play; all KDM are rejected (playback of protected content is forbidden)'),
+    ('KDM_INVALID_AUTHENTICATOR', 9, 'CPL requires at least one KDL to play; KDM with invalid content authenticator found'),
+    ('SIGNATURE_FAILED', 10, 'CPL signature check failed'),
+    ('OUT_OF_MEMORY', 255, 'Out of memory'),
+])
+
+SPLValidationError = text_enum('SPLValidationError', [
+    ('NO_ERROR', 0, 'No Error nor warning'),
+    ('NOT_REGISTERED', 1, 'SPL is not registered on this server'),
+    ('NOT_REGISTERED2', 2, 'SPL is not registered on this server'),
+    ('CANNOT_BE_LOADED', 3, 'SPL is registered on this server but cannot be loaded'),
+    ('OUT_OF_MEMORY', 255, 'Out of memory'),
+])
+
+PlaybackState = text_enum('PlaybackState', [
+    ('UNKNOWN', 0, 'Error/Unknown'),
+    ('STOP', 1, 'Stop'),
+    ('PLAY', 2, 'Play'),
+    ('PAUSE', 3, 'Pause'),
+])
+
+ScheduleStatus = text_enum('ScheduleStatus', [
+    ('RECORDED', 0, 'recorded'),
+    ('SUCCESS', 1, 'success'),
+    ('FAILED', 2, 'failed'),
+    ('FAILED_SHOW_RUNNING', 3, 'failed because a show was running'),
+])
+
+IngestStatus = text_enum('IngestStatus', [
+    ('PENDING', 0, 'pending'),
+    ('PAUSED', 1, 'paused'),
+    ('RUNNING', 2, 'running'),
+    ('SCHEDULED', 3, 'scheduled'),
+    ('SUCCESS', 4, 'success'),
+    ('ABORTED', 5, 'aborted'),
+    ('UNUSED', 6, 'unused'),
+    ('FAILED', 7, 'failed'),
+])
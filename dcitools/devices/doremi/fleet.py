@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Fleet execution - run a command on many servers at once
+:author: Ronan Delacroix
+"""
+import os
+import time
+import socket
+import threading
+import ipaddress
+import six
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import server
+from .pool import parse_address, DEFAULT_PORT
+
+
+WORKERS = 32
+HOST_TIMEOUT = 10
+
+
+def parse_hosts(spec):
+    """
+    List server addresses from a host specification.
+
+    :param spec: a file path (one address per line, '#' starts a comment), a CIDR range (172.17.10.0/24)
+                 or a comma separated list of addresses.
+    :return: a list of addresses.
+    """
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            lines = [line.split('#')[0].strip() for line in f]
+        return [line for line in lines if line]
+    if '/' in spec:
+        return [str(ip) for ip in ipaddress.ip_network(six.text_type(spec), strict=False).hosts()]
+    return [h.strip() for h in spec.split(',') if h.strip()]
+
+
+def _shutdown(srv, expired):
+    """
+    Shut the server connection down, waking up the thread blocked on it.
+    """
+    expired.set()
+    if srv.socket is not None:
+        try:
+            srv.socket.sock.shutdown(socket.SHUT_RDWR)
+        except (socket.error, OSError):
+            pass  # Not connected yet : the deadline is checked once connected.
+
+
+def execute_one(address, key, args=(), kwargs=None, port=DEFAULT_PORT, timeout=HOST_TIMEOUT, debug=False):
+    """
+    Execute a command on one server, never raising.
+
+    `timeout` is both the socket timeout and the deadline of the whole exchange with the server : a server
+    answering slowly, but never idle long enough for the socket to time out, is cut off once it expires.
+
+    :return: a result dict with host, port, status ("success" or "error"), result or message, and elapsed seconds.
+    """
+    host, port = parse_address(address, default_port=port)
+    record = {"host": host, "port": port, "command": key}
+    start = time.time()
+    srv = server.DoremiServer(host, port=port, debug=debug, timeout=timeout, bypass_connection=True)
+    expired = threading.Event()
+    deadline = threading.Timer(timeout, _shutdown, (srv, expired))
+    deadline.daemon = True
+    deadline.start()
+    try:
+        srv.connect()
+        if expired.is_set():
+            raise Exception("Deadline of %ss exceeded" % timeout)
+        record["result"] = srv.command(key, *args, **(kwargs or {}))
+        record["status"] = "success"
+    except Exception as e:
+        record["status"] = "error"
+        if expired.is_set():
+            record["message"] = "Deadline of %ss exceeded" % timeout
+        else:
+            record["message"] = str(e) or e.__class__.__name__
+    finally:
+        deadline.cancel()
+        srv.disconnect()
+    record["elapsed"] = round(time.time() - start, 3)
+    return record
+
+
+def execute(addresses, key, args=(), kwargs=None, port=DEFAULT_PORT, workers=WORKERS, timeout=HOST_TIMEOUT, debug=False):
+    """
+    Execute a command on many servers concurrently.
+
+    At most `workers` servers are contacted at once, and `timeout` applies to each server socket
+    (connection and every read) and to the whole exchange with each server (see execute_one),
+    independently from the global server TIMEOUT.
+
+    :return: a generator of result dicts (see execute_one), yielded as each server answers.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(execute_one, address, key, args, kwargs, port=port, timeout=timeout, debug=debug)
+            for address in addresses
+        ]
+        for future in as_completed(futures):
+            yield future.result()
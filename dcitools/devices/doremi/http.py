@@ -6,18 +6,23 @@
 Doremi DCP2000 CLI Only Utility - Main File
 :author: Ronan Delacroix
 """
-import sys
-import os
-import six
-import tbx.text
+import binascii
+import time
+import json
+import collections
 import logging
-from . import server as server
+from . import pool
+from . import cache
+from . import worker
+from . import fleet
+from . import metrics
 from . import requests
+from .jsonencoder import MyJsonEncoder
 import bottle
 from bottle import request
-from json import JSONEncoder
-from datetime import datetime
-import uuid
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+from six.moves.socketserver import ThreadingMixIn
+from concurrent.futures import as_completed
 
 
 def routeapp(app, obj):
@@ -39,31 +44,65 @@ def methodroute(route, method=None):
     return decorator
 
 
-class MyJsonEncoder(JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, str):
-            if six.PY2:
-                return obj.decode('unicode-escape').strip('\x00')
-            else:
-                return obj.strip('\x00')
-        if isinstance(obj, datetime):
-            return str(obj.strftime("%Y-%m-%d %H:%M:%S"))
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-        return JSONEncoder.default(self, obj)
+def render_metrics(registry):
+    """
+    /metrics page of a MetricsRegistry, in the Prometheus text format.
+    """
+    if registry is None:
+        bottle.response.status = 404
+        return 'Metrics are disabled.\n'
+    bottle.response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    return registry.render()
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class ThreadedWSGIRefServer(bottle.ServerAdapter):
+    """
+    Bottle server adapter : the standard library WSGI server, handling each HTTP request in its own thread.
+    """
+
+    def run(self, app):
+        if self.quiet:
+            class QuietHandler(WSGIRequestHandler):
+                def log_request(*args, **kw):
+                    pass
+            handler_class = QuietHandler
+        else:
+            handler_class = WSGIRequestHandler
+        self.srv = make_server(self.host, self.port, app, ThreadingWSGIServer, handler_class)
+        self.port = self.srv.server_port
+        self.srv.serve_forever()
+
+
+HTTP_SERVERS = {
+    'threaded': ThreadedWSGIRefServer,
+}
 
 
 class HTTPProxy(object):
-    def __init__(self, address, port, debug=False):
+    """
+    HTTP proxy of a Doremi server.
+
+    HTTP requests may be served concurrently : commands go through a ServerWorker, that serializes the access
+    to the Doremi socket and coalesces identical read commands in flight.
+    """
+
+    def __init__(self, address, port, debug=False, cache_size=0, enable_metrics=False):
         self.address = address
         self.port = port
         self.debug = debug
+        self.cache = cache.CommandCache(max_size=cache_size) if cache_size else None
+        self.metrics = metrics.install(metrics.MetricsRegistry()) if enable_metrics else None
+        self.worker = worker.ServerWorker(address, port, debug=debug, cache=self.cache)
         self.connect()
 
     def connect(self):
         print("Connection...")
         try:
-            self.client = server.DoremiServer(self.address, port=self.port, debug=self.debug)  #, bypass_connection=True)
+            self.worker.command(pool.HEALTH_CHECK_COMMAND)
         except:
             print("Connection to %s:%s failed." % (self.address, self.port))
             exit(1)
@@ -72,9 +111,13 @@ class HTTPProxy(object):
     @methodroute('/')
     def index(self):
         return {
-            'available_commands': requests.list_names()
+            'available_commands': list(requests.list_names())
         }
 
+    @methodroute('/metrics')
+    def metrics_page(self):
+        return render_metrics(self.metrics)
+
     @methodroute('/<command>', method='GET')
     def doc(self, command):
         key = None
@@ -86,7 +129,7 @@ class HTTPProxy(object):
             message = 'Unknown command name - "%s" not available' % command
         else:
             req = requests.get(command)
-            key = req.key.encode('hex')
+            key = binascii.hexlify(req.key).decode('ascii')
             parameters = [{"name": e.name, "type": e.func.__name__.replace('_to_bytes', '')} for e in req.elements]
             status = "success"
             message = "OK"
@@ -134,8 +177,142 @@ class HTTPProxy(object):
         Call an API command
         """
         try:
-            return (self.client.command(command, **kwargs), True)
+            return (self.worker.command(command, **kwargs), True)
         except Exception as e:
             logging.exception("Error while launching client.command")
             print("ERROR : %s" % e)
             return ("Error : %s" % e, False)
+
+
+class HTTPGateway(object):
+    """
+    HTTP gateway to many Doremi servers, in a single process.
+
+    Each server gets a ServerWorker (one persistent connection, created on first use) shared by all HTTP
+    requests, and named server groups can be targeted at once : the command is executed concurrently on
+    every server of the group, and the aggregated JSON document is streamed as servers answer.
+
+    Only the servers of the groups (and the extra servers given) can be reached : workers are never
+    evicted, so any other host is refused.
+    """
+
+    def __init__(self, groups=None, port=pool.DEFAULT_PORT, debug=False, cache_size=0, timeout=fleet.HOST_TIMEOUT,
+                 enable_metrics=False, servers=None):
+        """
+        :param groups: a dict of group name -> list of server addresses.
+        :param servers: extra server addresses reachable through /servers/<host>, outside of any group.
+        :param port: default port of the servers.
+        :param timeout: timeout (in seconds) of each server connection and read.
+        :param enable_metrics: collect command metrics, served on /metrics.
+        """
+        self.groups = dict(groups or {})
+        self.port = port
+        self.debug = debug
+        self.cache = cache.CommandCache(max_size=cache_size) if cache_size else None
+        self.metrics = metrics.install(metrics.MetricsRegistry()) if enable_metrics else None
+        self.workers = worker.WorkerGroup(debug=debug, timeout=timeout, cache=self.cache)
+        self.allowed = set(self.address(host) for hosts in self.groups.values() for host in hosts)
+        self.allowed.update(self.address(host) for host in servers or [])
+
+    def address(self, host):
+        return pool.parse_address(host, default_port=self.port)
+
+    @staticmethod
+    def payload():
+        if request.json:
+            return dict(request.json)
+        return dict(request.query)
+
+    @methodroute('/')
+    def index(self):
+        return {
+            'available_commands': list(requests.list_names()),
+            'groups': self.groups,
+        }
+
+    @methodroute('/metrics')
+    def metrics_page(self):
+        return render_metrics(self.metrics)
+
+    @methodroute('/servers')
+    def servers(self):
+        return {
+            'servers': ['%s:%d' % address for address in sorted(self.workers.workers.keys())],
+        }
+
+    @methodroute('/servers/<host>/<command>', method=['GET', 'POST'])
+    def server_request(self, host, command):
+        payload = self.payload()
+        response = {
+            "server": host,
+            "command": command,
+            "payload": payload,
+            "status": "error",
+            "result": None,
+        }
+        if not requests.get_by_name(command):
+            response["message"] = 'Unknown command name - "%s" not available' % command
+            return response
+        address = self.address(host)
+        if address not in self.allowed:
+            bottle.response.status = 404
+            response["message"] = 'Unknown server - "%s" not available' % host
+            return response
+        try:
+            response["result"] = self.workers.command(address, command, **payload)
+            response["status"] = "success"
+            response["message"] = "OK"
+        except Exception as e:
+            logging.exception("Error while executing %s on %s" % (command, host))
+            response["message"] = "Error : %s" % e
+        return response
+
+    @methodroute('/groups/<group>/<command>', method=['GET', 'POST'])
+    def group_request(self, group, command):
+        if group not in self.groups:
+            bottle.response.status = 404
+            return {"group": group, "command": command, "status": "error",
+                    "message": 'Unknown server group - "%s" not available' % group}
+        if not requests.get_by_name(command):
+            return {"group": group, "command": command, "status": "error",
+                    "message": 'Unknown command name - "%s" not available' % command}
+        bottle.response.content_type = 'application/json'
+        return self.stream_group(group, command, self.payload())
+
+    def stream_group(self, group, command, payload):
+        """
+        Execute a command on every server of a group, yielding the JSON document chunk by chunk.
+
+        Hosts of the group sharing a server (listed twice, or names of the same address) share a future, as
+        the server worker coalesces read commands : each host still gets its record.
+        """
+        start = time.time()
+        futures = collections.OrderedDict()  # future -> list of (address, submit timestamp)
+        servers = 0
+        for host in self.groups[group]:
+            address = self.address(host)
+            future = self.workers.submit(address, command, **payload)
+            futures.setdefault(future, []).append((address, time.time()))
+            servers += 1
+
+        yield '{"group": %s, "command": %s, "payload": %s, "results": [' % (
+            json.dumps(group), json.dumps(command), json.dumps(payload, cls=MyJsonEncoder))
+        errors = 0
+        first = True
+        for future in as_completed(futures):
+            for (host, port), submitted in futures[future]:
+                record = {"host": host, "port": port, "command": command}
+                try:
+                    record["result"] = future.result()
+                    record["status"] = "success"
+                except Exception as e:
+                    errors += 1
+                    record["status"] = "error"
+                    record["message"] = str(e) or e.__class__.__name__
+                record["elapsed"] = round(time.time() - submitted, 3)
+                yield ('\n' if first else ',\n') + json.dumps(record, cls=MyJsonEncoder)
+                first = False
+        yield '\n], "servers": %d, "errors": %d, "elapsed": %.3f}\n' % (servers, errors, time.time() - start)
+
+    def close(self):
+        self.workers.close()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API JSON encoder - serialization of command responses
+:author: Ronan Delacroix
+"""
+import six
+import uuid
+from json import JSONEncoder
+from datetime import datetime
+from .message import Record
+
+
+class MyJsonEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, str):
+            if six.PY2:
+                return obj.decode('unicode-escape').strip('\x00')
+            else:
+                return obj.strip('\x00')
+        if isinstance(obj, datetime):
+            return str(obj.strftime("%Y-%m-%d %H:%M:%S"))
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        if isinstance(obj, Record):
+            return obj._asdict()
+        return JSONEncoder.default(self, obj)
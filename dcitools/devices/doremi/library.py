@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Library synchronisation - incremental CPL/SPL/KDM index
+:author: Ronan Delacroix
+"""
+import os
+import json
+import time
+import sqlite3
+from dcitools.parsers.cpl import CPL
+from .jsonencoder import MyJsonEncoder
+
+
+# Content kind -> (list command, info command or None)
+LIBRARY_COMMANDS = {
+    'cpl': ('GetCPLList', 'GetCPLInfo2'),
+    'spl': ('GetSPLList', None),
+    'kdm': ('GetKDMList', 'GetKDMInfo'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    kind TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    info TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    removed REAL,
+    PRIMARY KEY (kind, uuid)
+);
+"""
+
+
+class LibraryIndex(object):
+    """
+    On disk SQLite index of a server content library.
+
+    Each CPL, SPL and KDM is stored with its info response (as JSON). Content no longer listed by the server
+    is not deleted but tombstoned (`removed` holds the time it disappeared).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    @classmethod
+    def for_server(cls, directory, host, port=11730):
+        """
+        Open the index of a server, stored in `directory`.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return cls(os.path.join(directory, '{}_{}.sqlite'.format(host, port)))
+
+    def uuids(self, kind, removed=False):
+        """
+        Set of indexed uuids of a content kind, either present on the server or tombstoned.
+        """
+        condition = 'removed IS NOT NULL' if removed else 'removed IS NULL'
+        rows = self.db.execute('SELECT uuid FROM content WHERE kind = ? AND ' + condition, (kind,))
+        return set(row[0] for row in rows)
+
+    def info(self, kind, uuid):
+        """
+        Indexed info of a content, or None if unknown.
+        """
+        row = self.db.execute('SELECT info FROM content WHERE kind = ? AND uuid = ?', (kind, str(uuid))).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def cpls(self):
+        """
+        CPL objects of the CPLs present on the server.
+        """
+        rows = self.db.execute("SELECT uuid, info FROM content WHERE kind = 'cpl' AND removed IS NULL ORDER BY uuid")
+        return [CPL(uuid=uuid).from_cpl_info(json.loads(info)) if info else CPL(uuid=uuid) for uuid, info in rows]
+
+    def add(self, kind, infos, now=None):
+        """
+        Index new content, or bring tombstoned content back.
+
+        :param infos: a dict of uuid -> info dict (or None).
+        """
+        now = now or time.time()
+        self.db.executemany(
+            'INSERT OR REPLACE INTO content (kind, uuid, info, first_seen, last_seen, removed) '
+            'VALUES (?, ?, ?, COALESCE((SELECT first_seen FROM content WHERE kind = ? AND uuid = ?), ?), ?, NULL)',
+            [(kind, uuid, json.dumps(info, cls=MyJsonEncoder) if info is not None else None, kind, uuid, now, now)
+             for uuid, info in infos.items()]
+        )
+
+    def touch(self, kind, uuids, now=None):
+        """
+        Update the last time content has been seen on the server.
+        """
+        now = now or time.time()
+        self.db.executemany('UPDATE content SET last_seen = ? WHERE kind = ? AND uuid = ?',
+                            [(now, kind, uuid) for uuid in uuids])
+
+    def remove(self, kind, uuids, now=None):
+        """
+        Tombstone content no longer present on the server.
+        """
+        now = now or time.time()
+        self.db.executemany('UPDATE content SET removed = ? WHERE kind = ? AND uuid = ?',
+                            [(now, kind, uuid) for uuid in uuids])
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class LibrarySync(object):
+    """
+    Incremental synchroniser of a server library with its LibraryIndex.
+
+    Every sync lists the content of the server and diffs it with the index : info commands are only sent
+    (pipelined on the server socket) for new uuids, and uuids no longer listed are tombstoned.
+    Once the index is up to date, a sync costs one list command per content kind.
+
+    A content kind whose list command fails is left untouched, and content whose info command fails is not
+    indexed, so that the next sync fetches it again.
+    """
+
+    def __init__(self, server, index):
+        self.server = server
+        self.index = index
+
+    def sync(self, kinds=('cpl', 'spl', 'kdm')):
+        """
+        Synchronise the index with the server.
+
+        :return: a dict of kind -> {"added": [uuids], "removed": [uuids], "failed": [uuids], "total": count},
+                 or kind -> {"error": message} when the list command failed.
+        """
+        report = {}
+        now = time.time()
+        for kind in kinds:
+            list_command, info_command = LIBRARY_COMMANDS[kind]
+            listing = self.server.command(list_command)
+            if listing.get('response'):
+                report[kind] = {"error": "%s failed with response code %s" % (list_command, listing['response'])}
+                continue
+            current = set(str(uuid) for uuid in listing['list'])
+            known = self.index.uuids(kind)
+            added = current - known
+            removed = known - current
+            failed = set()
+
+            infos = dict.fromkeys(added)
+            if info_command and added:
+                uuids = sorted(added)
+                responses = self.server.pipeline([(info_command, (uuid,)) for uuid in uuids])
+                infos = {}
+                for uuid, info in zip(uuids, responses):
+                    if info.get('response'):
+                        failed.add(uuid)
+                    else:
+                        infos[uuid] = info
+                added -= failed
+
+            self.index.add(kind, infos, now=now)
+            self.index.touch(kind, current - added - failed, now=now)
+            self.index.remove(kind, removed, now=now)
+            self.index.commit()
+
+            report[kind] = {"added": sorted(added), "removed": sorted(removed), "failed": sorted(failed),
+                            "total": len(current)}
+        return report
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Log harvesting - incremental GetLog with checkpoints
+:author: Ronan Delacroix
+"""
+import os
+import json
+import tempfile
+import six
+from lxml import etree
+
+
+LOG_WINDOW = 500  # Log IDs requested per GetLog command
+FEED_SIZE = 64 * 1024  # Characters of XML fed at once to the parser
+ID_FIELDS = ('EventSequence', 'RecordId', 'Id', 'id')
+
+
+def _localname(element):
+    return etree.QName(element).localname
+
+
+def parse_log_records(xml, feed_size=FEED_SIZE):
+    """
+    Parse a GetLog XML report incrementally.
+
+    Every child of the root element is a log record. Records are yielded as dicts mapping the local name of
+    their leaf elements to their text (the first occurrence wins), plus "record_type" (tag of the record) and
+    "id" (from the EventSequence field when present). Parsed elements are freed as soon as they are yielded.
+
+    :param xml: the XML text (or bytes) of a GetLog response.
+    :return: a generator of record dicts.
+    """
+    parser = etree.XMLPullParser(events=('start', 'end'), recover=True, huge_tree=True)
+    depth = 0
+    for offset in range(0, len(xml), feed_size):
+        parser.feed(xml[offset:offset + feed_size])
+        for event, element in parser.read_events():
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            yield _record(element)
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+    parser.close()
+
+
+def _record(element):
+    record = {"record_type": _localname(element)}
+    for child in element.iter():
+        if child is element or len(child) or not isinstance(child.tag, six.string_types):
+            continue
+        name = _localname(child)
+        if name not in record:
+            record[name] = (child.text or '').strip()
+    record["id"] = None
+    for field in ID_FIELDS:
+        value = record.get(field)
+        if value is not None and value.isdigit():
+            record["id"] = int(value)
+            break
+    return record
+
+
+class LogCheckpoint(object):
+    """
+    Last harvested log ID of each database of a server, persisted as JSON.
+
+    The file is rewritten atomically (temporary file then rename) so that a crash never leaves a truncated
+    checkpoint behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.last_ids = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.last_ids = json.load(f)
+
+    @classmethod
+    def for_server(cls, directory, host, port=11730):
+        """
+        Open the checkpoint of a server, stored in `directory`.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return cls(os.path.join(directory, '{}_{}.logs.json'.format(host, port)))
+
+    def get(self, database):
+        return self.last_ids.get(database, 0)
+
+    def set(self, database, last_id):
+        self.last_ids[database] = last_id
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.checkpoint', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.last_ids, f, indent=1, sort_keys=True)
+            if hasattr(os, 'replace'):
+                os.replace(tmp_path, self.path)
+            else:
+                os.rename(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+class LogHarvester(object):
+    """
+    Incremental log harvester of a server.
+
+    GetLogLastId tells how far the server log goes, then logs are fetched from the last checkpoint with
+    GetLog in windows of `window` IDs, so that memory stays bounded whatever the backlog size.
+    The checkpoint follows the records consumed by the caller : a record counts as consumed once the next one
+    is requested. The checkpoint is saved after each window and when the harvest generator is closed, so that
+    a new harvest resumes right after the last consumed record. The record held by the caller when the
+    generator is closed (crash or break) is harvested again.
+    """
+
+    def __init__(self, server, checkpoint, window=LOG_WINDOW):
+        self.server = server
+        self.checkpoint = checkpoint
+        self.window = window
+
+    def last_id(self, database):
+        return self.server.command('GetLogLastId', database)['last_id']
+
+    def harvest(self, database):
+        """
+        Harvest new log records of a database.
+
+        :return: a generator of record dicts (see parse_log_records).
+        """
+        last_id = self.last_id(database)
+        current = self.checkpoint.get(database)
+        try:
+            while current < last_id:
+                idmin = current + 1
+                idmax = min(last_id, current + self.window)
+                response = self.server.command('GetLog', database, idmin, idmax)
+                if response.get('errorcode'):
+                    raise Exception("GetLog %s [%d-%d] failed with error code %s" % (
+                        database, idmin, idmax, response['errorcode']))
+                records = parse_log_records(response['xml'])
+                del response
+                for record in records:
+                    consumed = record["id"] is not None and current < record["id"] <= idmax
+                    yield record
+                    if consumed:
+                        current = record["id"]
+                        self.checkpoint.set(database, current)
+                current = idmax
+                self.checkpoint.set(database, current)
+                self.checkpoint.save()
+        finally:
+            self.checkpoint.save()
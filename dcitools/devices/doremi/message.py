@@ -6,26 +6,253 @@
 Doremi API Requests definition
 :author: Ronan Delacroix
 """
+import collections
+import struct
 import six
 import tbx.bytes
+from .enums import TextEnum, UNKNOWN_TEXT
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+
+# struct codes of the unsigned big endian integers bytes_to_int can be replaced with, by byte size.
+INT_STRUCT_CODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+# struct.Struct.iter_unpack is Python 3 only : items are unpacked one by one with unpack_from otherwise.
+ITER_UNPACK = hasattr(struct.Struct, 'iter_unpack')
+
+# Decoding modes of ResponseBatch elements.
+BATCH_MODES = ('list', 'columns', 'rows', 'array', 'records')
+
+# Modes of '_text' translations of coded values :
+#   'eager' (default) adds a '<name>_text' entry next to each coded value,
+#   'lazy' gives TextEnum members instead of plain integers and resolves '<name>_text' only when accessed,
+#   'skip' gives plain integers and no translation at all.
+TEXT_MODES = ('eager', 'lazy', 'skip')
+
+
+class LazyTextDict(collections.OrderedDict):
+    """
+    Parsed message whose '_text' translations are resolved when accessed, instead of being stored.
+    """
+    __slots__ = ('translations',)
+
+    def __init__(self, translations):
+        super(LazyTextDict, self).__init__()
+        self.translations = translations  # text name -> (value name, text_translate dict)
+
+    def __missing__(self, key):
+        if key not in self.translations:
+            raise KeyError(key)
+        name, text_translate = self.translations[key]
+        return text_translate.get(self.get(name), UNKNOWN_TEXT)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        return collections.OrderedDict, (list(self.items()),)
+
+
+class Record(object):
+    """
+    Base class of the slotted response records generated from message definitions (see make_record_class).
+
+    Records are much smaller than dicts, and also support the read only dict interface (record['name'], keys(),
+    items(), get()...) so they can be used where parsed responses were dicts. Missing values read as None.
+    """
+    __slots__ = ()
+    _translations = {}  # text name -> (value name, text_translate dict), for translations decoded lazily
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Only called for unset slots : '_text' translations not stored by the 'lazy' text mode.
+        if name in self._translations:
+            value_name, text_translate = self._translations[name]
+            return text_translate.get(getattr(self, value_name, None), UNKNOWN_TEXT)
+        raise AttributeError(name)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def values(self):
+        return [getattr(self, name, None) for name in self.__slots__]
+
+    def items(self):
+        return [(name, getattr(self, name, None)) for name in self.__slots__]
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def _asdict(self):
+        return collections.OrderedDict(self.items())
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name, None)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other._asdict()
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % item for item in self.items()))
+
+
+def make_record_class(name, field_names, translations=None):
+    """
+    Create a Record subclass with one slot per field (duplicate names are merged).
+
+    :param translations: a dict of text name -> (value name, text_translate dict), see TEXT_MODES.
+    """
+    slots = []
+    for field in field_names:
+        if field not in slots:
+            slots.append(field)
+    return type(str(name), (Record,), {'__slots__': tuple(slots), '_translations': translations or {}})
+
+
+def text_translations(elements):
+    """
+    Dict of text name -> (value name, text_translate dict) of the translated elements.
+    """
+    return dict((e.name + '_text', (e.name, e.text_translate)) for e in elements if getattr(e, 'text_translate', None))
 
 
 class MessageDefinition(object):
     """
     Request Definition object.
     """
-    def __init__(self, name, key, elements=None):
+    def __init__(self, name, key, elements=None, ttl=None, invalidates=None, write=False):
+        """
+        :param ttl: seconds a response to this request may be cached (read only commands).
+        :param invalidates: names of the commands whose cached responses are outdated once this request is executed.
+        :param write: True for requests changing the server state (never cached nor coalesced).
+        """
         self.name = name
         if six.PY3:
             self.key = bytes.fromhex(key)
         else:
             self.key = str(key).decode('hex')
         self.elements = elements or [] #List of Element or ResponseElement
+        self.decoder = MessageDecoder.compile(self.elements)
+        self.ttl = ttl
+        self.invalidates = invalidates
+        self.write = write or bool(invalidates)
+        self._record_class = None
 
     @property
     def element_names(self):
         return [e.name for e in self.elements]
 
+    @property
+    def record_class(self):
+        """
+        Slotted Record class of the parsed message (one field per element, plus its '_text' translation).
+        """
+        if self._record_class is None:
+            names = []
+            for e in self.elements:
+                names.append(e.name)
+                if getattr(e, 'text_translate', None):
+                    names.append(e.name + '_text')
+            self._record_class = make_record_class(self.name + 'Record', names, text_translations(self.elements))
+        return self._record_class
+
+
+def compile_struct(group, origin, size=None):
+    """
+    Build a struct reading a group of response elements, with offsets relative to `origin`.
+
+    :param group: a list of (element index, element) tuples.
+    :param origin: offset added to element start and end (used for elements anchored to the end of the payload).
+    :param size: optional total size the struct is padded to.
+    :return: a (struct.Struct or None, [(element index, converter or None), ...], overlapping) tuple,
+             overlapping being the (index, element) tuples that could not be part of the struct.
+    """
+    position = 0
+    codes = []
+    fields = []
+    overlapping = []
+    for index, e in sorted(group, key=lambda f: f[1].start):
+        start = e.start + origin
+        end = (e.end if e.end is not None else 0) + origin
+        if start < position:
+            overlapping.append((index, e))
+            continue
+        if start > position:
+            codes.append('%dx' % (start - position))
+        width = end - start
+        if e.func is tbx.bytes.bytes_to_int and width in INT_STRUCT_CODES:
+            codes.append(INT_STRUCT_CODES[width])
+            fields.append((index, None))
+        elif e.func is tbx.bytes.bytes_to_bool and width == 1:
+            codes.append('?')
+            fields.append((index, None))
+        else:
+            codes.append('%ds' % width)
+            fields.append((index, e.func))
+        position = end
+    if size is not None and size > position:
+        codes.append('%dx' % (size - position))
+    if not fields:
+        return None, [], overlapping
+    return struct.Struct('>' + ''.join(codes)), fields, overlapping
+
+
+class BatchRows(Sequence):
+    """
+    Lazy row view over batch columns.
+
+    Rows are built as dicts when accessed, so that callers expecting a list of dicts can use columnar decoding.
+    """
+    def __init__(self, columns, translations=None):
+        """
+        :param translations: '_text' translations resolved when accessed (see LazyTextDict), for the 'lazy' text mode.
+        """
+        self.columns = columns
+        self.names = list(columns.keys())
+        self.length = len(columns[self.names[0]]) if self.names else 0
+        self.translations = translations
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.length))]
+        if self.translations:
+            row = LazyTextDict(self.translations)
+            row.update(zip(self.names, [column[i] for column in self.columns.values()]))
+            return row
+        return dict(zip(self.names, [column[i] for column in self.columns.values()]))
+
 
 class Element(object):
     """
@@ -42,12 +269,25 @@ class ResponseElement(Element):
     Response Message Element Definition
     """
     def __init__(self, name, start, end, func, text_translate=None):
+        """
+        :param text_translate: a TextEnum, or a dict of value -> text.
+        """
         self.name = name
         self.func = func
         self.start = start
         self.end = end
+        self.enum = None
+        if isinstance(text_translate, type) and issubclass(text_translate, TextEnum):
+            self.enum = text_translate
+            text_translate = text_translate.labels
         self.text_translate = text_translate
 
+    def members(self):
+        """
+        Dict of value -> TextEnum member used by the 'lazy' text mode (empty for dict translations).
+        """
+        return self.enum.members if self.enum else {}
+
 
 class ResponseBatch(Element):
     """
@@ -59,24 +299,238 @@ class ResponseBatch(Element):
         self.end = end
         self.sub_elements = sub_elements or []
         self.text_translate = None
+        self.column_names = []
+        for e in self.sub_elements:
+            self.column_names.append(e.name)
+            if e.text_translate:
+                self.column_names.append(e.name + '_text')
+        self.layouts = {}  # item size -> (item struct, fields)
+        self.dtypes = {}  # item size -> numpy dtype
+        self.translations = text_translations(self.sub_elements)
+        self.record_class = make_record_class(''.join(w.capitalize() for w in name.split('_')) + 'Record',
+                                              self.column_names, self.translations)
+        # (sub element, text name or None, lazy mode members) of each sub element, computed once.
+        self.item_fields = [(e, e.name + '_text' if e.text_translate else None, e.members() if e.text_translate else None)
+                            for e in self.sub_elements]
+
+    def decode(self, byte_array, mode=None, text_mode=None):
+        """
+        Decode a batch.
+
+        :param byte_array: the batch bytes (item count, item size and items).
+        :param mode: one of BATCH_MODES :
+            'list' (default) gives a list of dicts,
+            'columns' an ordered dict of value lists, one per sub element,
+            'rows' a lazy sequence of dicts built over the columns,
+            'array' a numpy structured array (values are not translated),
+            'records' a list of slotted records (see record_class).
+        :param text_mode: one of TEXT_MODES, for list, columns, rows and records modes.
+        """
+        if not mode or mode == 'list':
+            return self.func(byte_array, text_mode)
+        elif mode == 'columns':
+            return self.decode_columns(byte_array, text_mode)
+        elif mode == 'rows':
+            translations = self.translations if text_mode == 'lazy' else None
+            return BatchRows(self.decode_columns(byte_array, text_mode), translations)
+        elif mode == 'array':
+            return self.decode_array(byte_array)
+        elif mode == 'records':
+            record_class = self.record_class
+            columns = self.decode_columns(byte_array, text_mode)
+            if text_mode in ('lazy', 'skip'):
+                return [record_class(**dict(zip(columns.keys(), row))) for row in zip(*columns.values())]
+            return [record_class(*row) for row in zip(*columns.values())]
+        raise Exception("Unknown batch decoding mode '%s'. Available modes : %s" % (mode, ', '.join(BATCH_MODES)))
+
+    def _header(self, byte_array):
+        return tbx.bytes.bytes_to_int(byte_array[0:4]), tbx.bytes.bytes_to_int(byte_array[4:8])
+
+    def _item_layout(self, item_size):
+        """
+        Struct reading a whole item, compiled once per item size.
+        """
+        layout = self.layouts.get(item_size)
+        if layout is None:
+            layout = (None, [])
+            if item_size > 0 and all(e.end is not None and 0 <= e.start < e.end <= item_size for e in self.sub_elements):
+                item_struct, fields, overlapping = compile_struct(list(enumerate(self.sub_elements)), 0, size=item_size)
+                if not overlapping and len(fields) == len(self.sub_elements):
+                    layout = (item_struct, fields)
+            self.layouts[item_size] = layout
+        return layout
+
+    def decode_columns(self, byte_array, text_mode=None):
+        """
+        Decode a batch to an ordered dict of value lists, reading all items with struct.iter_unpack (see ITER_UNPACK).
+        """
+        length, item_size = self._header(byte_array)
+        items = byte_array[8:8 + length * item_size]
+        item_struct, fields = self._item_layout(item_size)
+        if item_struct is None or len(byte_array) < 8 or len(items) != length * item_size:
+            rows = self.func(byte_array, text_mode)
+            names = self.column_names if text_mode in (None, 'eager') else [e.name for e in self.sub_elements]
+            return collections.OrderedDict((name, [row[name] for row in rows]) for name in names)
+
+        values = [[] for e in self.sub_elements]
+        if length:
+            if ITER_UNPACK:
+                rows = item_struct.iter_unpack(items)
+            else:
+                rows = [item_struct.unpack_from(items, i * item_size) for i in range(length)]
+            for (index, convert), column in zip(fields, zip(*rows)):
+                values[index] = [convert(v) for v in column] if convert else list(column)
+
+        columns = collections.OrderedDict()
+        for (e, text_name, members), column in zip(self.item_fields, values):
+            if text_name and text_mode == 'lazy':
+                column = [members.get(v, v) for v in column] if members else column
+            columns[e.name] = column
+            if text_name and text_mode in (None, 'eager'):
+                columns[text_name] = [e.text_translate.get(v, UNKNOWN_TEXT) for v in column]
+        return columns
+
+    def decode_array(self, byte_array):
+        """
+        Decode a batch to a numpy structured array, with a dtype derived from the sub element offsets.
+        Integers are big endian unsigned fields, texts are bytes fields and other values raw void fields.
+        """
+        import numpy  # Optional dependency, only needed by this decoding mode.
+
+        length, item_size = self._header(byte_array)
+        dtype = self.dtypes.get(item_size)
+        if dtype is None:
+            formats = []
+            for e in self.sub_elements:
+                width = e.end - e.start
+                if e.func is tbx.bytes.bytes_to_int and width in INT_STRUCT_CODES:
+                    formats.append('>u%d' % width)
+                elif e.func is tbx.bytes.bytes_to_text:
+                    formats.append('S%d' % width)
+                else:
+                    formats.append('V%d' % width)
+            dtype = numpy.dtype({
+                'names': [e.name for e in self.sub_elements],
+                'formats': formats,
+                'offsets': [e.start for e in self.sub_elements],
+                'itemsize': item_size,
+            })
+            self.dtypes[item_size] = dtype
+        # Copy, as the payload may be a view over a reused receive buffer.
+        return numpy.frombuffer(byte_array, dtype=dtype, count=length, offset=8).copy()
 
-    def func(self, byte_array):
+    def func(self, byte_array, text_mode=None):
 
         result = []
         length = tbx.bytes.bytes_to_int(byte_array[0:4])
         item_size = tbx.bytes.bytes_to_int(byte_array[4:8])
+        eager = text_mode in (None, 'eager')
+        lazy = text_mode == 'lazy'
         for i in range(0, length):
-            item = {}
+            item = LazyTextDict(self.translations) if lazy and self.translations else {}
             chunk = byte_array[8+i*item_size:8+(i+1)*item_size]
-            for e in self.sub_elements:
-                sub_chunk = chunk[e.start:e.end]
-                item[e.name] = e.func(sub_chunk)
-                if e.text_translate:
-                    item[e.name+'_text'] = e.text_translate.get(item[e.name], 'unknown value')
+            for e, text_name, members in self.item_fields:
+                value = e.func(chunk[e.start:e.end])
+                if text_name and lazy and members:
+                    value = members.get(value, value)
+                item[e.name] = value
+                if text_name and eager:
+                    item[text_name] = e.text_translate.get(value, UNKNOWN_TEXT)
             result.append(item)
         return result
 
 
+class MessageDecoder(object):
+    """
+    Response payload decoder, compiled once from the elements of a response definition.
+
+    Elements at a fixed offset from the start of the payload are all read with a single struct.unpack_from call,
+    and so are the elements anchored to the end of the payload (negative offsets) once the payload size is known.
+    Elements of variable size (lists, texts up to the end, batches...) are decoded one by one.
+    """
+    def __init__(self, elements):
+        self.fields = [(e.name, e.name + '_text', e.text_translate, e.members() if e.text_translate else None)
+                       for e in elements]
+        self.translations = text_translations(elements)
+
+        head = []
+        tail = []
+        self.others = []
+        for index, e in enumerate(elements):
+            if not isinstance(e, ResponseBatch) and e.end is not None and 0 <= e.start < e.end:
+                head.append((index, e))
+            elif not isinstance(e, ResponseBatch) and e.start < 0 and (e.end is None or e.start < e.end < 0):
+                tail.append((index, e))
+            else:
+                self.others.append((index, e))
+
+        self.head, self.head_fields, overlapping = compile_struct(head, 0)
+        self.others.extend(overlapping)
+        self.tail_size = -min([e.start for i, e in tail]) if tail else 0
+        self.tail, self.tail_fields, overlapping = compile_struct(tail, self.tail_size)
+        self.others.extend(overlapping)
+        self.min_size = max(self.head.size if self.head else 0, self.tail_size)
+
+    @classmethod
+    def compile(cls, elements):
+        """
+        Compile a decoder for response elements.
+
+        :return: a MessageDecoder, or None if elements are not response elements.
+        """
+        if not elements or not all(isinstance(e, (ResponseElement, ResponseBatch)) for e in elements):
+            return None
+        return cls(elements)
+
+    def __call__(self, payload, batch_mode=None, record_class=None, text_mode=None):
+        """
+        Decode a payload.
+
+        :param batch_mode: decoding mode of batch elements (see ResponseBatch.decode).
+        :param text_mode: one of TEXT_MODES.
+        :param record_class: Record class to return instead of an ordered dictionary.
+        :return: an ordered dictionary (or record) of parsed data, or None if the payload is too short for this decoder.
+        """
+        size = len(payload)
+        if size < self.min_size:
+            return None
+
+        values = [None] * len(self.fields)
+        if self.head:
+            for (index, convert), value in zip(self.head_fields, self.head.unpack_from(payload, 0)):
+                values[index] = convert(value) if convert else value
+        if self.tail:
+            for (index, convert), value in zip(self.tail_fields, self.tail.unpack_from(payload, size - self.tail_size)):
+                values[index] = convert(value) if convert else value
+        for index, e in self.others:
+            if (batch_mode or text_mode) and isinstance(e, ResponseBatch):
+                values[index] = e.decode(payload[e.start:e.end], batch_mode, text_mode)
+            else:
+                values[index] = e.func(payload[e.start:e.end])
+
+        if not text_mode or text_mode == 'eager':
+            result = record_class() if record_class else collections.OrderedDict()
+            set_value = result.__setattr__ if record_class else result.__setitem__
+            for (name, text_name, text_translate, members), value in zip(self.fields, values):
+                set_value(name, value)
+                if text_translate:
+                    set_value(text_name, text_translate.get(value, UNKNOWN_TEXT))
+            return result
+
+        lazy = text_mode == 'lazy'
+        if record_class:
+            result = record_class()
+            set_value = result.__setattr__
+        else:
+            result = LazyTextDict(self.translations) if lazy and self.translations else collections.OrderedDict()
+            set_value = result.__setitem__
+        for (name, text_name, text_translate, members), value in zip(self.fields, values):
+            if lazy and members:
+                value = members.get(value, value)
+            set_value(name, value)
+        return result
+
+
 class MessageList(object):
     """
     Message class.
@@ -98,8 +552,8 @@ class MessageList(object):
         if isinstance(k, str):
             if six.PY3:
                 k = bytes.fromhex(k)
-            else:
-                k = k.encode('hex')
+            elif len(k) == 6:  # Python 2 str : hex text, or a raw 3 bytes key
+                k = k.decode('hex')
         return self.index_by_key.get(bytes(k), None)
 
     def get(self, key_or_name):
@@ -136,6 +590,6 @@ class MessageListWrapper(MessageList):
         Fall back on module to get attributes
         """
         try:
-            super(MessageListWrapper, self).__getattr__(name)
+            return super(MessageListWrapper, self).__getattr__(name)
         except AttributeError:
             return getattr(self.wrapped, name)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Metrics - command phase histograms and counters, in the Prometheus text format
+:author: Ronan Delacroix
+"""
+import time
+import bisect
+import threading
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+PHASES = ('connect', 'construct', 'send', 'wait', 'read', 'parse')
+COUNTERS = ('bytes_out', 'bytes_in', 'errors')
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+           5.0, 10.0, 30.0)
+
+hook = None  # Installed MetricsHook, read by command calls : None disables the instrumentation.
+
+
+def install(metrics_hook):
+    """
+    Install a hook receiving the metrics of every command call, and return it.
+    """
+    global hook
+    hook = metrics_hook
+    return metrics_hook
+
+
+def uninstall():
+    global hook
+    hook = None
+
+
+class MetricsHook(object):
+    """
+    Metrics hook interface. Implementations must be thread safe and fast : they are called in the command path.
+    """
+
+    def observe(self, phase, command, server, seconds):
+        """
+        Duration of a command phase (see PHASES). The command is an empty string for connections.
+        """
+        pass
+
+    def count(self, name, command, server, value=1):
+        """
+        Increment a counter (see COUNTERS). Errors of connections are counted for an empty command, and errors
+        of pipelines for the 'pipeline' command.
+        """
+        pass
+
+
+class Histogram(object):
+    """
+    Cumulative histogram with fixed buckets.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        (upper bound, cumulative count) pairs, the last bound being +Inf.
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'), ), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _labels(labels):
+    return ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry(MetricsHook):
+    """
+    In memory metrics, per phase, command and server.
+
+    Phase durations go to histograms and counters are plain integers. render() gives the Prometheus text
+    exposition format.
+    """
+
+    def __init__(self, buckets=BUCKETS, prefix='doremi'):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}  # (phase, command, server) -> Histogram
+        self.counters = {}  # (name, command, server) -> value
+
+    def observe(self, phase, command, server, seconds):
+        key = (phase, command, server)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, command, server, value=1):
+        key = (name, command, server)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def snapshot(self):
+        """
+        Copy of the metrics : a (histograms, counters) tuple of dicts.
+        """
+        with self.lock:
+            histograms = dict((k, (h.cumulative(), h.sum, h.count)) for k, h in self.histograms.items())
+            return histograms, dict(self.counters)
+
+    def render(self):
+        """
+        Metrics in the Prometheus text exposition format.
+        """
+        histograms, counters = self.snapshot()
+        name = '%s_command_phase_seconds' % self.prefix
+        lines = [
+            '# HELP %s Duration of command phases (%s).' % (name, ', '.join(PHASES)),
+            '# TYPE %s histogram' % name,
+        ]
+        for (phase, command, server), (cumulative, total, count) in sorted(histograms.items()):
+            labels = (('phase', phase), ('command', command), ('server', server))
+            for bound, value in cumulative:
+                lines.append('%s_bucket{%s} %d' % (name, _labels(labels + (('le', _number(bound)), )), value))
+            lines.append('%s_sum{%s} %s' % (name, _labels(labels), _number(total)))
+            lines.append('%s_count{%s} %d' % (name, _labels(labels), count))
+
+        for counter in sorted(set(COUNTERS) | set(key[0] for key in counters)):
+            name = '%s_%s_total' % (self.prefix, counter)
+            lines.append('# TYPE %s counter' % name)
+            for (counter_name, command, server), value in sorted(counters.items()):
+                if counter_name == counter:
+                    lines.append('%s{%s} %d' % (name, _labels((('command', command), ('server', server))), value))
+        return '\n'.join(lines) + '\n'
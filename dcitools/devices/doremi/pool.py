@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Connection Pool
+:author: Ronan Delacroix
+"""
+import contextlib
+import logging
+import socket
+import threading
+import time
+import six
+from . import requests
+from . import server
+
+
+DEFAULT_PORT = 11730
+HEALTH_CHECK_COMMAND = 'GetAPIProtocolVersion'
+
+
+def parse_address(address, default_port=DEFAULT_PORT):
+    """
+    Normalize a server address to a (host, port) tuple.
+
+    :param address: a host, a "host:port" string or a (host, port) tuple.
+    :return: a (host, port) tuple.
+    """
+    if isinstance(address, (tuple, list)):
+        return address[0], int(address[1])
+    host, sep, port = str(address).rpartition(':')
+    if sep and port.isdigit() and ':' not in host:
+        return host, int(port)
+    return str(address), int(default_port)
+
+
+def acquire(semaphore, timeout):
+    """
+    Acquire a semaphore, waiting at most `timeout` seconds (Python 2 semaphores have no timeout).
+    """
+    if six.PY3:
+        return semaphore.acquire(timeout=timeout)
+    deadline = time.time() + timeout
+    while not semaphore.acquire(False):
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class DoremiPool(object):
+    """
+    Pool of persistent connections to many Doremi servers, keyed by (host, port).
+
+    Connections are kept open between uses, health-checked when they have been idle for too long,
+    and at most `max_connections` sockets are opened to each server at once.
+    After a connection failure, new attempts to the same server are delayed with an exponential backoff
+    so that a network blip does not end up in a connect storm.
+    """
+
+    def __init__(self, max_connections=2, timeout=server.TIMEOUT, health_check_interval=60, retries=2,
+                 backoff=0.5, max_backoff=30, debug=False, cache=None):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.debug = debug
+        self.cache = cache  # Optional CommandCache shared by all connections
+
+        self.lock = threading.Lock()
+        self.slots = {}  # (host, port) -> semaphore capping concurrent sockets
+        self.idle = {}  # (host, port) -> list of (DoremiServer, last use timestamp)
+        self.failures = {}  # (host, port) -> (consecutive failure count, next attempt timestamp)
+
+    def _slots(self, address):
+        with self.lock:
+            if address not in self.slots:
+                self.slots[address] = threading.BoundedSemaphore(self.max_connections)
+            return self.slots[address]
+
+    def _connect(self, address):
+        """
+        Open a new connection to a server, honoring the backoff delay of previous failures.
+        """
+        with self.lock:
+            count, next_attempt = self.failures.get(address, (0, 0))
+        delay = next_attempt - time.time()
+        if delay > 0:
+            raise socket.error("Connection to %s:%d suspended for %.1fs after %d failures" % (
+                address[0], address[1], delay, count))
+
+        try:
+            srv = server.DoremiServer(address[0], port=address[1], debug=self.debug, timeout=self.timeout,
+                                      cache=self.cache)
+        except Exception:
+            count += 1
+            with self.lock:
+                self.failures[address] = (count, time.time() + self.backoff_delay(count))
+            raise
+
+        with self.lock:
+            self.failures.pop(address, None)
+        return srv
+
+    def backoff_delay(self, count):
+        """
+        Delay before the next connection attempt after `count` consecutive failures.
+        """
+        return min(self.max_backoff, self.backoff * (2 ** (count - 1)))
+
+    def _checkout(self, address):
+        """
+        Get a healthy connection from the idle list, or open a new one.
+
+        :return: a (DoremiServer, reused) tuple.
+        """
+        while True:
+            with self.lock:
+                idle = self.idle.get(address)
+                if not idle:
+                    break
+                srv, last_used = idle.pop()
+            if time.time() - last_used < self.health_check_interval:
+                return srv, True
+            try:
+                srv.command(HEALTH_CHECK_COMMAND)
+                return srv, True
+            except Exception as e:
+                logging.info("Dropping stale connection to %s (%s)" % (srv, e))
+                srv.disconnect()
+
+        return self._connect(address), False
+
+    def _checkin(self, address, srv):
+        with self.lock:
+            self.idle.setdefault(address, []).append((srv, time.time()))
+
+    @contextlib.contextmanager
+    def _lease(self, address):
+        """
+        Context manager lending a (DoremiServer, reused) tuple.
+        """
+        slots = self._slots(address)
+        if not acquire(slots, self.timeout):
+            raise socket.timeout("No connection available to %s:%d" % address)
+        try:
+            srv, reused = self._checkout(address)
+            try:
+                yield srv, reused
+            except Exception:
+                srv.disconnect()
+                raise
+            self._checkin(address, srv)
+        finally:
+            slots.release()
+
+    @contextlib.contextmanager
+    def connection(self, address):
+        """
+        Context manager lending a connected DoremiServer.
+
+        The connection goes back to the pool on exit, or is closed if an error occurred while it was in use.
+        """
+        with self._lease(parse_address(address)) as (srv, reused):
+            yield srv
+
+    def command(self, address, key, *args, **kwargs):
+        """
+        Execute a command on a server through a pooled connection.
+
+        When the connection fails (stale socket, connection reset, timeout...), the command is retried
+        on a new connection, up to `retries` times, waiting the backoff delay between attempts.
+        Write commands are only retried when the failure happened before their request was sent : the
+        server may have executed a request whose response was lost.
+        """
+        address = parse_address(address)
+        try:
+            write = requests.get(key).write
+        except Exception:
+            write = False  # Unknown commands fail in DoremiServer.command
+        attempt = 0
+        while True:
+            reused = False
+            sent = False
+            try:
+                with self._lease(address) as (srv, reused):
+                    sent = True
+                    return srv.command(key, *args, **kwargs)
+            except socket.error as e:
+                if write and sent:
+                    raise
+                error = e
+            except Exception as e:
+                # Other errors are only worth a retry when they come from a connection that sat in the pool.
+                if not reused or (write and sent):
+                    raise
+                error = e
+
+            attempt += 1
+            if attempt > self.retries:
+                raise error
+            delay = self.backoff_delay(attempt)
+            logging.warning("Command %s on %s:%d failed (%s), retrying in %.1fs" % (
+                key, address[0], address[1], error, delay))
+            time.sleep(delay)
+
+    def close(self, address=None):
+        """
+        Close idle connections, to one server or to all of them.
+        """
+        with self.lock:
+            if address is None:
+                idle = [c for conns in self.idle.values() for c in conns]
+                self.idle = {}
+            else:
+                idle = self.idle.pop(parse_address(address), [])
+        for srv, last_used in idle:
+            srv.disconnect()
+
+    def __str__(self):
+        return "DoremiPool ({} servers)".format(len(self.slots))
@@ -11,25 +11,35 @@ from tbx.bytes import *
 from .message import MessageListWrapper, MessageDefinition as M, Element as E
 
 
+# Cache time to live (seconds) of read only commands
+STATIC_TTL = 3600
+CONTENT_TTL = 600
+
+# Read only commands outdated by write commands
+CPL_READS = ('GetCPLList', 'GetCPLInfo', 'GetCPLInfo2', 'RetrieveCPL', 'GetCPLSize', 'GetCPLMarker')
+SPL_READS = ('GetSPLList', )
+SCHEDULE_READS = ('GetScheduleInfo2', 'GetCurrentSchedule', 'GetNextSchedule')
+
+
 REQUESTS = (
 
     # CPL
     M('GetCPLList', '010100'),
     M('GetCPLInfo', '010300', [
         E('uuid', uuid_to_bytes),
-    ]),
+    ], ttl=CONTENT_TTL),
     M('GetCPLInfo2', '010301', [
         E('uuid', uuid_to_bytes),
-    ]),
+    ], ttl=CONTENT_TTL),
     M('DeleteCPL', '010500', [
         E('uuid', uuid_to_bytes),
-    ]),
+    ], invalidates=CPL_READS),
     M('StoreCPL', '010900', [
         E('xml', text_to_bytes),
-    ]),
+    ], invalidates=CPL_READS),
     M('RetrieveCPL', '010700', [
         E('uuid', uuid_to_bytes),
-    ]),
+    ], ttl=CONTENT_TTL),
     M('ValidateCPL', '010B00', [
         E('uuid', uuid_to_bytes),
         E('time', text_to_bytes, size=32),
@@ -58,7 +68,7 @@ REQUESTS = (
     M('GetSPLList', '030100'),
     M('StoreSPL', '031F00', [
         E('xml', text_to_bytes),
-    ]),
+    ], invalidates=SPL_READS),
     M('ValidateSPL', '032500', [
         E('uuid', uuid_to_bytes),
         E('time', text_to_bytes, size=32),
@@ -66,37 +76,37 @@ REQUESTS = (
     ]),
     M('StatusSPL', '031B00'),  # BGI
     M('StatusSPL2', '031B01', [  # BGI
-        E('flags', int_to_bytes, size=4),  # Uint32 (4 bytes) : 0x00 0x00 0x00 0x00
+        E('flags', int_to_bytes, bit=32),  # Uint32 (4 bytes) : 0x00 0x00 0x00 0x00
     ]),
-    M('PlaySPL', '030B00'),  # BGI
-    M('PauseSPL', '030D00'),  # BGI
+    M('PlaySPL', '030B00', write=True),  # BGI
+    M('PauseSPL', '030D00', write=True),  # BGI
 
     # SCHEDULE
     M('AddSchedule2', '040101', [
         E('spl_id', uuid_to_bytes),
         E('time', text_to_bytes, size=32),
-        E('duration', int_to_bytes, size=32),
-        E('flags', int_to_bytes, size=64),
+        E('duration', int_to_bytes, bit=32),
+        E('flags', int_to_bytes, bit=64),
         E('annotation_text', text_to_bytes, size=128),
-    ]),
+    ], invalidates=SCHEDULE_READS),
     M('GetScheduleInfo2', '040701', [
-        E('id', uuid_to_bytes, size=64),
+        E('id', int_to_bytes, bit=64),  # schedule_id returned by AddSchedule2
     ]),
     M('GetCurrentSchedule', '040900'),
     M('GetNextSchedule', '040B00'),
     M('SetSchedulerEnable', '040D00', [
         E('enable', bool_to_bytes),
-    ]),
+    ], write=True),
     M('GetSchedulerEnable', '040F00'),
 
     # PRODUCT
-    M('GetProductInfo', '050100'),
-    M('GetTimeZone', '051F00'),  # BGI
+    M('GetProductInfo', '050100', ttl=STATIC_TTL),
+    M('GetTimeZone', '051F00', ttl=STATIC_TTL),  # BGI
     M('WhoAmI', '0E0B00'),  # BGI
     M('GetProductCertificate', '050300', [  # BGI
         E('type', int_to_bytes, bit=8),
-    ]),
-    M('GetAPIProtocolVersion', '050500'),  # BGI
+    ], ttl=STATIC_TTL),
+    M('GetAPIProtocolVersion', '050500'),  # BGI - Not cached : health check of pooled connections.
 
     # LOGS
     M('GetLog', '110100', [  # BGI
@@ -111,9 +121,9 @@ REQUESTS = (
     # INGEST
     M('IngestAddJob', '070F00', [
         E('xml', text_to_bytes),
-    ]),
+    ], write=True),
     M('IngestGetJobStatus', '071D00', [
-        E('job_id', int_to_bytes, size=64),
+        E('job_id', int_to_bytes, bit=64),
     ]),
 
 
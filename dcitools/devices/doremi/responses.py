@@ -9,6 +9,8 @@ Doremi API Requests definition
 import sys
 from tbx.bytes import *
 from .message import MessageListWrapper, MessageDefinition as M, ResponseElement as E, ResponseBatch as Batch
+from .enums import Storage, ContentKind, Encoding, Encryption, Schema, StreamType, CPLValidationError, \
+    SPLValidationError, PlaybackState, ScheduleStatus, IngestStatus
 
 
 RESPONSES = (
@@ -22,68 +24,42 @@ RESPONSES = (
     ]),
     M('GetCPLInfo', '010400', [
         E('cpl_uuid', 0, 16, bytes_to_uuid),
-        E('storage', 16, 17, bytes_to_int, {1: 'local', 2: 'remote', 3: 'local+remote'}),
+        E('storage', 16, 17, bytes_to_int, Storage),
         E('content_title_text', 17, 145, bytes_to_text),
-        E('content_kind', 145, 146, bytes_to_int, {
-            0: 'Unknown',
-            1: 'Feature',
-            2: 'Trailer',
-            3: 'Test',
-            4: 'Teaser',
-            5: 'Rating',
-            6: 'Advertisement',
-            7: 'Short',
-            8: 'Transitional',
-            9: 'PSA',
-            10: 'Policy',
-            128: 'Live CPL',
-        }),
+        E('content_kind', 145, 146, bytes_to_int, ContentKind),
         E('duration', 146, 150, bytes_to_int),
         E('edit_rate_a', 150, 154, bytes_to_int),
         E('edit_rate_b', 154, 158, bytes_to_int),
-        E('picture_encoding', 158, 159, bytes_to_int, {0: 'Unknown', 1: 'MPEG2', 2: 'JPEG2000', 3: 'Audio PCM'}),
+        E('picture_encoding', 158, 159, bytes_to_int, Encoding),
         E('picture_width', 159, 161, bytes_to_int),
         E('picture_height', 161, 163, bytes_to_int),
-        E('picture_encryption', 163, 164, bytes_to_int, {0: 'No Encryption', 1: 'AES 128 CBC'}),
-        E('sound_encoding', 164, 165, bytes_to_int, {0: 'Unknown', 1: 'MPEG2', 2: 'JPEG2000', 3: 'Audio PCM'}),
+        E('picture_encryption', 163, 164, bytes_to_int, Encryption),
+        E('sound_encoding', 164, 165, bytes_to_int, Encoding),
         E('sound_channel_count', 165, 166, bytes_to_int),
         E('sound_quantization_bits', 166, 167, bytes_to_int),
-        E('sound_encryption', 167, 168, bytes_to_int, {0: 'No Encryption', 1: 'AES 128 CBC'}),
+        E('sound_encryption', 167, 168, bytes_to_int, Encryption),
         E('crypto_key_id_list', 176, -1, bytes_to_uuid_list),
         E('response', -1, None, bytes_to_int),
     ]),
     M('GetCPLInfo2', '010401', [
         E('cpl_uuid', 0, 16, bytes_to_uuid),
-        E('storage', 16, 17, bytes_to_int, {1: 'local', 2: 'remote', 3: 'local+remote'}),
+        E('storage', 16, 17, bytes_to_int, Storage),
         E('content_title_text', 17, 145, bytes_to_text),
-        E('content_kind', 145, 146, bytes_to_int, {
-            0: 'Unknown',
-            1: 'Feature',
-            2: 'Trailer',
-            3: 'Test',
-            4: 'Teaser',
-            5: 'Rating',
-            6: 'Advertisement',
-            7: 'Short',
-            8: 'Transitional',
-            9: 'PSA',
-            10: 'Policy',
-            128: 'Live CPL',
-        }),
+        E('content_kind', 145, 146, bytes_to_int, ContentKind),
         E('duration', 146, 150, bytes_to_int),
         E('edit_rate_a', 150, 154, bytes_to_int),
         E('edit_rate_b', 154, 158, bytes_to_int),
-        E('picture_encoding', 158, 159, bytes_to_int, {0: 'Unknown', 1: 'MPEG2', 2: 'JPEG2000', 3: 'Audio PCM'}),
+        E('picture_encoding', 158, 159, bytes_to_int, Encoding),
         E('picture_width', 159, 161, bytes_to_int),
         E('picture_height', 161, 163, bytes_to_int),
-        E('picture_encryption', 163, 164, bytes_to_int, {0: 'No Encryption', 1: 'AES 128 CBC'}),
-        E('sound_encoding', 164, 165, bytes_to_int, {0: 'Unknown', 1: 'MPEG2', 2: 'JPEG2000', 3: 'Audio PCM'}),
+        E('picture_encryption', 163, 164, bytes_to_int, Encryption),
+        E('sound_encoding', 164, 165, bytes_to_int, Encoding),
         E('sound_channel_count', 165, 166, bytes_to_int),
         E('sound_quantization_bits', 166, 167, bytes_to_int),
-        E('sound_encryption', 167, 168, bytes_to_int, {0: 'No Encryption', 1: 'AES 128 CBC'}),
+        E('sound_encryption', 167, 168, bytes_to_int, Encryption),
         E('crypto_key_id_list', 176, -55, bytes_to_uuid_list),
-        E('schemas', -55, -54, bytes_to_int, {0: 'Unknown', 1: 'Digicine (Interop)', 2: 'SMPTE'}),
-        E('stream_type', -54, -53, bytes_to_int, {0: 'None', 1: 'FTP Stream', 2: 'FTP Stream + Ingest'}),
+        E('schemas', -55, -54, bytes_to_int, Schema),
+        E('stream_type', -54, -53, bytes_to_int, StreamType),
         E('complete', -53, -52, bytes_to_int),
         E('frame_per_edit', -52, -51, bytes_to_int),
         E('reserved2', -51, -49, bytes_to_int),
@@ -110,20 +86,7 @@ RESPONSES = (
     ]),
     M('ValidateCPL', '010C00', [
         E('result', 0, 1, bytes_to_int),
-        E('error_code', 1, 2, bytes_to_int, {
-            0: 'No Error nor warning',
-            1: 'CPL is not registered on this server',
-            2: 'CPL is partially registered on this server',
-            3: 'CPL is registered on this server but cannot be loaded',
-            4: 'CPL requires at least one KDL to play; no KDM found',
-            5: 'CPL requires at least one KDL to play; out-dated KDM found',
-            6: 'CPL requires at least one KDL to play; KDM built with a wrong certificate',
-            7: 'CPL requires at least one KDL to play; all KDM are rejected (the RTC is no longer secured)',
-            8: 'CPL requires at least one KDL to play; all KDM are rejected (playback of protected content is forbidden)',
-            9: 'CPL requires at least one KDL to play; KDM with invalid content authenticator found',
-            10: 'CPL signature check failed',
-            255: 'Out of memory',
-        }),
+        E('error_code', 1, 2, bytes_to_int, CPLValidationError),
         E('error_message', 2, -1, bytes_to_text),
         E('response', -1, None, bytes_to_int),
     ]),
@@ -215,14 +178,8 @@ RESPONSES = (
     ]),
     M('ValidateSPL', '032600', [
         E('result', 0, 1, bytes_to_int),
-        E('error_code', 1, 2, bytes_to_int, {
-            0: 'No Error nor warning',
-            1: 'SPL is not registered on this server',
-            2: 'SPL is not registered on this server',
-            3: 'SPL is registered on this server but cannot be loaded',
-            255: 'Out of memory',
-        }),
-        E('cpl_id', 2, 18, uuid_to_bytes),
+        E('error_code', 1, 2, bytes_to_int, SPLValidationError),
+        E('cpl_id', 2, 18, bytes_to_uuid),
         E('error_message', 18, -1, bytes_to_text),
         E('response', -1, None, bytes_to_int),
     ]),
@@ -233,7 +190,7 @@ RESPONSES = (
         E('response', -1, None, bytes_to_int),
     ]),
     M('StatusSPL', '031C00', [  # BGI
-        E('playblack_state', 0, 1, bytes_to_int, {0:'Error/Unknown', 1:'Stop', 2:'Play', 3:'Pause'} ),
+        E('playblack_state', 0, 1, bytes_to_int, PlaybackState),
         E('spl_id', 1, 17, bytes_to_uuid),
         E('show_playlist_position', 17, 21, bytes_to_int),
         E('show_playlist_duration', 21, 25, bytes_to_int),
@@ -245,7 +202,7 @@ RESPONSES = (
         E('response', -1, None, bytes_to_int),
     ]),
     M('StatusSPL2', '031C01', [  # BGI
-        E('playblack_state', 0, 1, bytes_to_int, {0:'Error/Unknown', 1:'Stop', 2:'Play', 3:'Pause'} ),
+        E('playblack_state', 0, 1, bytes_to_int, PlaybackState),
         E('spl_id', 1, 17, bytes_to_uuid),
         E('show_playlist_position', 17, 21, bytes_to_int),
         E('show_playlist_duration', 21, 25, bytes_to_int),
@@ -274,16 +231,11 @@ RESPONSES = (
     M('GetScheduleInfo2', '040801', [
         E('schedule_id', 0, 8, bytes_to_int),
         E('spl_id', 8, 24, bytes_to_uuid),
-        E('time', 24, 28, text_to_bytes, ),
-        E('duration', 28, 32, int_to_bytes, ),
-        E('status', 32, 33, int_to_bytes, {
-            0: 'recorded',
-            1: 'success',
-            2: 'failed',
-            3: 'failed because a show was running',
-        }),
-        E('flags', 33, 41, int_to_bytes),
-        E('annotation_text', 41, -1, text_to_bytes),
+        E('time', 24, 28, bytes_to_text),
+        E('duration', 28, 32, bytes_to_int),
+        E('status', 32, 33, bytes_to_int, ScheduleStatus),
+        E('flags', 33, 41, bytes_to_int),
+        E('annotation_text', 41, -1, bytes_to_text),
         E('response', -1, None, bytes_to_int),
     ]),
     M('GetCurrentSchedule', '040A00', [
@@ -335,16 +287,7 @@ RESPONSES = (
         E('error_count', 0, 4, bytes_to_int),
         E('warning_count', 4, 8, bytes_to_int),
         E('event_count', 8, 12, bytes_to_int),
-        E('status', 12, 16, bytes_to_int, {
-            0: 'pending',
-            1: 'paused',
-            2: 'running',
-            3: 'scheduled',
-            4: 'success',
-            5: 'aborted',
-            6: 'unused',
-            7: 'failed'
-        }),
+        E('status', 12, 16, bytes_to_int, IngestStatus),
         E('download_progress', 16, 20, bytes_to_int),
         E('process_progress', 20, 24, bytes_to_int),
         E('actions', 24, 28, bytes_to_int),
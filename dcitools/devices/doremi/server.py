@@ -8,10 +8,12 @@ Doremi API Server class
 """
 from . import commands
 from . import requests
+from . import metrics
 import tbx.network
 
 
 TIMEOUT = 30
+PIPELINE_WINDOW = 64
 
 
 class DoremiServer:
@@ -20,31 +22,155 @@ class DoremiServer:
     Handles sending and receiving commands through sockets.
     """
 
-    def __init__(self, host, port=11730, debug=False, bypass_connection=False):
+    def __init__(self, host, port=11730, debug=False, bypass_connection=False, timeout=TIMEOUT, decode_options=None,
+                 cache=None):
         """
         Create connection and connect to the server
+
+        decode_options are keyword arguments given to parse_message for every response (batch_mode...).
+        cache is an optional CommandCache, that can be shared between servers.
         """
         self.host = host
         self.port = port
         self.debug = debug
+        self.timeout = timeout
+        self.decode_options = decode_options or {}
+        self.cache = cache
+        self.socket = None
+        self.reader = None
 
         if not bypass_connection:
-            self.socket = tbx.network.SocketClient(host, port, timeout=TIMEOUT)
+            self.connect()
+
+    def connect(self):
+        """
+        Open the socket and connect to the server.
+        """
+        hook = metrics.hook
+        if hook is not None:
+            start = metrics.clock()
+        self.socket = tbx.network.SocketClient(self.host, self.port, timeout=self.timeout)
+        try:
             self.socket.connect()
-        else:
-            self.socket = None
+        except Exception:
+            if hook is not None:
+                hook.count('errors', '', '%s:%s' % (self.host, self.port))
+            raise
+        if hook is not None:
+            hook.observe('connect', '', '%s:%s' % (self.host, self.port), metrics.clock() - start)
+        self.reader = commands.FrameReader(self.socket)
+
+    def disconnect(self):
+        """
+        Close the socket, if any.
+        """
+        if self.socket:
+            self.socket.sock.close()
+        self.socket = None
+        self.reader = None
+
+    @property
+    def connected(self):
+        return self.socket is not None
 
     def command(self, key, *args, **kwargs):
         """
         Execute a command request response from a command key and command parameters.
+
+        The connection is opened again if a previous failure closed it.
         """
-        cc = commands.CommandCall(self.socket, key, self.debug, self.host, self.port)
+        cc = self._call(key)
         return cc(*args, **kwargs)
 
+    def pipeline(self, calls, window=PIPELINE_WINDOW):
+        """
+        Execute a batch of commands without waiting for each response before sending the next request.
+
+        Requests are written back to back on the socket (at most `window` of them awaiting a response) and
+        responses are matched to their request through the request ID stamped in each message.
+
+        :param calls: an iterable of command keys, (key, args) or (key, args, kwargs) tuples.
+        :param window: maximum number of requests sent and not yet answered.
+        :return: a list of parsed responses, in request order.
+
+        On any error, the connection is closed : the responses still pending would otherwise be read by the
+        next commands. The error is counted for the 'pipeline' command, as a wrong response ID can not be
+        told apart from the answer to another request of the batch.
+        """
+        calls = [self._normalize_call(call) for call in calls]
+        if not self.connected:
+            self.connect()
+        try:
+            return self._pipeline(calls, window)
+        except Exception:
+            if metrics.hook is not None:
+                metrics.hook.count('errors', 'pipeline', '%s:%s' % (self.host, self.port))
+            self.disconnect()
+            raise
+
+    def _pipeline(self, calls, window):
+        window = max(1, min(window, commands.MAX_REQUEST_ID // 2))
+        results = [None] * len(calls)
+        pending = {}
+        sent = 0
+        cc = None
+        for received in range(len(calls)):
+            while sent < len(calls) and len(pending) < window:
+                key, args, kwargs = calls[sent]
+                cc = self._call(key)
+                cc.send(*args, **kwargs)
+                pending[cc.request_id] = (sent, cc)
+                sent += 1
+
+            # The frame is read once, then accepted by its request call : metrics go to the matching command.
+            timed = metrics.hook is not None
+            frame = self.reader.read(timed=timed)
+            response_id = frame[1]
+            if response_id not in pending:
+                cc.accept_response(frame)  # traced and logged, but not observed for an unrelated command
+                raise Exception("Unexpected response ID %d received from %s (%d requests pending)" % (
+                    response_id, self, len(pending)))
+            index, request_call = pending.pop(response_id)
+            response_definition, response_id, response_payload = request_call.accept_response(
+                frame, self.reader.header_time if timed else None)
+            request_name = request_call.request_definition.name
+            if not response_definition or response_definition.name != request_name:
+                raise Exception("Response ID %d received from %s does not answer a %s request" % (
+                    response_id, self, request_name))
+            hook = metrics.hook
+            if hook is None:
+                results[index] = commands.parse_message(response_definition, response_payload, **self.decode_options)
+            else:
+                start = metrics.clock()
+                results[index] = commands.parse_message(response_definition, response_payload, **self.decode_options)
+                hook.observe('parse', request_name, request_call.server_label, metrics.clock() - start)
+            if self.cache is not None and request_call.request_definition.invalidates:
+                self.cache.invalidate(self.host, self.port, request_call.request_definition.invalidates)
+        return results
+
+    @staticmethod
+    def _normalize_call(call):
+        """
+        Normalize a pipeline call to a (key, args, kwargs) tuple.
+        """
+        if isinstance(call, (tuple, list)):
+            key = call[0]
+            args = tuple(call[1]) if len(call) > 1 else ()
+            kwargs = dict(call[2]) if len(call) > 2 else {}
+            return key, args, kwargs
+        return call, (), {}
+
+    def _call(self, key):
+        """
+        Create a command call bound to this server socket, connecting first if the socket is closed.
+        """
+        if not self.connected:
+            self.connect()
+        return commands.CommandCall(self.socket, key, self.debug, self.host, self.port, reader=self.reader,
+                                    decode_options=self.decode_options, cache=self.cache)
+
     def close(self):
-        self.TerminateTLS()
-        self.socket.close()
-        self.socket = None
+        self.disconnect()
 
     def __str__(self):
         return "DCP2000@{}:{}".format(self.host, self.port)
@@ -52,8 +178,10 @@ class DoremiServer:
     def __getattr__(self, key):
         """
         Allows retrieval of callable command.
+
+        As with command(), the connection is opened again if it was closed.
         """
         if key in requests.list_names():
-            return commands.CommandCall(self.socket, key, self.debug, self.host, self.port)
+            return self._call(key)
         else:
             raise AttributeError
\ No newline at end of file
@@ -0,0 +1,643 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi DCP2000 protocol simulator - stand-in server for load and regression testing
+:author: Ronan Delacroix
+"""
+import re
+import time
+import uuid
+import random
+import logging
+import threading
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+from tbx.bytes import *
+from .message import ResponseBatch
+from . import commands
+from . import requests
+from . import responses
+
+
+NULL_UUID = '00000000-0000-0000-0000-000000000000'
+
+# Fault name -> description. Probabilities are given per request, see DoremiSimulator.
+FAULTS = {
+    'disconnect': 'close the connection instead of answering',
+    'stall': 'do not answer for `stall_time` seconds, then close the connection',
+    'corrupt': 'answer with random bytes',
+    'wrong_id': 'answer with another request ID',
+    'error': 'answer with a non zero response code',
+}
+
+CONTENT_KINDS = (1, 2, 2, 2, 4, 6, 5, 9)  # Feature, Trailer (x3), Teaser, Advertisement, Rating, PSA
+
+
+def int_bytes(value, width):
+    """
+    Big endian unsigned encoding of an integer on any number of bytes.
+    """
+    value = int(value)
+    return bytes(bytearray((value >> (8 * (width - 1 - i))) & 255 for i in range(width)))
+
+
+def encode_element(element, value, width=None):
+    """
+    Encode a value of a response element (inverse of the element decoding function).
+
+    :param width: size of the encoded value, None for variable size elements.
+    """
+    if isinstance(element, ResponseBatch):
+        return encode_batch(element, value or [])
+    func = element.func
+    if func is bytes_to_int:
+        return int_bytes(value or 0, width if width is not None else 4)
+    if func is bytes_to_bool:
+        return b'\x01' if value else b'\x00'
+    if func is bytes_to_uuid:
+        return uuid.UUID(str(value or NULL_UUID)).bytes
+    if func is bytes_to_uuid_list:
+        return b''.join(uuid.UUID(str(u)).bytes for u in value or [])
+    if func is bytes_to_text:
+        data = value if isinstance(value, bytes) else (value or '').encode('utf-8')
+        return data.ljust(width, b'\x00')[:width] if width is not None else data
+    raise Exception("Can not encode response element %s" % element.name)
+
+
+def encode_batch(batch, rows):
+    """
+    Encode a list of dicts as a batch (item count, item size and items).
+    """
+    item_size = max([e.end for e in batch.sub_elements] or [0])
+    items = []
+    for row in rows:
+        item = bytearray(item_size)
+        for e in batch.sub_elements:
+            item[e.start:e.end] = encode_element(e, row.get(e.name), e.end - e.start)
+        items.append(bytes(item))
+    return int_bytes(len(rows), 4) + int_bytes(item_size, 4) + b''.join(items)
+
+
+def build_payload(definition, values):
+    """
+    Build a response payload matching the layout of a response definition.
+
+    Elements at positive offsets go to the head of the payload, elements at negative offsets to its tail, and the
+    variable size element (if any) in between.
+
+    :param values: a dict of element name -> value. Missing values are zeros, empty texts or null uuids.
+    """
+    head_size = 0
+    tail_size = 0
+    variable = None
+    for e in definition.elements:
+        if e.start >= 0 and e.end is not None and e.end >= 0:
+            head_size = max(head_size, e.end)
+        elif e.start >= 0:
+            variable = e
+            head_size = max(head_size, e.start)
+            tail_size = max(tail_size, -e.end if e.end is not None else 0)
+        else:
+            tail_size = max(tail_size, -e.start)
+
+    head = bytearray(head_size)
+    middle = b''
+    tail = bytearray(tail_size)
+    for e in definition.elements:
+        value = values.get(e.name)
+        if e is variable:
+            middle = encode_element(e, value)
+        elif e.start >= 0:
+            head[e.start:e.end] = encode_element(e, value, e.end - e.start)
+        else:
+            start = tail_size + e.start
+            end = tail_size + e.end if e.end is not None else tail_size
+            tail[start:end] = encode_element(e, value, end - start)
+    return bytes(head) + middle + bytes(tail)
+
+
+def decode_request(definition, payload):
+    """
+    Decode the parameters of a request payload (inverse of construct_message).
+
+    :return: a dict of element name -> value.
+    """
+    values = {}
+    position = 0
+    for e in definition.elements:
+        if e.func is uuid_to_bytes:
+            width = 16
+        elif e.func is int_to_bytes:
+            width = e.kwargs.get('bit', 32) // 8
+        elif e.func is bool_to_bytes:
+            width = 1
+        else:
+            width = e.kwargs.get('size') or (len(payload) - position)
+        chunk = payload[position:position + width]
+        position += width
+
+        if e.func is uuid_to_bytes:
+            values[e.name] = str(bytes_to_uuid(chunk))
+        elif e.func is int_to_bytes:
+            values[e.name] = bytes_to_int(chunk)
+        elif e.func is bool_to_bytes:
+            values[e.name] = bytes_to_bool(chunk)
+        else:
+            values[e.name] = bytes_to_text(chunk).strip('\x00')
+    return values
+
+
+def build_frame(key, request_id, payload):
+    """
+    Build a KLV response frame.
+    """
+    message = int_bytes(request_id, 4) + payload
+    return commands.HEADER + key + bytes(encode_ber(len(message))) + message
+
+
+class SimulatedLibrary(object):
+    """
+    Synthetic, deterministic content of a simulated server : CPLs, SPLs, KDMs, schedules and logs.
+    """
+
+    def __init__(self, size=50, seed=0):
+        rnd = random.Random(seed)
+        self.random = rnd
+        self.cpls = {}
+        for i in range(size):
+            cpl_uuid = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+            kind = CONTENT_KINDS[i % len(CONTENT_KINDS)]
+            encrypted = kind == 1
+            self.cpls[cpl_uuid] = {
+                'cpl_uuid': cpl_uuid,
+                'storage': 1,
+                'content_title_text': 'Simulated-%04d_%s_F_EN-XX_51_2K_SIM_20190101_SMPTE_OV' % (
+                    i, 'FTR' if kind == 1 else 'TLR'),
+                'content_kind': kind,
+                'duration': rnd.randint(30, 180) * 24 if kind != 1 else rnd.randint(80, 150) * 60 * 24,
+                'edit_rate_a': 24,
+                'edit_rate_b': 1,
+                'picture_encoding': 2,
+                'picture_width': 1998,
+                'picture_height': 1080,
+                'picture_encryption': 1 if encrypted else 0,
+                'sound_encoding': 3,
+                'sound_channel_count': 6,
+                'sound_quantization_bits': 24,
+                'sound_encryption': 1 if encrypted else 0,
+                'crypto_key_id_list': [str(uuid.UUID(int=rnd.getrandbits(128), version=4)) for k in range(2)] if encrypted else [],
+                'schemas': 2,
+                'complete': 1,
+                'frame_per_edit': 1,
+                'frame_rate_a': 24,
+                'frame_rate_b': 1,
+                'sound_sample_rate_a': 48000,
+                'sound_sample_rate_b': 1,
+                'sound_sampling_rate_a': 48000,
+                'sound_sampling_rate_b': 1,
+                'content_version_id': str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+            }
+        self.spls = {}
+        cpl_ids = sorted(self.cpls.keys())
+        for i in range(max(1, size // 10)):
+            spl_uuid = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+            self.spls[spl_uuid] = rnd.sample(cpl_ids, min(len(cpl_ids), 5))
+        self.kdms = {}
+        for cpl in self.cpls.values():
+            if cpl['crypto_key_id_list']:
+                kdm_uuid = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+                self.kdms[kdm_uuid] = cpl['cpl_uuid']
+        self.schedules = {}
+        self.log_last_id = {}
+
+    def cpl_xml(self, cpl_uuid):
+        """
+        Minimal SMPTE composition playlist of a CPL, with one reel per 10 minutes.
+        """
+        cpl = self.cpls[cpl_uuid]
+        rnd = random.Random(cpl_uuid)
+        reels = []
+        remaining = cpl['duration']
+        keys = cpl['crypto_key_id_list'] or [None, None]
+        while remaining > 0:
+            duration = min(remaining, 10 * 60 * 24)
+            remaining -= duration
+            assets = []
+            for tag, key_id in (('MainPicture', keys[0]), ('MainSound', keys[1])):
+                assets.append(
+                    '<%s><Id>urn:uuid:%s</Id><EditRate>24 1</EditRate><IntrinsicDuration>%d</IntrinsicDuration>'
+                    '<EntryPoint>0</EntryPoint><Duration>%d</Duration>%s</%s>' % (
+                        tag, uuid.UUID(int=rnd.getrandbits(128), version=4), duration, duration,
+                        '<KeyId>urn:uuid:%s</KeyId>' % key_id if key_id else '', tag))
+            reels.append('<Reel><Id>urn:uuid:%s</Id><AssetList>%s</AssetList></Reel>' % (
+                uuid.UUID(int=rnd.getrandbits(128), version=4), ''.join(assets)))
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<CompositionPlaylist xmlns="http://www.smpte-ra.org/schemas/429-7/2006/CPL">'
+            '<Id>urn:uuid:%s</Id><AnnotationText>%s</AnnotationText><IssueDate>2019-01-01T00:00:00+00:00</IssueDate>'
+            '<ContentTitleText>%s</ContentTitleText><ContentKind>%s</ContentKind>'
+            '<ContentVersion><Id>urn:uuid:%s</Id><LabelText>%s</LabelText></ContentVersion>'
+            '<ReelList>%s</ReelList></CompositionPlaylist>' % (
+                cpl_uuid, cpl['content_title_text'], cpl['content_title_text'],
+                responses.GetCPLInfo2.elements[3].text_translate.get(cpl['content_kind'], 'unknown').lower(),
+                cpl['content_version_id'], cpl['content_version_id'], ''.join(reels))
+        )
+
+    def log_xml(self, database, idmin, idmax):
+        """
+        Log records of a database between two IDs (included), in the SMPTE 430-4 log record layout.
+        """
+        last_id = self.log_last_id.setdefault(database, 1000)
+        records = []
+        for event_id in range(max(1, idmin), min(idmax, last_id) + 1):
+            records.append(
+                '<LogRecord><LogRecordHeader><EventSequence>%d</EventSequence>'
+                '<TimeStamp>2019-01-01T%02d:%02d:%02d+00:00</TimeStamp><EventClass>Playout</EventClass>'
+                '<EventType>Playback</EventType></LogRecordHeader><LogRecordBody><EventSubType>%s</EventSubType>'
+                '</LogRecordBody></LogRecord>' % (
+                    event_id, event_id // 3600 % 24, event_id // 60 % 60, event_id % 60,
+                    ('PlayoutStart', 'PlayoutEnd', 'FrameSequencePlayed')[event_id % 3]))
+        return '<?xml version="1.0" encoding="UTF-8"?><LogReport>%s</LogReport>' % ''.join(records)
+
+
+class SimulatedPlayback(object):
+    """
+    Playback state of a simulated server, advancing with wall clock time.
+    """
+
+    def __init__(self, library):
+        self.library = library
+        self.state = 1  # Stop
+        self.spl_id = NULL_UUID
+        self.position = 0.0  # seconds
+        self.started = None
+
+    @property
+    def current_position(self):
+        if self.state == 2:
+            return self.position + time.time() - self.started
+        return self.position
+
+    def play(self, spl_id=None):
+        if spl_id or self.spl_id == NULL_UUID:
+            self.spl_id = spl_id or sorted(self.library.spls.keys())[0]
+            self.position = 0.0
+        self.state = 2
+        self.started = time.time()
+
+    def pause(self):
+        self.position = self.current_position
+        self.state = 3
+
+    def status(self):
+        """
+        StatusSPL response values.
+        """
+        values = {'playblack_state': self.state, 'spl_id': self.spl_id}
+        cpl_ids = self.library.spls.get(self.spl_id, [])
+        cpls = [self.library.cpls[c] for c in cpl_ids if c in self.library.cpls]
+        if not cpls:
+            return values
+        durations = [c['duration'] // 24 for c in cpls]
+        position = int(self.current_position)
+        if position >= sum(durations):
+            self.state, self.position, position = 1, 0.0, 0
+        element_start = 0
+        for cpl, duration in zip(cpls, durations):
+            if position < element_start + duration:
+                break
+            element_start += duration
+        values.update({
+            'playblack_state': self.state,
+            'show_playlist_position': position,
+            'show_playlist_duration': sum(durations),
+            'current_cpl_id': cpl['cpl_uuid'],
+            'current_event_id': str(uuid.uuid5(uuid.NAMESPACE_OID, self.spl_id + cpl['cpl_uuid'])),
+            'current_element_id': cpl['cpl_uuid'],
+            'current_element_position': position - element_start,
+            'current_element_duration': duration,
+            'current_element_edit_rate_num': 24,
+            'current_element_edit_rate_den': 1,
+            'current_element_edit_position': (position - element_start) * 24,
+            'current_element_edit_duration': duration * 24,
+            'current_element_frames_per_edit': 1,
+        })
+        return values
+
+
+class SimulatorHandler(socketserver.BaseRequestHandler):
+    """
+    Connection handler : reads request frames and writes response frames until the client disconnects.
+    """
+
+    def handle(self):
+        simulator = self.server.simulator
+        simulator.connections.add(self.request)
+        reader = commands.FrameReader(self.request)
+        try:
+            while True:
+                try:
+                    key, request_id, payload, frame = reader.read()
+                except Exception:
+                    return
+                response = simulator.respond(key, request_id, bytes(payload))
+                if response is None:
+                    return
+                self.request.sendall(response)
+        finally:
+            simulator.connections.discard(self.request)
+
+
+class SimulatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class DoremiSimulator(object):
+    """
+    Stand-in DCP2000 server speaking the KLV protocol.
+
+    Every request of requests.REQUESTS gets a well formed response, built from the layout of responses.RESPONSES
+    and a synthetic library of `library_size` CPLs. Playback, schedules, CPL/SPL storage and logs are simulated.
+
+    Use :
+        simulator = DoremiSimulator(latency=0.005, jitter=0.002, faults={'disconnect': 0.01}).start()
+        server = DoremiServer(*simulator.address)
+
+    :param latency: seconds waited before each answer.
+    :param jitter: maximum random deviation (seconds) of the latency.
+    :param faults: a dict of fault name (see FAULTS) -> probability per request.
+    :param stall_time: duration of the 'stall' fault.
+    :param seed: seed of the synthetic library and of the random latency and faults.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, library_size=50, faults=None,
+                 stall_time=60, seed=0):
+        for fault in (faults or {}):
+            if fault not in FAULTS:
+                raise Exception("Unknown fault '%s'. Available faults : %s" % (fault, ', '.join(sorted(FAULTS))))
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = faults or {}
+        self.stall_time = stall_time
+        self.random = random.Random(seed)
+        self.library = SimulatedLibrary(size=library_size, seed=seed)
+        self.playback = SimulatedPlayback(self.library)
+        self.scheduler_enabled = True
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.requests_count = 0
+        self.server = SimulatorServer((host, port), SimulatorHandler, bind_and_activate=True)
+        self.server.simulator = self
+        self.thread = None
+
+    @property
+    def address(self):
+        """
+        (host, port) tuple the simulator listens on.
+        """
+        return self.server.server_address[:2]
+
+    def start(self):
+        """
+        Serve in a background thread.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name='DoremiSimulator')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in list(self.connections):
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _pick_fault(self):
+        for fault, probability in self.faults.items():
+            if self.random.random() < probability:
+                return fault
+        return None
+
+    def respond(self, key, request_id, payload):
+        """
+        Build the response frame of a request.
+
+        :return: the frame bytes, or None if the connection should be closed.
+        """
+        with self.lock:
+            self.requests_count += 1
+            fault = self._pick_fault()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)) if self.latency or self.jitter else 0
+
+        request_definition = requests.get_by_key(key)
+        if not request_definition:
+            logging.warning("Simulator : unknown request key %s" % bytes_to_hex(key))
+            return None
+        response_definition = responses.get_by_name(request_definition.name)
+        if not response_definition:
+            logging.warning("Simulator : no response definition for %s" % request_definition.name)
+            return None
+
+        if delay:
+            time.sleep(delay)
+        if fault == 'disconnect':
+            return None
+        if fault == 'stall':
+            time.sleep(self.stall_time)
+            return None
+
+        args = decode_request(request_definition, payload)
+        with self.lock:
+            values = getattr(self, 'respond_' + request_definition.name, lambda a: {})(args)
+        if fault == 'error':
+            values['response'] = 1
+        if fault == 'wrong_id':
+            # Half the ID space away : never the ID of another request pending in a pipeline window.
+            request_id = (request_id + commands.MAX_REQUEST_ID // 2) % commands.MAX_REQUEST_ID
+        frame = build_frame(response_definition.key, request_id, build_payload(response_definition, values))
+        if fault == 'corrupt':
+            frame = bytes(bytearray(self.random.getrandbits(8) for i in range(len(frame))))
+        return frame
+
+    # -- Responders : request name -> response values
+
+    def respond_GetCPLList(self, args):
+        return {'amount': len(self.library.cpls), 'item_length': 16, 'list': sorted(self.library.cpls.keys())}
+
+    def respond_GetSPLList(self, args):
+        return {'amount': len(self.library.spls), 'item_length': 16, 'list': sorted(self.library.spls.keys())}
+
+    def respond_GetKDMList(self, args):
+        return {'amount': len(self.library.kdms), 'item_length': 16, 'list': sorted(self.library.kdms.keys())}
+
+    def respond_GetCPLInfo2(self, args):
+        cpl = self.library.cpls.get(args['uuid'])
+        return dict(cpl) if cpl else {'response': 1}
+
+    respond_GetCPLInfo = respond_GetCPLInfo2
+
+    def respond_RetrieveCPL(self, args):
+        if args['uuid'] not in self.library.cpls:
+            return {'response': 1}
+        return {'xml': self.library.cpl_xml(args['uuid'])}
+
+    def respond_StoreCPL(self, args):
+        match = re.search(r'<Id>urn:uuid:([0-9a-fA-F-]{36})</Id>', args['xml'])
+        if not match:
+            return {'response': 1}
+        cpl_uuid = match.group(1).lower()
+        title = re.search(r'<ContentTitleText>(.*?)</ContentTitleText>', args['xml'])
+        self.library.cpls[cpl_uuid] = {'cpl_uuid': cpl_uuid, 'content_title_text': title.group(1) if title else '',
+                                       'edit_rate_a': 24, 'edit_rate_b': 1, 'crypto_key_id_list': []}
+        return {}
+
+    def respond_DeleteCPL(self, args):
+        return {'response': 0 if self.library.cpls.pop(args['uuid'], None) else 1}
+
+    def respond_GetCPLSize(self, args):
+        cpl = self.library.cpls.get(args['uuid'])
+        return {'size': cpl.get('duration', 0) * 1024 * 1024 // 10} if cpl else {'response': 1}
+
+    def respond_GetCPLMarker(self, args):
+        cpl = self.library.cpls.get(args['uuid'])
+        if not cpl:
+            return {'response': 1}
+        return {'markers': [{'label': 'FFOC', 'offset': 0}, {'label': 'LFOC', 'offset': cpl.get('duration', 1) - 1}]}
+
+    def respond_GetCPLPlayStat(self, args):
+        return {'markers': [
+            {'uuid': str(uuid.uuid5(uuid.NAMESPACE_OID, args['uuid'] + str(i))), 'last_play': '2019-01-%02dT20:00:00' % (i + 1)}
+            for i in range(3)
+        ]}
+
+    def respond_ValidateCPL(self, args):
+        return {'error_code': 0 if args['uuid'] in self.library.cpls else 1}
+
+    def respond_GetKDMInfo(self, args):
+        cpl_uuid = self.library.kdms.get(args['uuid'])
+        if not cpl_uuid:
+            return {'response': 1}
+        return {
+            'kdm_uuid': args['uuid'],
+            'cpl_uuid': cpl_uuid,
+            'not_valid_before': 1546300800,
+            'not_valid_after': 1893456000,
+            'key_id_list': self.library.cpls[cpl_uuid]['crypto_key_id_list'],
+        }
+
+    def respond_GetKDMInfo2(self, args):
+        values = self.respond_GetKDMInfo(args)
+        values['x509_subject_name'] = 'dnQualifier=SIMULATED,CN=SM.DCP2000.SIMULATED,O=Simulated'
+        return values
+
+    def respond_StoreSPL(self, args):
+        match = re.search(r'<Id>urn:uuid:([0-9a-fA-F-]{36})</Id>', args['xml'])
+        if not match:
+            return {'response': 1}
+        self.library.spls[match.group(1).lower()] = [
+            c.lower() for c in re.findall(r'<CompositionPlaylistI[dD]>urn:uuid:([0-9a-fA-F-]{36})<', args['xml'])]
+        return {}
+
+    def respond_ValidateSPL(self, args):
+        return {'error_code': 0 if args['uuid'] in self.library.spls else 1}
+
+    def respond_StatusSPL(self, args):
+        return self.playback.status()
+
+    respond_StatusSPL2 = respond_StatusSPL
+
+    def respond_PlaySPL(self, args):
+        if not self.library.spls:
+            return {'response': 1}
+        self.playback.play()
+        return {}
+
+    def respond_PauseSPL(self, args):
+        self.playback.pause()
+        return {}
+
+    def respond_AddSchedule2(self, args):
+        schedule_id = len(self.library.schedules) + 1
+        self.library.schedules[schedule_id] = args
+        return {'schedule_id': schedule_id}
+
+    def respond_GetScheduleInfo2(self, args):
+        schedule = self.library.schedules.get(args['id'])
+        if not schedule:
+            return {'response': 1}
+        return {
+            'schedule_id': args['id'],
+            'spl_id': schedule['spl_id'],
+            'duration': schedule['duration'],
+            'flags': schedule['flags'],
+            'annotation_text': schedule['annotation_text'],
+        }
+
+    def respond_GetCurrentSchedule(self, args):
+        return {'schedule_id': min(self.library.schedules.keys()) if self.library.schedules else 0}
+
+    def respond_GetNextSchedule(self, args):
+        return {'schedule_id': max(self.library.schedules.keys()) if self.library.schedules else 0}
+
+    def respond_SetSchedulerEnable(self, args):
+        self.scheduler_enabled = args['enable']
+        return {}
+
+    def respond_GetSchedulerEnable(self, args):
+        return {'response': self.scheduler_enabled}
+
+    def respond_GetProductInfo(self, args):
+        return {
+            'product_name': 'DCP2000',
+            'product_serial': 'SIM-%06d' % self.address[1],
+            'product_id': str(uuid.uuid5(uuid.NAMESPACE_OID, 'dcp2000-simulator')),
+            'software_version_major': 2,
+            'software_version_minor': 6,
+            'software_version_revision': 4,
+            'software_version_build': 1,
+            'hardware_version_major': 1,
+        }
+
+    def respond_GetProductCertificate(self, args):
+        return {'certificate': '-----BEGIN CERTIFICATE-----\nU0lNVUxBVEVE\n-----END CERTIFICATE-----\n'}
+
+    def respond_GetAPIProtocolVersion(self, args):
+        return {'version_major': 1, 'version_minor': 2, 'version_build': 0}
+
+    def respond_GetTimeZone(self, args):
+        return {'timezone': 'Europe/Paris'}
+
+    def respond_WhoAmI(self, args):
+        return {'username': 'admin', 'dci_level': 0}
+
+    def respond_GetLog(self, args):
+        return {'xml': self.library.log_xml(args['database'], args['idmin'], args['idmax'])}
+
+    def respond_GetLogLastId(self, args):
+        return {'errorcode': '\x00', 'last_id': self.library.log_last_id.setdefault(args['database'], 1000)}
+
+    def respond_IngestAddJob(self, args):
+        return {'job_id': 1}
+
+    def respond_IngestGetJobStatus(self, args):
+        return {'status': 4, 'download_progress': 100, 'process_progress': 100, 'title': 'Simulated ingest'}
+
+    def __str__(self):
+        return "DCP2000 Simulator@{}:{}".format(*self.address)
@@ -7,23 +7,51 @@ SNMP commands for DCP2000 Utility
 :author: Ronan Delacroix
 """
 import datetime
-from pysnmp.entity.rfc3413.oneliner import cmdgen
+import collections
 
+# pysnmp is imported on first use : it is long to load, and not needed to list the SNMP commands.
 
-def snmp_get(oid, ip_address):
+
+SNMP_PORT = 161
+COMMUNITY = 'public'
+MAX_REPETITIONS = 25  # Table rows requested per GETBULK
+
+_command_generator = None
+
+
+def command_generator():
+    """
+    Synchronous command generator, created once : its SNMP engine is reused by every call.
+    """
+    global _command_generator
+    if _command_generator is None:
+        from pysnmp.entity.rfc3413.oneliner import cmdgen
+        _command_generator = cmdgen.CommandGenerator()
+    return _command_generator
+
+
+def snmp_value(value):
+    """
+    Text of a varbind value, None for missing objects.
+    """
+    from pysnmp.proto.rfc1905 import NoSuchObject, NoSuchInstance, EndOfMibView
+    if isinstance(value, (NoSuchObject, NoSuchInstance, EndOfMibView)):
+        return None
+    return str(value)
+
+
+def snmp_get_many(oids, ip_address):
+    """
+    Get many OIDs of a server in a single multi-varbind GET request.
+
+    :return: the list of values (text), in OID order.
+    """
+    from pysnmp.entity.rfc3413.oneliner import cmdgen
     errorIndication, errorStatus, \
-    errorIndex, varBinds = cmdgen.CommandGenerator().getCmd(
-        # SNMP v1
-        # cmdgen.CommunityData('test-agent', 'public', 0),
-        # SNMP v2
-        cmdgen.CommunityData('test-agent', 'public'),
-        # SNMP v3
-        # cmdgen.UsmUserData('test-user', 'authkey1', 'privkey1'),
-        cmdgen.UdpTransportTarget((ip_address, 161)),
-        # Plain OID
-        oid,
-        # ((mib-name, mib-symbol), instance-id)
-        (('SNMPv2-MIB', 'sysObjectID'), 0)
+    errorIndex, varBinds = command_generator().getCmd(
+        cmdgen.CommunityData('test-agent', COMMUNITY),
+        cmdgen.UdpTransportTarget((ip_address, SNMP_PORT)),
+        *oids
     )
 
     if errorIndication:
@@ -32,8 +60,11 @@ def snmp_get(oid, ip_address):
         if errorStatus:
             raise Exception(errorStatus.prettyPrint() + ' at ' + errorIndex and varBinds[int(errorIndex) - 1] or '?')
 
-    return str(varBinds[0][1])
+    return [snmp_value(value) for name, value in varBinds]
+
 
+def snmp_get(oid, ip_address):
+    return snmp_get_many([oid], ip_address)[0]
 
 
 # -- Doremi OIDs
@@ -51,53 +82,84 @@ CURRENT_KDM_EXPIRY_OID = (1, 3, 6, 1, 4, 1, 24391, 1, 4, 1, 1, 5, 1)
 TEMP_INFORMATION_OID = (1, 3, 6, 1, 4, 1, 24391, 1, 3, 1)
 
 
+SCALAR_OIDS = collections.OrderedDict([
+    ('software', SOFTWARE_VERSION_OID),
+    ('firmware', FIRMWARE_VERSION_OID),
+    ('serial', SERIAL_NUMBER_OID),
+    ('date', SYSTEM_DATE_OID),
+    ('projector_vendor', PROJECTOR_VENDOR_OID),
+    ('projector_model', PROJECTOR_MODEL_OID),
+    ('kdm', CURRENT_KDM_OID),
+    ('kdm_expiry', CURRENT_KDM_EXPIRY_OID),
+])
+
+TABLE_OIDS = collections.OrderedDict([
+    ('RAID', RAID_INFORMATION_OID),
+    ('Temperature', TEMP_INFORMATION_OID),
+])
+
+BLANK_KDM = '00000000-0000-0000-0000-000000000000'
+
+
+def _projector(vendor, model):
+    return '%s - %s' % (vendor or "Unknown", model or "Unknown")
+
+
+def _kdm(kdm):
+    # -- Blank KDMs are returned when playing unencrypted content
+    if kdm and kdm != BLANK_KDM:
+        return kdm
+    else:
+        return None
+
+
+def _kdm_expiry(kdm, hours_remaining):
+    if hours_remaining and kdm != BLANK_KDM:
+        return datetime.datetime.now() + datetime.timedelta(hours=int(hours_remaining))
+    else:
+        return None
+
+
 def software_version(ip_address):
     """
     Returns the software version
     """
-    return str(snmp_get(SOFTWARE_VERSION_OID, ip_address))
+    return snmp_get(SOFTWARE_VERSION_OID, ip_address)
 
 
 def firmware_version(ip_address):
     """
     Returns the firmware version
     """
-    return str(snmp_get(FIRMWARE_VERSION_OID, ip_address))
+    return snmp_get(FIRMWARE_VERSION_OID, ip_address)
 
 
 def system_date(ip_address):
     """
     Returns the system time and date
     """
-    return str(snmp_get(SYSTEM_DATE_OID, ip_address))
+    return snmp_get(SYSTEM_DATE_OID, ip_address)
 
 
 def attached_projector_model(ip_address):
     """
     Returns the attached projector model
     """
-    vendor = str(snmp_get(PROJECTOR_VENDOR_OID, ip_address)) or "Unknown"
-    model = str(snmp_get(PROJECTOR_MODEL_OID, ip_address)) or "Unknown"
-    return '%s - %s' % (vendor, model)
+    return _projector(*snmp_get_many([PROJECTOR_VENDOR_OID, PROJECTOR_MODEL_OID], ip_address))
 
 
 def serial_number(ip_address):
     """
     Returns the attached projector model
     """
-    return str(snmp_get(SERIAL_NUMBER_OID, ip_address))
+    return snmp_get(SERIAL_NUMBER_OID, ip_address)
 
 
 def current_kdm(ip_address):
     """
     Returns the UUID of the currently active KDM
     """
-    kdm = snmp_get(CURRENT_KDM_OID, ip_address)
-    # -- Blank KDMs are returned when playing unencrypted content
-    if kdm and kdm != '00000000-0000-0000-0000-000000000000':
-        return kdm
-    else:
-        return None
+    return _kdm(snmp_get(CURRENT_KDM_OID, ip_address))
 
 
 def current_kdm_expiry(ip_address):
@@ -105,12 +167,7 @@ def current_kdm_expiry(ip_address):
     The number of remaining hours for the currently active KDM
     """
     # -- Need to get the KDM to check that is not a blank KDM
-    kdm = snmp_get(CURRENT_KDM_OID, ip_address)
-    hours_remaining = snmp_get(CURRENT_KDM_EXPIRY_OID, ip_address)
-    if hours_remaining and kdm != '00000000-0000-0000-0000-000000000000':
-        return datetime.datetime.now() + datetime.timedelta(hours=int(hours_remaining))
-    else:
-        return None
+    return _kdm_expiry(*snmp_get_many([CURRENT_KDM_OID, CURRENT_KDM_EXPIRY_OID], ip_address))
 
 
 SNMP_COMMANDS = {
@@ -121,4 +178,110 @@ SNMP_COMMANDS = {
         'Projector': attached_projector_model,
         'CurrentKDM':current_kdm,
         'CurrentKDMExpires': current_kdm_expiry,
-    }
\ No newline at end of file
+    }
+
+
+def interpret(values):
+    """
+    Results of every SNMP_COMMANDS entry, from the raw values of SCALAR_OIDS (None for missing objects).
+    """
+    return {
+        'Software': values['software'],
+        'Firmware': values['firmware'],
+        'Serial': values['serial'],
+        'Date': values['date'],
+        'Projector': _projector(values['projector_vendor'], values['projector_model']),
+        'CurrentKDM': _kdm(values['kdm']),
+        'CurrentKDMExpires': _kdm_expiry(values['kdm'], values['kdm_expiry']),
+    }
+
+
+def all_values(ip_address):
+    """
+    Results of every SNMP_COMMANDS entry, in a single GET request.
+    """
+    return interpret(dict(zip(SCALAR_OIDS.keys(), snmp_get_many(list(SCALAR_OIDS.values()), ip_address))))
+
+
+class SnmpPoller(object):
+    """
+    Poll many servers at once, from a single SNMP engine.
+
+    Each server gets one multi-varbind GET of every SCALAR_OIDS (and optionally a GETBULK walk of the RAID and
+    temperature tables). Requests to all servers are sent without waiting for answers, and the responses are
+    processed as they arrive by the engine dispatcher, so that polling a fleet takes about one timeout at most.
+    """
+
+    def __init__(self, community=COMMUNITY, port=SNMP_PORT, timeout=1, retries=2, max_repetitions=MAX_REPETITIONS):
+        from pysnmp import hlapi
+        from pysnmp.hlapi import asyncore
+        self.hlapi = hlapi
+        self.asyncore = asyncore
+        self.engine = hlapi.SnmpEngine()
+        self.auth = hlapi.CommunityData('test-agent', community)
+        self.context = hlapi.ContextData()
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.max_repetitions = max_repetitions
+        self.scalars = [hlapi.ObjectType(hlapi.ObjectIdentity(oid)) for oid in SCALAR_OIDS.values()]
+        self.tables = [hlapi.ObjectType(hlapi.ObjectIdentity(oid)) for oid in TABLE_OIDS.values()]
+
+    def _target(self, host):
+        return self.asyncore.UdpTransportTarget((host, self.port), timeout=self.timeout, retries=self.retries)
+
+    def poll(self, hosts, tables=False):
+        """
+        Poll servers.
+
+        :param hosts: server addresses.
+        :param tables: also walk the RAID and temperature tables.
+        :return: an ordered dict of host -> result dict, with SNMP_COMMANDS results, "RAID" and "Temperature"
+                 tables (dicts of row index -> column number -> value) when requested, and "error" when the
+                 server did not answer properly.
+        """
+        results = collections.OrderedDict()
+        for host in hosts:
+            result = results[host] = {"host": host}
+            target = self._target(host)
+            self.asyncore.getCmd(self.engine, self.auth, target, self.context, *self.scalars,
+                                 cbFun=self._on_get, cbCtx=result, lookupMib=False)
+            if tables:
+                for name in TABLE_OIDS:
+                    result[name] = {}
+                self.asyncore.bulkCmd(self.engine, self.auth, target, self.context, 0, self.max_repetitions,
+                                      *self.tables, cbFun=self._on_bulk, cbCtx=result, lookupMib=False)
+        self.engine.transportDispatcher.runDispatcher()
+        return results
+
+    @staticmethod
+    def _error(result, errorIndication, errorStatus, errorIndex, varBinds):
+        if errorIndication:
+            result["error"] = str(errorIndication)
+        elif errorStatus:
+            result["error"] = '%s at %s' % (errorStatus.prettyPrint(),
+                                            errorIndex and varBinds[int(errorIndex) - 1][0] or '?')
+        else:
+            return False
+        return True
+
+    def _on_get(self, engine, handle, errorIndication, errorStatus, errorIndex, varBinds, result):
+        if self._error(result, errorIndication, errorStatus, errorIndex, varBinds):
+            return
+        result.update(interpret(dict(zip(SCALAR_OIDS.keys(), [snmp_value(value) for name, value in varBinds]))))
+
+    def _on_bulk(self, engine, handle, errorIndication, errorStatus, errorIndex, varBindTable, result):
+        if self._error(result, errorIndication, errorStatus, errorIndex, varBindTable and varBindTable[0]):
+            return False
+        from pysnmp.proto.rfc1905 import EndOfMibView
+        walking = False
+        for row in varBindTable:
+            for (table, prefix), (name, value) in zip(TABLE_OIDS.items(), row):
+                name = tuple(name)
+                if name[:len(prefix)] != prefix or isinstance(value, EndOfMibView):
+                    continue
+                walking = True
+                # Table OID / entry / column / row index
+                column, index = name[len(prefix) + 1], '.'.join(str(i) for i in name[len(prefix) + 2:])
+                result[table].setdefault(index, {})[column] = snmp_value(value)
+        return walking  # Keep on walking while some column is still inside its table
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Wire trace - binary recording of raw KLV frames, offline decoding and replay
+:author: Ronan Delacroix
+"""
+import os
+import mmap
+import time
+import struct
+import threading
+import collections
+
+
+SENT = 0
+RECEIVED = 1
+TRUNCATED = 0x80  # Direction flag of frames cut to fit the trace
+
+FILE_MAGIC = b'DRTRACE1'
+FILE_HEADER = struct.Struct('>8sQQQ')  # magic, data capacity, write offset, next sequence number
+RECORD_SYNC = b'DRT\x01'
+END_SYNC = b'DRT\x00'  # Rest of the data area is unused, the writer wrapped to its start
+RECORD_HEADER = struct.Struct('>4sQdBHIBI')  # sync, sequence, timestamp, direction, port, request ID, host size, frame size
+
+DEFAULT_SIZE = 16 * 1024 * 1024
+
+recorder = None  # Installed trace recorder, read by command calls : None disables tracing.
+
+
+TraceRecord = collections.namedtuple('TraceRecord', 'seq timestamp direction host port request_id frame truncated')
+
+
+def install(trace_recorder):
+    """
+    Install a recorder receiving every frame sent and received by command calls, and return it.
+    """
+    global recorder
+    recorder = trace_recorder
+    return trace_recorder
+
+
+def uninstall():
+    global recorder
+    recorder = None
+
+
+def _pack(seq, timestamp, direction, host, port, request_id, frame):
+    host = host.encode('utf-8')[:255]
+    return RECORD_HEADER.pack(RECORD_SYNC, seq, timestamp, direction, port or 0, request_id or 0, len(host),
+                              len(frame)) + host + bytes(frame)
+
+
+class RingTrace(object):
+    """
+    In memory trace, keeping the last `size` bytes of frames.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.used = 0
+        self.seq = 0
+        self.records = collections.deque()
+        self.lock = threading.Lock()
+
+    def record(self, direction, host, port, request_id, frame):
+        frame = bytes(frame)
+        truncated = len(frame) > self.size // 2
+        if truncated:
+            frame = frame[:self.size // 2]
+        with self.lock:
+            self.records.append(TraceRecord(self.seq, time.time(), direction, host, port, request_id, frame,
+                                            truncated))
+            self.seq += 1
+            self.used += len(frame)
+            while self.used > self.size:
+                self.used -= len(self.records.popleft().frame)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.records))
+
+    def save(self, path):
+        """
+        Write the trace to a file readable by read_trace.
+        """
+        chunks = []
+        for r in self:
+            chunks.append(_pack(r.seq, r.timestamp, r.direction | (TRUNCATED if r.truncated else 0), r.host, r.port,
+                                r.request_id, r.frame))
+        data = b''.join(chunks)
+        with open(path, 'wb') as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, len(data), len(data), self.seq))
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class FileTrace(object):
+    """
+    Trace in a memory mapped file of fixed size, used as a ring : the oldest frames are overwritten.
+
+    Frames are written to the page cache only, so recording costs a copy. The file survives a crash of the
+    process and is decoded with read_trace.
+
+    An existing trace file is continued (keeping its size), so that several runs can be traced to the same
+    file. Other existing files are never overwritten, unless `overwrite` is set.
+    """
+
+    def __init__(self, path, size=DEFAULT_SIZE, overwrite=False):
+        self.path = path
+        self.capacity = size
+        self.offset = 0
+        self.seq = 0
+        self.lock = threading.Lock()
+        if overwrite or not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.truncate(FILE_HEADER.size + size)
+        else:
+            with open(path, 'rb') as f:
+                header = f.read(FILE_HEADER.size)
+                f.seek(0, os.SEEK_END)
+                file_size = f.tell()
+            if len(header) < FILE_HEADER.size or header[:len(FILE_MAGIC)] != FILE_MAGIC:
+                raise Exception("%s exists and is not a Doremi API trace file" % path)
+            magic, self.capacity, self.offset, self.seq = FILE_HEADER.unpack(header)
+            if file_size != FILE_HEADER.size + self.capacity or self.offset > self.capacity:
+                raise Exception("%s is a damaged Doremi API trace file" % path)
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), FILE_HEADER.size + self.capacity)
+        self._write_header()
+
+    def _write_header(self):
+        self.map[:FILE_HEADER.size] = FILE_HEADER.pack(FILE_MAGIC, self.capacity, self.offset, self.seq)
+
+    def record(self, direction, host, port, request_id, frame):
+        max_frame = self.capacity // 2 - RECORD_HEADER.size - 255
+        if len(frame) > max_frame:
+            direction |= TRUNCATED
+            frame = frame[:max_frame]
+        with self.lock:
+            data = _pack(self.seq, time.time(), direction, host, port, request_id, frame)
+            if self.offset + len(data) > self.capacity:
+                if self.offset + len(END_SYNC) <= self.capacity:
+                    start = FILE_HEADER.size + self.offset
+                    self.map[start:start + len(END_SYNC)] = END_SYNC
+                self.offset = 0
+            start = FILE_HEADER.size + self.offset
+            self.map[start:start + len(data)] = data
+            self.offset += len(data)
+            self.seq += 1
+            self._write_header()
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+
+def _scan(data, start, end, seq=None):
+    """
+    Parse consecutive records of data[start:end]. Scanning stops on anything but a record following the
+    sequence numbers.
+    """
+    records = []
+    position = start
+    while position + RECORD_HEADER.size <= end:
+        sync, record_seq, timestamp, direction, port, request_id, host_size, frame_size = \
+            RECORD_HEADER.unpack_from(data, position)
+        if sync != RECORD_SYNC or (seq is not None and record_seq != seq):
+            break
+        host_start = position + RECORD_HEADER.size
+        frame_start = host_start + host_size
+        if frame_start + frame_size > end:
+            break
+        records.append(TraceRecord(record_seq, timestamp, direction & ~TRUNCATED,
+                                   bytes(data[host_start:frame_start]).decode('utf-8'), port, request_id,
+                                   bytes(data[frame_start:frame_start + frame_size]), bool(direction & TRUNCATED)))
+        seq = record_seq + 1
+        position = frame_start + frame_size
+    return records
+
+
+def read_trace(path):
+    """
+    Read a trace file (FileTrace or RingTrace.save).
+
+    :return: the list of TraceRecord, oldest first.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, capacity, offset, seq = FILE_HEADER.unpack_from(data, 0)
+    if magic != FILE_MAGIC:
+        raise Exception("%s is not a Doremi API trace file" % path)
+    base = FILE_HEADER.size
+    newest = _scan(data, base, base + offset)
+    first_seq = newest[0].seq if newest else seq
+    # Records older than the last wrap : after the record partially overwritten at the write offset.
+    older = []
+    position = data.find(RECORD_SYNC, base + offset)
+    while 0 <= position < base + capacity:
+        older = _scan(data, position, base + capacity)
+        if older and older[-1].seq + 1 == first_seq:
+            break
+        older = []
+        position = data.find(RECORD_SYNC, position + 1)
+    return older + newest
+
+
+def explain(record):
+    """
+    Decode a traced frame with the request and response definitions.
+
+    :return: a dict with the frame metadata, the message name and its decoded values.
+    """
+    from tbx.bytes import decode_ber
+    from . import commands, requests, responses, simulator
+    frame = record.frame
+    key = frame[13:16]
+    result = collections.OrderedDict([
+        ("seq", record.seq),
+        ("time", time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.timestamp)) +
+         ('%.6f' % (record.timestamp % 1))[1:]),
+        ("direction", 'sent' if record.direction == SENT else 'received'),
+        ("server", '%s:%d' % (record.host, record.port)),
+        ("request_id", record.request_id),
+        ("size", len(frame)),
+    ])
+    definition = requests.get_by_key(key) if record.direction == SENT else responses.get_by_key(key)
+    result["message"] = definition.name if definition else None
+    if record.truncated:
+        result["error"] = "frame truncated in the trace"
+    elif definition:
+        length, ber_size = decode_ber(frame[16:])
+        payload = frame[16 + ber_size + 4:16 + ber_size + length]
+        try:
+            if record.direction == SENT:
+                result["values"] = simulator.decode_request(definition, payload)
+            else:
+                result["values"] = commands.parse_message(definition, payload)
+        except Exception as e:
+            result["error"] = "decoding failed : %s" % e
+    return result
+
+
+def replay(records, host, port, timeout=10):
+    """
+    Send the traced requests again to a server (typically a local DoremiSimulator), on one connection.
+
+    :return: a generator of dicts comparing each traced response with the new one : message names, sizes and
+             response times.
+    """
+    import socket
+    from . import commands, responses
+    # Request IDs wrap, so each traced request is paired with the first response to its ID that follows it.
+    traced = {}  # sent record seq -> received record
+    unanswered = collections.defaultdict(collections.deque)  # (host, port, request ID) -> sent records
+    for r in records:
+        key = (r.host, r.port, r.request_id)
+        if r.direction == SENT:
+            unanswered[key].append(r)
+        elif unanswered[key]:
+            traced[unanswered[key].popleft().seq] = r
+    sock = socket.create_connection((host, port), timeout)
+    reader = commands.FrameReader(sock)
+    try:
+        for r in records:
+            if r.direction != SENT or r.truncated:
+                continue
+            start = time.time()
+            sock.sendall(r.frame)
+            key, request_id, payload, frame = reader.read()
+            elapsed = time.time() - start
+            response = responses.get_by_key(key)
+            previous = traced.get(r.seq)
+            previous_response = responses.get_by_key(previous.frame[13:16]) if previous else None
+            yield collections.OrderedDict([
+                ("seq", r.seq),
+                ("request_id", r.request_id),
+                ("response", response.name if response else None),
+                ("traced_response", previous_response.name if previous_response else None),
+                ("match", previous is not None and previous.frame[13:16] == bytes(key)),
+                ("size", len(frame)),
+                ("traced_size", len(previous.frame) if previous else None),
+                ("elapsed", round(elapsed, 6)),
+            ])
+    finally:
+        sock.close()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Playback watcher - adaptive polling of the show status, emitting change events only
+:author: Ronan Delacroix
+"""
+import time
+import logging
+import threading
+import collections
+from .enums import PlaybackState
+
+
+FAST_INTERVAL = 1.0  # Seconds between status polls during playback
+SLOW_INTERVAL = 10.0  # Seconds between status polls when stopped or paused
+SCHEDULE_INTERVAL = 30.0  # Seconds between schedule polls
+JUMP_TOLERANCE = 2.0  # Seconds of position drift not reported as a jump
+
+STATUS_COMMAND = 'StatusSPL2'
+
+
+_Event = collections.namedtuple('WatchEvent', 'server timestamp values previous')
+
+
+class WatchEvent(_Event):
+    """
+    Change event of a watched server.
+
+    :param server: the watched server label (host:port).
+    :param timestamp: time of the poll which detected the change.
+    :param values: the relevant fields after the change.
+    :param previous: the relevant fields before the change (None for the first status of a server).
+    """
+    __slots__ = ()
+    kind = None
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.server, self.values)
+
+
+class PlayEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'play'
+
+
+class PauseEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'pause'
+
+
+class StopEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'stop'
+
+
+class PlaylistChangeEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'playlist'
+
+
+class ElementChangeEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'element'
+
+
+class PositionJumpEvent(WatchEvent):
+    """
+    The show position moved away from where the playback (or the pause) should have left it : values has the
+    "expected" position along the status fields.
+    """
+    __slots__ = ()
+    kind = 'jump'
+
+
+class CurrentScheduleEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'current_schedule'
+
+
+class NextScheduleEvent(WatchEvent):
+    __slots__ = ()
+    kind = 'next_schedule'
+
+
+class ErrorEvent(WatchEvent):
+    """
+    Polling failed : values has the error "message". Emitted once, until a poll succeeds again.
+    """
+    __slots__ = ()
+    kind = 'error'
+
+
+STATE_EVENTS = {
+    PlaybackState.PLAY: PlayEvent,
+    PlaybackState.PAUSE: PauseEvent,
+    PlaybackState.STOP: StopEvent,
+}
+
+
+class PlaybackTracker(object):
+    """
+    Last known playback state of a server, turning successive decoded responses into change events.
+
+    Only the relevant fields are compared : the playback state, the playlist and element IDs, the show
+    position (against the position expected from the elapsed time) and the schedule IDs.
+    """
+
+    def __init__(self, server, jump_tolerance=JUMP_TOLERANCE):
+        self.server = server
+        self.jump_tolerance = jump_tolerance
+        self.status = None
+        self.status_time = None
+        self.schedules = {}  # event class -> schedule ID
+        self.error = None
+
+    @staticmethod
+    def relevant(status):
+        return {
+            "state": int(status.get('playblack_state') or 0),
+            "spl_id": status.get('spl_id'),
+            "cpl_id": status.get('current_cpl_id'),
+            "element_id": status.get('current_element_id'),
+            "position": status.get('show_playlist_position') or 0,
+        }
+
+    @property
+    def playing(self):
+        return self.status is not None and self.status["state"] == PlaybackState.PLAY
+
+    def update_status(self, status, timestamp=None):
+        """
+        :param status: a decoded StatusSPL/StatusSPL2 response.
+        :return: the list of change events.
+        """
+        timestamp = timestamp or time.time()
+        current = self.relevant(status)
+        previous, previous_time = self.status, self.status_time
+        self.status, self.status_time = current, timestamp
+        self.error = None
+
+        if previous is None:
+            event_class = STATE_EVENTS.get(current["state"])
+            return [event_class(self.server, timestamp, current, None)] if event_class else []
+
+        events = []
+        if current["state"] != previous["state"]:
+            event_class = STATE_EVENTS.get(current["state"])
+            if event_class:
+                events.append(event_class(self.server, timestamp, current, previous))
+        if current["spl_id"] != previous["spl_id"]:
+            events.append(PlaylistChangeEvent(self.server, timestamp, current, previous))
+        elif current["element_id"] != previous["element_id"] or current["cpl_id"] != previous["cpl_id"]:
+            events.append(ElementChangeEvent(self.server, timestamp, current, previous))
+        elif current["state"] == previous["state"]:
+            expected = previous["position"]
+            if current["state"] == PlaybackState.PLAY:
+                expected += timestamp - previous_time
+            if abs(current["position"] - expected) > self.jump_tolerance:
+                values = dict(current, expected=int(expected))
+                events.append(PositionJumpEvent(self.server, timestamp, values, previous))
+        return events
+
+    def update_schedule(self, event_class, schedule_id, timestamp=None):
+        """
+        :param event_class: CurrentScheduleEvent or NextScheduleEvent.
+        :return: the list of change events.
+        """
+        previous = self.schedules.get(event_class)
+        self.schedules[event_class] = schedule_id
+        if schedule_id == previous:
+            return []
+        return [event_class(self.server, timestamp or time.time(), {"schedule_id": schedule_id},
+                            None if previous is None else {"schedule_id": previous})]
+
+    def update_error(self, error, timestamp=None):
+        message = str(error) or error.__class__.__name__
+        if self.error is not None:
+            return []
+        self.error = message
+        return [ErrorEvent(self.server, timestamp or time.time(), {"message": message}, None)]
+
+
+class PlaybackWatcher(object):
+    """
+    Watch the playback of a server, calling back on changes.
+
+    The show status is polled every `fast_interval` seconds during playback, and every `slow_interval` seconds
+    otherwise. Current and next schedules are polled every `schedule_interval` seconds, and after each playback
+    state change.
+
+        watcher = PlaybackWatcher(DoremiServer('172.17.10.109'))
+        watcher.add_callback(lambda event: print(event.kind, event.values))
+        watcher.start()
+
+    Callbacks are called from the polling thread.
+    """
+
+    def __init__(self, server, fast_interval=FAST_INTERVAL, slow_interval=SLOW_INTERVAL,
+                 schedule_interval=SCHEDULE_INTERVAL, jump_tolerance=JUMP_TOLERANCE, status_command=STATUS_COMMAND):
+        self.server = server
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.schedule_interval = schedule_interval
+        self.status_command = status_command
+        self.tracker = PlaybackTracker('%s:%s' % (server.host, server.port), jump_tolerance=jump_tolerance)
+        self.callbacks = []
+        self.next_schedule_poll = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    @property
+    def interval(self):
+        """
+        Delay before the next status poll.
+        """
+        return self.fast_interval if self.tracker.playing else self.slow_interval
+
+    def status_args(self):
+        return (0, ) if self.status_command == 'StatusSPL2' else ()
+
+    def poll(self):
+        """
+        Poll the server once (the schedules only when due).
+
+        :return: the list of change events.
+        """
+        now = time.time()
+        try:
+            events = self.tracker.update_status(self.server.command(self.status_command, *self.status_args()), now)
+            if events or now >= self.next_schedule_poll:
+                self.next_schedule_poll = now + self.schedule_interval
+                for command, event_class in (('GetCurrentSchedule', CurrentScheduleEvent),
+                                             ('GetNextSchedule', NextScheduleEvent)):
+                    schedule_id = self.server.command(command)['schedule_id']
+                    events += self.tracker.update_schedule(event_class, schedule_id, now)
+        except Exception as e:
+            logging.warning("Polling %s failed (%s)" % (self.server, e))
+            self.reconnect()
+            return self.tracker.update_error(e, now)
+        return events
+
+    def reconnect(self):
+        """
+        Drop the connection after a failure, it is opened again by the next poll.
+        """
+        if getattr(self.server, 'connected', False):
+            self.server.disconnect()
+
+    def emit(self, events):
+        for event in events:
+            for callback in self.callbacks:
+                try:
+                    callback(event)
+                except Exception:
+                    logging.exception("Watcher callback %s failed on %r" % (callback, event))
+
+    def run(self):
+        """
+        Poll until stop() is called.
+        """
+        while not self.stopped.is_set():
+            if hasattr(self.server, 'connected') and not self.server.connected:
+                try:
+                    self.server.connect()
+                except Exception as e:
+                    self.emit(self.tracker.update_error(e))
+                    self.stopped.wait(self.slow_interval)
+                    continue
+            self.emit(self.poll())
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='PlaybackWatcher-%s' % self.tracker.server)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.stopped.set()
+        if wait and self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
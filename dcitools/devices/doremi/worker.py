@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Server workers - serialized server access with request coalescing
+:author: Ronan Delacroix
+"""
+import logging
+import socket
+import threading
+from concurrent.futures import Future, TimeoutError
+from six.moves import queue
+from . import server
+from . import requests
+from .pool import parse_address, DEFAULT_PORT
+
+
+_STOP = object()
+
+
+class ServerWorker(object):
+    """
+    Dedicated thread owning the connection to a Doremi server.
+
+    A Doremi server answers one socket at a time, so concurrent callers (HTTP requests of many dashboards...)
+    submit their commands to a queue that the worker thread executes one after the other.
+
+    Read commands identical to one already queued or running (same name and arguments) are coalesced : the
+    caller gets the future of the pending command instead of queuing a new one, so that 20 dashboards polling
+    StatusSPL2 cost a single upstream call. Commands changing the server state (see MessageDefinition.write)
+    are never coalesced, and reads submitted after them never share the response of a read queued before.
+
+    The connection is opened lazily, and reopened for the next command after a failure.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, debug=False, timeout=server.TIMEOUT, cache=None,
+                 decode_options=None):
+        self.host = host
+        self.port = port
+        self.debug = debug
+        self.timeout = timeout
+        self.server = server.DoremiServer(host, port=port, debug=debug, bypass_connection=True, timeout=timeout,
+                                          decode_options=decode_options, cache=cache)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.in_flight = {}  # coalescing key -> future of the queued or running command
+        self.calls = 0  # Upstream calls executed
+        self.coalesced = 0  # Submissions served by an already pending call
+        self.thread = threading.Thread(target=self._run, name='DoremiWorker-%s:%s' % (host, port))
+        self.thread.daemon = True
+        self.thread.start()
+
+    @staticmethod
+    def coalescing_key(definition, args, kwargs):
+        """
+        Key of a read command call, None for commands that must not be coalesced.
+        """
+        if definition.write:
+            return None
+        return (
+            definition.name,
+            tuple(str(a) for a in args),
+            tuple(sorted((k, str(v)) for k, v in kwargs.items())),
+        )
+
+    def submit(self, key, *args, **kwargs):
+        """
+        Queue a command.
+
+        :return: a concurrent.futures.Future of the parsed response.
+        """
+        definition = requests.get(key)
+        if not definition:
+            raise Exception("Request key %s is unknown" % key)
+        coalescing_key = self.coalescing_key(definition, args, kwargs)
+        with self.lock:
+            if coalescing_key is not None:
+                future = self.in_flight.get(coalescing_key)
+                if future is not None:
+                    self.coalesced += 1
+                    return future
+            elif self.in_flight:
+                # Reads queued before this write would give the state prior to it.
+                self.in_flight.clear()
+            future = Future()
+            if coalescing_key is not None:
+                self.in_flight[coalescing_key] = future
+        self.queue.put((future, definition.name, args, kwargs, coalescing_key))
+        return future
+
+    def command(self, key, *args, **kwargs):
+        """
+        Execute a command through the worker and wait for its response.
+
+        On timeout, a write still queued is cancelled, so that it never runs once the caller was told it failed ;
+        a write already running is waited for, its outcome being reported instead of the timeout.
+        """
+        future = self.submit(key, *args, **kwargs)
+        try:
+            return future.result(self.timeout * 2)
+        except TimeoutError:
+            # Reads are left queued : their future may be shared with other callers (see coalescing_key).
+            if requests.get(key).write and not future.cancel():
+                return future.result()
+            raise
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                break
+            future, name, args, kwargs, coalescing_key = job
+            if not future.set_running_or_notify_cancel():
+                self._done(coalescing_key, future)
+                continue
+            try:
+                result = self._execute(name, args, kwargs)
+            except Exception as e:
+                self._done(coalescing_key, future)
+                future.set_exception(e)
+            else:
+                # Callers submitting from now on get a fresh response.
+                self._done(coalescing_key, future)
+                future.set_result(result)
+        self.server.disconnect()
+
+    def _done(self, coalescing_key, future):
+        if coalescing_key is not None:
+            with self.lock:
+                # A write may have replaced this future by a newer one, that must stay.
+                if self.in_flight.get(coalescing_key) is future:
+                    del self.in_flight[coalescing_key]
+
+    def _execute(self, name, args, kwargs):
+        self.calls += 1
+        try:
+            if not self.server.connected:
+                self.server.connect()
+            return self.server.command(name, *args, **kwargs)
+        except Exception as e:
+            if isinstance(e, socket.error):
+                logging.warning("Command %s on %s failed (%s), reconnecting" % (name, self.server, e))
+            # The connection state is unknown (partially read response...) : start over with a new socket.
+            self.server.disconnect()
+            raise
+
+    def close(self, wait=True):
+        """
+        Stop the worker thread once the queued commands are executed, and close the connection.
+        """
+        self.queue.put(_STOP)
+        if wait and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def __str__(self):
+        return "ServerWorker({}:{})".format(self.host, self.port)
+
+
+class WorkerGroup(object):
+    """
+    One ServerWorker per server address, created on first use.
+    """
+
+    def __init__(self, debug=False, timeout=server.TIMEOUT, cache=None, decode_options=None):
+        self.debug = debug
+        self.timeout = timeout
+        self.cache = cache
+        self.decode_options = decode_options
+        self.lock = threading.Lock()
+        self.workers = {}  # (host, port) -> ServerWorker
+
+    def get(self, address):
+        address = parse_address(address)
+        with self.lock:
+            worker = self.workers.get(address)
+            if worker is None:
+                worker = self.workers[address] = ServerWorker(address[0], address[1], debug=self.debug,
+                                                              timeout=self.timeout, cache=self.cache,
+                                                              decode_options=self.decode_options)
+            return worker
+
+    def submit(self, address, key, *args, **kwargs):
+        return self.get(address).submit(key, *args, **kwargs)
+
+    def command(self, address, key, *args, **kwargs):
+        return self.get(address).command(key, *args, **kwargs)
+
+    def close(self):
+        with self.lock:
+            workers = list(self.workers.values())
+            self.workers = {}
+        for worker in workers:
+            worker.close()
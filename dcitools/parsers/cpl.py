@@ -5,10 +5,63 @@
 :Author: Ronan Delacroix
 :Copyright: 2014 Ronan Delacroix
 """
+import json
+import collections
+import six
 import tbx
+from lxml import etree
+from ..devices.doremi.enums import ContentKind
 
 
-class CPL(object):
+INTEROP_NAMESPACE = 'http://www.digicine.com/PROTO-ASDCP-CPL-20040511#'
+SMPTE_NAMESPACE = 'http://www.smpte-ra.org/schemas/429-7/2006/CPL'
+STANDARDS = {INTEROP_NAMESPACE: 'Interop', SMPTE_NAMESPACE: 'SMPTE'}
+
+# Asset element local name -> asset kind
+ASSET_KINDS = {
+    'MainPicture': 'picture',
+    'MainStereoscopicPicture': 'picture',
+    'MainSound': 'sound',
+    'MainSubtitle': 'subtitle',
+    'MainClosedCaption': 'caption',
+    'MainMarkers': 'markers',
+}
+
+Reel = collections.namedtuple('Reel', 'uuid start assets')
+Asset = collections.namedtuple('Asset', 'kind uuid key_id edit_rate_a edit_rate_b entry_point duration')
+Marker = collections.namedtuple('Marker', 'label offset reel')
+
+
+class CPLXPaths(object):
+    """
+    Precompiled XPath expressions of a CPL namespace.
+    """
+
+    def __init__(self, namespace):
+        ns = {'c': namespace}
+        self.reels = etree.XPath('c:ReelList/c:Reel', namespaces=ns)
+        self.assets = etree.XPath('c:AssetList/*', namespaces=ns)
+        self.markers = etree.XPath('c:MarkerList/c:Marker', namespaces=ns)
+        self.content_version = etree.XPath('string(c:ContentVersion/c:Id)', namespaces=ns)
+        self.prefix = '{%s}' % namespace
+
+    def tag(self, name):
+        return self.prefix + name
+
+
+XPATHS = dict((namespace, CPLXPaths(namespace)) for namespace in STANDARDS)
+
+
+def strip_urn(value):
+    return value.replace('urn:uuid:', '') if value else value
+
+
+class BaseCPL(object):
+    """
+    CPL model methods, shared by CPL and its slotted variant CompactCPL.
+    """
+    __slots__ = ()
+
     def __init__(self, uuid='Unknown', title='Unknown', kind='Unknown', duration=0, edit_rate_a=1, edit_rate_b=1):
         self.uuid = uuid
         self.title = title
@@ -34,16 +87,90 @@ class CPL(object):
         return tbx.text.seconds_to_hms(self.seconds)
 
     def from_cpl_info(self, cpl_info):
-        if cpl_info['id'] != '00000000-0000-0000-0000-000000000000':
-            self.uuid = cpl_info['id']
-            self.title = cpl_info['content_title_text']
-            self.kind = cpl_info['content_kind_text']
+        cpl_uuid = str(cpl_info['cpl_uuid'] if 'cpl_uuid' in cpl_info else cpl_info['id'])
+        if cpl_uuid != '00000000-0000-0000-0000-000000000000':
+            self.uuid = cpl_uuid
+            self.title = cpl_info['content_title_text'].strip('\x00')
+            # No '_text' translation is stored when the info was decoded with the 'lazy' or 'skip' text modes.
+            self.kind = cpl_info.get('content_kind_text') or ContentKind.get_text(cpl_info['content_kind'])
             self.duration = int(cpl_info['duration'])
             self.edit_rate_a = cpl_info['edit_rate_a']
             self.edit_rate_b = cpl_info['edit_rate_b']
 
         return self
 
+    def from_cpl_xml(self, cpl_xml):
+        """
+        Parse a composition playlist (as returned by RetrieveCPL), Interop or SMPTE.
+
+        Reels, assets (picture, sound, subtitles...), key IDs and markers are indexed in self.reels, self.markers
+        and self.key_ids. Duration and edit rate are taken from the picture track.
+        """
+        if not cpl_xml:
+            return self
+        if isinstance(cpl_xml, six.text_type):
+            cpl_xml = cpl_xml.encode('utf-8')
+        root = etree.fromstring(cpl_xml, etree.XMLParser(recover=True, remove_comments=True))
+        namespace = etree.QName(root).namespace
+        if namespace not in XPATHS:
+            raise Exception("Unknown CPL namespace %s" % namespace)
+        xpaths = XPATHS[namespace]
+        tag = xpaths.tag
+
+        self.standard = STANDARDS[namespace]
+        self.uuid = strip_urn(root.findtext(tag('Id')))
+        self.title = root.findtext(tag('ContentTitleText')) or self.title
+        self.annotation = root.findtext(tag('AnnotationText'))
+        self.kind = (root.findtext(tag('ContentKind')) or self.kind).strip().capitalize()
+        self.issue_date = root.findtext(tag('IssueDate'))
+        self.content_version = strip_urn(xpaths.content_version(root))
+
+        self.reels = []
+        self.markers = []
+        key_ids = []
+        position = 0
+        edit_rate = None
+        for reel in xpaths.reels(root):
+            assets = []
+            reel_duration = None
+            for asset in xpaths.assets(reel):
+                kind = ASSET_KINDS.get(etree.QName(asset).localname, etree.QName(asset).localname)
+                rate = (asset.findtext(tag('EditRate')) or '24 1').split()
+                entry_point = int(asset.findtext(tag('EntryPoint')) or 0)
+                duration = asset.findtext(tag('Duration'))
+                duration = int(duration) if duration else int(asset.findtext(tag('IntrinsicDuration')) or 0) - entry_point
+                key_id = strip_urn(asset.findtext(tag('KeyId')))
+                assets.append(Asset(kind, strip_urn(asset.findtext(tag('Id'))), key_id, int(rate[0]), int(rate[1]),
+                                    entry_point, duration))
+                if key_id and key_id not in key_ids:
+                    key_ids.append(key_id)
+                if kind == 'picture' and reel_duration is None:
+                    reel_duration = duration
+                    edit_rate = edit_rate or (int(rate[0]), int(rate[1]))
+                if kind == 'markers':
+                    for marker in xpaths.markers(asset):
+                        self.markers.append(Marker(marker.findtext(tag('Label')),
+                                                   position + int(marker.findtext(tag('Offset')) or 0),
+                                                   len(self.reels)))
+            self.reels.append(Reel(strip_urn(reel.findtext(tag('Id'))), position, tuple(assets)))
+            position += reel_duration or max([a.duration for a in assets] or [0])
+
+        self.key_ids = key_ids
+        self.duration = position
+        if edit_rate:
+            self.edit_rate_a, self.edit_rate_b = edit_rate
+        return self
+
+    def assets(self, kind=None):
+        """
+        Assets of all reels, optionally of one kind only ('picture', 'sound', 'subtitle'...).
+        """
+        return [a for reel in getattr(self, 'reels', []) for a in reel.assets if kind is None or a.kind == kind]
+
+    @property
+    def encrypted(self):
+        return bool(getattr(self, 'key_ids', None))
+
     @property
     def shortname(self):
 
@@ -54,4 +181,77 @@ class CPL(object):
 
     def __str__(self):
         return "CPL {:s} - {:s} - {:s} ({:d}@{:0.1f}fps = {:s})".format(
-            self.uuid, self.title, self.kind, self.duration, self.fps, self.hms_duration)
\ No newline at end of file
+            self.uuid, self.title, self.kind, self.duration, self.fps, self.hms_duration)
+
+class CPL(BaseCPL):
+    pass
+
+
+class CompactCPL(BaseCPL):
+    """
+    Slotted CPL, several times smaller than CPL, to hold large libraries in memory. No other attributes can be set.
+    """
+    __slots__ = ('uuid', 'title', 'kind', 'duration', 'edit_rate_a', 'edit_rate_b', 'standard', 'annotation',
+                 'issue_date', 'content_version', 'reels', 'markers', 'key_ids')
+
+
+class CPLKeyIndex(object):
+    """
+    Index of the key IDs of parsed CPLs, to find which CPLs a KDM applies to without retrieving them again.
+
+    The index can be saved to and loaded from a JSON file.
+    """
+
+    def __init__(self):
+        self.cpls_by_key = {}  # key id -> set of CPL uuids
+        self.keys_by_cpl = {}  # CPL uuid -> list of key ids
+
+    def add(self, cpl):
+        """
+        Index a CPL parsed with from_cpl_xml (or any object with uuid and key_ids attributes).
+        """
+        self.remove(cpl.uuid)
+        self.keys_by_cpl[cpl.uuid] = list(cpl.key_ids)
+        for key_id in cpl.key_ids:
+            self.cpls_by_key.setdefault(key_id, set()).add(cpl.uuid)
+
+    def remove(self, cpl_uuid):
+        for key_id in self.keys_by_cpl.pop(cpl_uuid, []):
+            uuids = self.cpls_by_key.get(key_id)
+            if uuids:
+                uuids.discard(cpl_uuid)
+                if not uuids:
+                    del self.cpls_by_key[key_id]
+
+    def cpls_for_key(self, key_id):
+        """
+        Uuids of the CPLs needing a key.
+        """
+        return sorted(self.cpls_by_key.get(strip_urn(str(key_id)), ()))
+
+    def cpls_for_keys(self, key_ids):
+        """
+        Uuids of the CPLs whose keys are all among `key_ids` (typically the key ID list of a KDM).
+        """
+        key_ids = set(strip_urn(str(k)) for k in key_ids)
+        candidates = set()
+        for key_id in key_ids:
+            candidates.update(self.cpls_by_key.get(key_id, ()))
+        return sorted(u for u in candidates if key_ids.issuperset(self.keys_by_cpl[u]))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.keys_by_cpl, f, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path) as f:
+            for cpl_uuid, key_ids in json.load(f).items():
+                index.keys_by_cpl[cpl_uuid] = key_ids
+                for key_id in key_ids:
+                    index.cpls_by_key.setdefault(key_id, set()).add(cpl_uuid)
+        return index
+
+    def __len__(self):
+        return len(self.keys_by_cpl)
@@ -6,8 +6,11 @@
 :Copyright: 2014 Ronan Delacroix
 """
 import os
+import io
+import threading
+import multiprocessing
 from lxml import etree
-from .cpl import CPL
+from .cpl import CPL, CompactCPL
 import uuid as UUID
 import tbx
 from datetime import datetime
@@ -17,7 +20,94 @@ except ImportError:
     from io import StringIO
 
 
-class SPL(object):
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+RENDER_EXCLUDED = ('tree', 'root', 'parser')  # Parsing leftovers of from_spl_xml, never used by templates
+FEED_SIZE = 64 * 1024  # Characters (or bytes) of XML fed at once to the streaming parser
+
+# Precompiled paths, relative to the root (or to a Pack)
+PACKS = etree.XPath('PackList/Pack')
+COMPOSITIONS = etree.XPath('EventList/Event/ElementList/MainElement/Composition')
+
+
+_jinja_env = None
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(name='spl.xml'):
+    """
+    Compiled template, loaded once per process.
+    """
+    global _jinja_env
+    template = _templates.get(name)
+    if template is None:
+        with _templates_lock:
+            if _jinja_env is None:
+                _jinja_env = tbx.template.create_jinja_env(template_path=TEMPLATE_PATH)
+                _jinja_env.auto_reload = False
+            template = _templates[name] = _jinja_env.get_template(name)
+    return template
+
+
+def _write_spl_file(job):
+    """
+    Render a SPL render context to a file, streaming the template output.
+    """
+    context, path = job
+    with io.open(path, 'w', encoding='utf-8') as f:
+        for chunk in get_template().generate(context):
+            f.write(chunk)
+    return path
+
+
+def write_spl_files(spls, directory, filename='{uuid}.xml', processes=None, chunksize=16):
+    """
+    Render many SPLs to files.
+
+    :param spls: an iterable of SPL objects.
+    :param directory: output directory.
+    :param filename: file name pattern, formatted with the SPL render context.
+    :param processes: number of worker processes, None or 1 to render in the current process.
+    :return: the list of written file paths.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    jobs = []
+    for spl in spls:
+        context = spl.render_context()
+        jobs.append((context, os.path.join(directory, filename.format(**context))))
+
+    if not processes or processes == 1:
+        return [_write_spl_file(job) for job in jobs]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_write_spl_file, jobs, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def cpl_from_composition(compo, cpl_class=CPL):
+    """
+    CPL object of a SPL Composition element.
+    """
+    cpl = cpl_class(
+        uuid=(compo.findtext('CompositionPlaylistId') or compo.findtext('CompositionPlaylistID')).replace('urn:uuid:', ''),
+        title=compo.findtext('AnnotationText'),
+        duration=int(compo.findtext('IntrinsicDuration'))
+    )
+    cpl.parse_edit_rate(compo.findtext('EditRate'))
+    return cpl
+
+
+class BaseSPL(object):
+    """
+    SPL model methods, shared by SPL and its slotted variant CompactSPL.
+    """
+    __slots__ = ()
+    cpl_class = CPL
+
     def __init__(self, uuid=None, title='Unknown', annotation=None, issuer='Ronan', creator='Ronan', duration=0.0, content_version=None, cpls=None):
         if not uuid:
             uuid = str(UUID.uuid4())
@@ -42,30 +132,67 @@ class SPL(object):
         self.parser = etree.XMLParser(recover=True)
         self.tree = etree.parse(f, self.parser)
         self.root = self.tree.getroot()
-        self.uuid = self.root.xpath('Id')[0].text.replace('urn:uuid:', '')
-        self.title = self.root.xpath('ShowTitleText')[0].text
-        self.annotation = self.root.xpath('AnnotationText')[0].text
-        self.content_version = self.root.xpath('ContentVersion/Id')[0].text
-        packs = self.root.xpath('PackList/Pack')
+        self._parse_header(self.root)
+        packs = PACKS(self.root)
         if len(packs) == 0: #case of playlists containing only EventList not embedded in PackList
             packs = [self.root]
 
         for pack in packs:
-            events = pack.xpath('EventList/Event')
-            i = 0
-            for event in events:
-                i += 1
-                compos = event.xpath('ElementList/MainElement/Composition')
-                for compo in compos:
-                    cpl = CPL(
-                        uuid=compo.xpath('CompositionPlaylistId')[0].text.replace('urn:uuid:', ''),
-                        title=compo.xpath('AnnotationText')[0].text,
-                        duration=int(compo.xpath('IntrinsicDuration')[0].text)
-                    )
-                    cpl.parse_edit_rate(compo.xpath('EditRate')[0].text)
-                    self.cpls.append(cpl)
+            for compo in COMPOSITIONS(pack):
+                self.cpls.append(cpl_from_composition(compo, self.cpl_class))
         return self
 
+    def _parse_header(self, root):
+        self.uuid = root.findtext('Id').replace('urn:uuid:', '')
+        self.title = root.findtext('ShowTitleText')
+        self.annotation = root.findtext('AnnotationText')
+        self.content_version = root.findtext('ContentVersion/Id')
+
+    def iter_spl_xml(self, spl_xml, feed_size=FEED_SIZE):
+        """
+        Streaming parse of a SPL : yields CPL objects as Composition elements close, without building the whole
+        tree. Processed events are freed, so memory stays flat whatever the playlist size.
+
+        The SPL header (uuid, title, annotation, content version) is set as soon as it has been read, and
+        self.cpls is left untouched.
+
+        :param spl_xml: the SPL XML text or bytes, or a file object.
+        :return: a generator of CPL objects.
+        """
+        if not spl_xml:
+            return
+        read = spl_xml.read if hasattr(spl_xml, 'read') else None
+        parser = etree.XMLPullParser(events=('end',), tag=('Composition', 'Event', 'Pack'), recover=True,
+                                     huge_tree=True)
+        header_parsed = False
+        offset = 0
+        while True:
+            if read:
+                chunk = read(feed_size)
+            else:
+                chunk = spl_xml[offset:offset + feed_size]
+                offset += feed_size
+            if not chunk:
+                break
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if not header_parsed:
+                    # The header precedes the pack and event lists.
+                    self._parse_header(element.getroottree().getroot())
+                    header_parsed = True
+                if element.tag == 'Composition':
+                    if element.getparent().tag == 'MainElement':
+                        yield cpl_from_composition(element, self.cpl_class)
+                else:
+                    # Free the processed event or pack (and its previous siblings) from the partial tree.
+                    element.clear()
+                    parent = element.getparent()
+                    while element.getprevious() is not None:
+                        del parent[0]
+        root = parser.close()
+        if not header_parsed and root is not None:
+            self._parse_header(root)
+
     def from_spl_info(self, spl_info):
         if spl_info['id'] != '00000000-0000-0000-0000-000000000000':
             self.title = spl_info['name']
@@ -76,10 +203,45 @@ class SPL(object):
     def hms_duration(self):
         return tbx.text.seconds_to_hms(self.duration)
 
+    def render_context(self):
+        """
+        Template values of the SPL.
+        """
+        if hasattr(self, '__dict__'):
+            values = self.__dict__
+        else:
+            values = dict((k, getattr(self, k)) for k in self.__slots__ if hasattr(self, k))
+        return dict((k, v) for k, v in values.items() if k not in RENDER_EXCLUDED)
+
     def create_xml(self):
-        template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
-        env = tbx.template.create_jinja_env(template_path=template_path)
-        return tbx.template.render_template(env, 'spl.xml', self.__dict__)
+        return get_template().render(self.render_context())
+
+    def write_xml(self, path):
+        """
+        Render the SPL to a file, without building the whole XML string.
+        """
+        return _write_spl_file((self.render_context(), path))
 
     def __str__(self):
         return "SPL {} {} ({})".format(self.title, self.uuid, self.hms_duration)
+
+
+class SPL(BaseSPL):
+    pass
+
+
+class CompactSPL(BaseSPL):
+    """
+    Slotted SPL holding CompactCPL objects, to hold large libraries in memory. No other attributes can be set,
+    and the parsed XML tree is not kept.
+    """
+    __slots__ = ('uuid', 'content_version', 'title', 'annotation', 'issuer', 'creator', 'issue_date', 'duration',
+                 'triggers', 'cpls', 'parser', 'tree', 'root')
+    cpl_class = CompactCPL
+
+    def from_spl_xml(self, spl_xml):
+        result = super(CompactSPL, self).from_spl_xml(spl_xml)
+        for name in ('parser', 'tree', 'root'):
+            if hasattr(self, name):
+                delattr(self, name)
+        return result
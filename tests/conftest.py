@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - shared fixtures
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import simulator as doremi_simulator
+from dcitools.devices.doremi import server as doremi_server
+
+
+@pytest.fixture
+def simulator():
+    sim = doremi_simulator.DoremiSimulator(library_size=10).start()
+    yield sim
+    sim.stop()
+
+
+@pytest.fixture
+def server(simulator):
+    host, port = simulator.address
+    srv = doremi_server.DoremiServer(host, port=port, timeout=5)
+    yield srv
+    srv.disconnect()
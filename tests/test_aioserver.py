@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - asyncio client
+:author: Ronan Delacroix
+"""
+import asyncio
+from dcitools.devices.doremi import aioserver
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_concurrent_commands(simulator):
+    async def main():
+        async with aioserver.AsyncDoremiServer(*simulator.address) as srv:
+            return await asyncio.gather(*[srv.command('GetCPLList') for i in range(5)])
+    assert [r['amount'] for r in run(main())] == [10] * 5
+
+
+def test_server_created_outside_the_loop(simulator):
+    srv = aioserver.AsyncDoremiServer(*simulator.address, timeout=5)
+
+    async def main():
+        await srv.connect()
+        results = await asyncio.gather(*[srv.command('GetCPLList') for i in range(5)])
+        await srv.close()
+        return results
+    assert [r['amount'] for r in run(main())] == [10] * 5
+
+
+def test_waiting_command_after_failed_exchange(simulator):
+    async def main():
+        srv = await aioserver.AsyncDoremiServer(*simulator.address, timeout=5).connect()
+        simulator.faults = {'wrong_id': 1.0}
+        results = await asyncio.gather(srv.command('GetCPLList'), srv.command('GetCPLList'), return_exceptions=True)
+        await srv.close()
+        return results
+    failed, waiting = run(main())
+    assert 'does not match' in str(failed)
+    assert not isinstance(waiting, AttributeError)
+    assert 'not connected' in str(waiting)
+
+
+def test_reconnection_keeps_the_lock(simulator):
+    async def main():
+        srv = await aioserver.AsyncDoremiServer(*simulator.address, timeout=5).connect()
+        await srv.command('GetCPLList')
+        lock = srv.lock
+        await srv.close()
+        await srv.connect()
+        result = await srv.command('GetCPLList')
+        await srv.close()
+        return lock is srv.lock, result
+    same_lock, result = run(main())
+    assert same_lock
+    assert result['amount'] == 10
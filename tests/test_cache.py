@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - command response cache
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import cache, pool, requests
+from dcitools.devices.doremi import server as doremi_server
+
+
+@pytest.fixture
+def cached_server(simulator):
+    host, port = simulator.address
+    srv = doremi_server.DoremiServer(host, port=port, timeout=5, cache=cache.CommandCache())
+    yield srv
+    srv.disconnect()
+
+
+def test_ttl_hit_and_expiry(simulator, cached_server, monkeypatch):
+    first = cached_server.command('GetProductInfo')
+    count = simulator.requests_count
+    assert cached_server.command('GetProductInfo') is first
+    assert simulator.requests_count == count
+    assert cached_server.cache.hits == 1
+
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, 'time', lambda: now + requests.get('GetProductInfo').ttl + 1)
+    cached_server.command('GetProductInfo')
+    assert simulator.requests_count == count + 1
+
+
+def test_write_invalidates(simulator, cached_server):
+    cpl_uuid = str(cached_server.command('GetCPLList')['list'][0])
+    cached_server.command('GetCPLInfo2', cpl_uuid)
+    count = simulator.requests_count
+    cached_server.command('GetCPLInfo2', cpl_uuid)
+    assert simulator.requests_count == count
+
+    cached_server.command('DeleteCPL', cpl_uuid)
+    cached_server.command('GetCPLInfo2', cpl_uuid)
+    assert simulator.requests_count == count + 2
+
+
+def test_error_responses_not_cached(simulator, cached_server):
+    simulator.faults = {'error': 1.0}
+    assert cached_server.command('GetTimeZone')['response'] != 0
+    simulator.faults = {}
+    assert cached_server.command('GetTimeZone')['response'] == 0
+    assert cached_server.cache.hits == 0
+    assert cached_server.command('GetTimeZone')['response'] == 0
+    assert cached_server.cache.hits == 1
+
+
+def test_pool_health_check_not_cached(simulator):
+    doremi_pool = pool.DoremiPool(health_check_interval=0, cache=cache.CommandCache())
+    try:
+        doremi_pool.command(simulator.address, 'GetProductInfo')
+        count = simulator.requests_count
+        doremi_pool.command(simulator.address, 'GetProductInfo')
+        doremi_pool.command(simulator.address, 'GetProductInfo')
+        # Two health checks reach the server, the product information comes from the cache.
+        assert simulator.requests_count == count + 2
+    finally:
+        doremi_pool.close()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - doremiapi sub command imports and startup time
+:author: Ronan Delacroix
+"""
+import os
+import sys
+import subprocess
+import pytest
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DOREMIAPI = os.path.join(ROOT, 'bin', 'doremiapi')
+
+HEAVY_MODULES = ('pysnmp', 'bottle', 'lxml', 'readline', 'jinja2')
+
+# Import time budget of a sub command, in milliseconds. Set DOREMIAPI_IMPORT_BUDGET to adapt it to slow machines,
+# or to 0 to only check imported modules.
+IMPORT_BUDGET = float(os.environ.get('DOREMIAPI_IMPORT_BUDGET', 250))
+
+
+def import_times(args):
+    """
+    Run a doremiapi sub command with -X importtime.
+
+    :return: a (total milliseconds, set of imported module names) tuple. Interpreter startup (site) is excluded.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', DOREMIAPI] + args, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    out, err = process.communicate()
+    total = 0
+    modules = set()
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name.startswith('  ') and name.strip() != 'site':
+            total += int(cumulative)
+    return total / 1000.0, modules
+
+
+@pytest.mark.parametrize('args, forbidden', [
+    (['version'], HEAVY_MODULES + ('dcitools.devices', )),
+    (['--help'], HEAVY_MODULES + ('dcitools.devices', )),
+    (['list'], HEAVY_MODULES),
+    (['snmplist'], HEAVY_MODULES),
+])
+def test_sub_command_imports(args, forbidden):
+    milliseconds, modules = min(import_times(args) for i in range(3))
+    found = sorted(m for m in modules if any(m == f or m.startswith(f + '.') for f in forbidden))
+    assert not found
+    if IMPORT_BUDGET:
+        assert milliseconds <= IMPORT_BUDGET
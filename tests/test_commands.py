@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - KLV frame reader
+:author: Ronan Delacroix
+"""
+import six
+import pytest
+from tbx.bytes import bytes_to_bool, bytes_to_int
+from dcitools.devices.doremi import commands
+from dcitools.devices.doremi.message import MessageDefinition, ResponseElement
+from dcitools.devices.doremi import responses
+from dcitools.devices.doremi.simulator import build_frame, build_payload
+
+
+class ChunkedSocket(object):
+    """
+    Socket giving the bytes of a stream at most `chunk_size` at a time, then EOF.
+    """
+
+    def __init__(self, data, chunk_size=3):
+        self.data = bytes(data)
+        self.position = 0
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def recv_into(self, view):
+        self.calls += 1
+        chunk = self.data[self.position:self.position + min(len(view), self.chunk_size)]
+        view[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+
+def cpl_list_frame(request_id, uuids):
+    payload = build_payload(responses.GetCPLList, {'amount': len(uuids), 'item_length': 16, 'list': uuids})
+    return build_frame(responses.GetCPLList.key, request_id, payload), payload
+
+
+def to_bytes(data):
+    return data.tobytes() if isinstance(data, memoryview) else bytes(data)
+
+
+UUIDS = ['%08d-0000-0000-0000-000000000000' % i for i in range(100)]
+
+
+def test_frame_split_across_recv_calls():
+    frame, payload = cpl_list_frame(7, UUIDS[:2])
+    sock = ChunkedSocket(frame, chunk_size=3)
+    key, request_id, payload_view, frame_view = commands.FrameReader(sock).read()
+    assert key == responses.GetCPLList.key
+    assert request_id == 7
+    assert to_bytes(payload_view) == payload
+    assert to_bytes(frame_view) == frame
+    assert sock.calls > len(frame) // 3
+
+
+def test_long_ber_length():
+    frame, payload = cpl_list_frame(8, UUIDS)
+    assert bytearray(frame)[16] == 0x82  # Two bytes long length
+    key, request_id, payload_view, frame_view = commands.FrameReader(ChunkedSocket(frame, chunk_size=5)).read()
+    assert request_id == 8
+    assert to_bytes(payload_view) == payload
+
+
+def test_buffer_growth_keeps_previous_views():
+    small, small_payload = cpl_list_frame(1, UUIDS[:1])
+    large, large_payload = cpl_list_frame(2, UUIDS)
+    reader = commands.FrameReader(ChunkedSocket(small + large, chunk_size=64), buffer_size=64)
+    first = reader.read()[2]
+    second = reader.read()[2]
+    assert len(reader.buffer) >= len(large)
+    assert to_bytes(second) == large_payload
+    assert to_bytes(first) == small_payload
+
+
+def test_eof_in_frame():
+    frame, payload = cpl_list_frame(3, UUIDS[:4])
+    reader = commands.FrameReader(ChunkedSocket(frame[:-10], chunk_size=16))
+    with pytest.raises(Exception) as e:
+        reader.read()
+    assert 'Error receiving data' in str(e.value)
+
+
+def test_payload_parsed_before_next_read():
+    first, first_payload = cpl_list_frame(4, UUIDS[:3])
+    second, second_payload = cpl_list_frame(5, UUIDS[3:6])
+    reader = commands.FrameReader(ChunkedSocket(first + second, chunk_size=7))
+    key, request_id, payload, frame = reader.read()
+    result = commands.parse_message(responses.get_by_key(key), payload)
+    reader.read()
+    # The buffer now holds the second frame : the parsed values must not depend on it.
+    if commands.PAYLOAD_VIEWS:
+        assert to_bytes(payload) != first_payload
+    assert [str(u) for u in result['list']] == UUIDS[:3]
+    assert result['amount'] == 3
+
+
+@pytest.fixture(params=[True, False] if six.PY3 else [False], ids=['views', 'copies'] if six.PY3 else ['copies'])
+def payload_views(request, monkeypatch):
+    monkeypatch.setattr(commands, 'PAYLOAD_VIEWS', request.param)
+    return request.param
+
+
+SCHEDULER_ENABLE = MessageDefinition('GetSchedulerEnable', '041000', [
+    ResponseElement('enabled', 0, 1, bytes_to_bool),
+    ResponseElement('response', -1, None, bytes_to_int),
+])
+
+
+def read_and_parse(definition, payload):
+    frame = build_frame(definition.key, 9, payload)
+    key, request_id, payload, frame = commands.FrameReader(ChunkedSocket(frame, chunk_size=64)).read()
+    assert isinstance(payload, memoryview) == commands.PAYLOAD_VIEWS
+    return commands.parse_message(definition, payload)
+
+
+def test_decode_reader_payloads(payload_views):
+    xml = read_and_parse(responses.RetrieveCPL, build_payload(responses.RetrieveCPL, {'xml': '<CompositionPlaylist/>'}))
+    assert xml['xml'] == '<CompositionPlaylist/>'
+
+    cpl_list = read_and_parse(responses.GetCPLList, cpl_list_frame(9, UUIDS[:3])[1])
+    assert [str(u) for u in cpl_list['list']] == UUIDS[:3]
+
+    assert read_and_parse(SCHEDULER_ENABLE, b'\x01\x00') == {'enabled': True, 'response': 0}
+    assert read_and_parse(SCHEDULER_ENABLE, b'\x00\x02') == {'enabled': False, 'response': 2}
+
+
+def test_response_definition_of_reader_key(payload_views):
+    frame, payload = cpl_list_frame(9, UUIDS[:1])
+    key, request_id, payload, frame_view = commands.FrameReader(ChunkedSocket(frame)).read()
+    assert responses.get_by_key(key) is responses.GetCPLList
+    assert 'GetCPLList Response' in str(commands.LazyExplanation(frame_view))
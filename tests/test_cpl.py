@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Parsers tests - composition playlists
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.parsers.cpl import CPL, CompactCPL, CPLKeyIndex
+
+
+INTEROP_CPL = """<?xml version="1.0" encoding="UTF-8"?>
+<CompositionPlaylist xmlns="http://www.digicine.com/PROTO-ASDCP-CPL-20040511#">
+  <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000001</Id>
+  <AnnotationText>Interop feature</AnnotationText>
+  <IssueDate>2014-01-01T10:00:00+00:00</IssueDate>
+  <ContentTitleText>Test_FTR_F_EN-XX_51_2K_20140101_IOP_OV</ContentTitleText>
+  <ContentKind>feature</ContentKind>
+  <ContentVersion>
+    <Id>urn:uuid:aaaaaaaa-0000-0000-0000-0000000000ff</Id>
+    <LabelText>v1</LabelText>
+  </ContentVersion>
+  <ReelList>
+    <Reel>
+      <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000010</Id>
+      <AssetList>
+        <MainPicture>
+          <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000011</Id>
+          <EditRate>24 1</EditRate>
+          <IntrinsicDuration>1500</IntrinsicDuration>
+          <EntryPoint>100</EntryPoint>
+          <KeyId>urn:uuid:bbbbbbbb-0000-0000-0000-000000000001</KeyId>
+        </MainPicture>
+        <MainSound>
+          <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000012</Id>
+          <EditRate>24 1</EditRate>
+          <IntrinsicDuration>1500</IntrinsicDuration>
+          <EntryPoint>100</EntryPoint>
+          <KeyId>urn:uuid:bbbbbbbb-0000-0000-0000-000000000002</KeyId>
+        </MainSound>
+        <MainSubtitle>
+          <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000013</Id>
+          <EditRate>24 1</EditRate>
+          <IntrinsicDuration>1400</IntrinsicDuration>
+        </MainSubtitle>
+      </AssetList>
+    </Reel>
+    <Reel>
+      <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000020</Id>
+      <AssetList>
+        <!-- Second reel -->
+        <MainPicture>
+          <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000021</Id>
+          <EditRate>24 1</EditRate>
+          <IntrinsicDuration>2000</IntrinsicDuration>
+          <Duration>1800</Duration>
+          <KeyId>urn:uuid:bbbbbbbb-0000-0000-0000-000000000001</KeyId>
+        </MainPicture>
+        <MainSound>
+          <Id>urn:uuid:aaaaaaaa-0000-0000-0000-000000000022</Id>
+          <EditRate>24 1</EditRate>
+          <IntrinsicDuration>2000</IntrinsicDuration>
+          <Duration>1800</Duration>
+          <KeyId>urn:uuid:bbbbbbbb-0000-0000-0000-000000000003</KeyId>
+        </MainSound>
+      </AssetList>
+    </Reel>
+  </ReelList>
+</CompositionPlaylist>
+"""
+
+SMPTE_CPL = """<?xml version="1.0" encoding="UTF-8"?>
+<CompositionPlaylist xmlns="http://www.smpte-ra.org/schemas/429-7/2006/CPL">
+  <Id>urn:uuid:cccccccc-0000-0000-0000-000000000001</Id>
+  <IssueDate>2014-02-01T10:00:00+00:00</IssueDate>
+  <ContentTitleText>Test_TLR-1_F_EN-XX_51_2K_20140201_SMPTE_OV</ContentTitleText>
+  <ContentKind>trailer</ContentKind>
+  <ContentVersion>
+    <Id>urn:uuid:cccccccc-0000-0000-0000-0000000000ff</Id>
+    <LabelText>v1</LabelText>
+  </ContentVersion>
+  <ReelList>
+    <Reel>
+      <Id>urn:uuid:cccccccc-0000-0000-0000-000000000010</Id>
+      <AssetList>
+        <MainMarkers>
+          <Id>urn:uuid:cccccccc-0000-0000-0000-000000000014</Id>
+          <EditRate>48 1</EditRate>
+          <IntrinsicDuration>4800</IntrinsicDuration>
+          <MarkerList>
+            <Marker><Label>FFOC</Label><Offset>0</Offset></Marker>
+            <Marker><Label>LFOC</Label><Offset>4799</Offset></Marker>
+          </MarkerList>
+        </MainMarkers>
+        <MainPicture>
+          <Id>urn:uuid:cccccccc-0000-0000-0000-000000000011</Id>
+          <EditRate>48 1</EditRate>
+          <IntrinsicDuration>4800</IntrinsicDuration>
+          <EntryPoint>0</EntryPoint>
+          <Duration>4800</Duration>
+        </MainPicture>
+        <MainSound>
+          <Id>urn:uuid:cccccccc-0000-0000-0000-000000000012</Id>
+          <EditRate>48 1</EditRate>
+          <IntrinsicDuration>4800</IntrinsicDuration>
+        </MainSound>
+      </AssetList>
+    </Reel>
+  </ReelList>
+</CompositionPlaylist>
+"""
+
+
+def test_interop_cpl():
+    cpl = CPL().from_cpl_xml(INTEROP_CPL)
+    assert cpl.standard == 'Interop'
+    assert cpl.uuid == 'aaaaaaaa-0000-0000-0000-000000000001'
+    assert cpl.title == 'Test_FTR_F_EN-XX_51_2K_20140101_IOP_OV'
+    assert cpl.annotation == 'Interop feature'
+    assert cpl.kind == 'Feature'
+    assert cpl.issue_date == '2014-01-01T10:00:00+00:00'
+    assert cpl.content_version == 'aaaaaaaa-0000-0000-0000-0000000000ff'
+    assert (cpl.edit_rate_a, cpl.edit_rate_b) == (24, 1)
+
+    assert [(r.uuid, r.start) for r in cpl.reels] == [
+        ('aaaaaaaa-0000-0000-0000-000000000010', 0), ('aaaaaaaa-0000-0000-0000-000000000020', 1400)]
+    assert cpl.duration == 1400 + 1800
+    assert [a.kind for a in cpl.reels[0].assets] == ['picture', 'sound', 'subtitle']
+    picture = cpl.reels[0].assets[0]
+    assert picture.uuid == 'aaaaaaaa-0000-0000-0000-000000000011'
+    assert (picture.entry_point, picture.duration) == (100, 1400)
+    assert [a.duration for a in cpl.assets('picture')] == [1400, 1800]
+    assert len(cpl.assets('sound')) == 2
+    assert cpl.assets('subtitle')[0].key_id is None
+
+    assert cpl.key_ids == ['bbbbbbbb-0000-0000-0000-000000000001', 'bbbbbbbb-0000-0000-0000-000000000002',
+                           'bbbbbbbb-0000-0000-0000-000000000003']
+    assert cpl.encrypted
+    assert cpl.markers == []
+
+
+def test_smpte_cpl():
+    cpl = CPL().from_cpl_xml(SMPTE_CPL.encode('utf-8'))
+    assert cpl.standard == 'SMPTE'
+    assert cpl.uuid == 'cccccccc-0000-0000-0000-000000000001'
+    assert cpl.kind == 'Trailer'
+    assert cpl.annotation is None
+    assert cpl.content_version == 'cccccccc-0000-0000-0000-0000000000ff'
+    assert (cpl.edit_rate_a, cpl.edit_rate_b) == (48, 1)
+    assert cpl.duration == 4800
+    assert cpl.seconds == 100.0
+
+    assert len(cpl.reels) == 1
+    assert [a.kind for a in cpl.assets()] == ['markers', 'picture', 'sound']
+    assert [(m.label, m.offset, m.reel) for m in cpl.markers] == [('FFOC', 0, 0), ('LFOC', 4799, 0)]
+    assert cpl.key_ids == []
+    assert not cpl.encrypted
+
+
+def test_unknown_namespace():
+    with pytest.raises(Exception):
+        CPL().from_cpl_xml('<CompositionPlaylist xmlns="urn:other"/>')
+
+
+def test_key_index(tmpdir):
+    interop = CPL().from_cpl_xml(INTEROP_CPL)
+    smpte = CPL().from_cpl_xml(SMPTE_CPL)
+    other = CPL(uuid='dddddddd-0000-0000-0000-000000000001')
+    other.key_ids = ['bbbbbbbb-0000-0000-0000-000000000001']
+
+    index = CPLKeyIndex()
+    for cpl in (interop, smpte, other):
+        index.add(cpl)
+    assert len(index) == 3
+    assert index.cpls_for_key('urn:uuid:bbbbbbbb-0000-0000-0000-000000000001') == [interop.uuid, other.uuid]
+    assert index.cpls_for_key('bbbbbbbb-0000-0000-0000-000000000003') == [interop.uuid]
+    # A KDM must carry every key of a CPL to apply to it.
+    assert index.cpls_for_keys(['bbbbbbbb-0000-0000-0000-000000000001']) == [other.uuid]
+    assert index.cpls_for_keys(interop.key_ids) == [interop.uuid, other.uuid]
+
+    path = str(tmpdir.join('keys.json'))
+    index.save(path)
+    loaded = CPLKeyIndex.load(path)
+    assert loaded.keys_by_cpl == index.keys_by_cpl
+    assert loaded.cpls_for_key('bbbbbbbb-0000-0000-0000-000000000002') == [interop.uuid]
+
+    index.remove(interop.uuid)
+    assert index.cpls_for_key('bbbbbbbb-0000-0000-0000-000000000001') == [other.uuid]
+    assert index.cpls_for_key('bbbbbbbb-0000-0000-0000-000000000002') == []
+
+
+@pytest.mark.parametrize('xml', [INTEROP_CPL, SMPTE_CPL])
+def test_compact_cpl(xml):
+    cpl = CPL().from_cpl_xml(xml)
+    compact = CompactCPL().from_cpl_xml(xml)
+    assert not hasattr(compact, '__dict__')
+    for name in CompactCPL.__slots__:
+        assert getattr(compact, name) == getattr(cpl, name)
+    assert compact.assets() == cpl.assets()
+    assert str(compact) == str(cpl)
+    with pytest.raises(AttributeError):
+        compact.extra = True
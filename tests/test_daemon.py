@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - daemon control socket
+:author: Ronan Delacroix
+"""
+import os
+import socket
+import threading
+import pytest
+from dcitools.devices.doremi import daemon
+
+
+@pytest.fixture
+def socket_path(tmpdir):
+    return str(tmpdir.join('doremiapi.sock'))
+
+
+def test_command_through_daemon(simulator, socket_path):
+    doremi_daemon = daemon.DoremiDaemon(socket_path, timeout=5).start()
+    thread = threading.Thread(target=doremi_daemon.serve_forever)
+    thread.start()
+    try:
+        with daemon.DaemonClient(socket_path) as client:
+            assert client.available()
+            host, port = simulator.address
+            assert client.command(host, port, 'GetCPLList')['amount'] == 10
+            client.shutdown()
+    finally:
+        thread.join(5)
+    assert not os.path.exists(socket_path)
+
+
+def test_refuse_non_socket(socket_path):
+    open(socket_path, 'w').close()
+    with daemon.DaemonClient(socket_path) as client:
+        assert not client.available()
+        with pytest.raises(Exception):
+            client.command('127.0.0.1', 11730, 'GetCPLList')
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason='changing a socket owner needs root')
+def test_refuse_socket_of_another_user(socket_path):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(1)
+    try:
+        os.chown(socket_path, 4242, 4242)
+        with daemon.DaemonClient(socket_path, timeout=1) as client:
+            assert not client.available()
+            with pytest.raises(Exception) as e:
+                client.command('127.0.0.1', 11730, 'GetCPLList')
+            assert 'Refusing' in str(e.value)
+    finally:
+        listener.close()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - fleet host parsing and concurrent execution
+:author: Ronan Delacroix
+"""
+import socket
+import threading
+import time
+from dcitools.devices.doremi import fleet
+
+
+def test_parse_hosts_list_keeps_ports_and_duplicates():
+    hosts = fleet.parse_hosts('10.0.0.1, 10.0.0.2:11731,,10.0.0.1 ')
+    assert hosts == ['10.0.0.1', '10.0.0.2:11731', '10.0.0.1']
+
+
+def test_parse_hosts_range():
+    assert fleet.parse_hosts('172.17.10.0/30') == ['172.17.10.1', '172.17.10.2']
+    assert len(fleet.parse_hosts('172.17.10.7/24')) == 254
+
+
+def test_parse_hosts_file(tmpdir):
+    path = tmpdir.join('hosts.txt')
+    path.write('# screens\n10.0.0.1\n\n10.0.0.2:11731  # screen 2\n10.0.0.1\n')
+    assert fleet.parse_hosts(str(path)) == ['10.0.0.1', '10.0.0.2:11731', '10.0.0.1']
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_execute_aggregates_errors(simulator):
+    host, port = simulator.address
+    down = closed_port()
+    addresses = ['%s:%d' % (host, port), '%s:%d' % (host, down), host]
+    records = list(fleet.execute(addresses, 'GetCPLList', port=port, timeout=2))
+    assert len(records) == 3
+    by_status = sorted((r['status'], r['port']) for r in records)
+    assert by_status == [('error', down), ('success', port), ('success', port)]
+    for record in records:
+        if record['status'] == 'success':
+            assert record['result']['amount'] == 10
+        else:
+            assert record['message']
+            assert 'result' not in record
+
+
+def test_execute_one_deadline():
+    """
+    A server trickling its answer is never idle for a whole socket timeout, but is cut off at the deadline.
+    """
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def trickle():
+        conn, _ = listener.accept()
+        try:
+            for _ in range(50):
+                conn.send(b'\x06')
+                time.sleep(0.1)
+        except socket.error:
+            pass
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target=trickle)
+    thread.daemon = True
+    thread.start()
+    try:
+        record = fleet.execute_one(listener.getsockname(), 'GetCPLList', timeout=0.5)
+    finally:
+        listener.close()
+    assert record['status'] == 'error'
+    assert record['message'] == 'Deadline of 0.5s exceeded'
+    assert record['elapsed'] < 2
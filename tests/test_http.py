@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - HTTP gateway group fan-out
+:author: Ronan Delacroix
+"""
+import json
+from dcitools.devices.doremi import http
+
+
+def test_group_lists_every_host(simulator):
+    host, port = simulator.address
+    hosts = ['%s:%d' % (host, port), '%s:%d' % (host, port), 'localhost:%d' % port]
+    gateway = http.HTTPGateway(groups={'all': hosts}, timeout=5)
+    try:
+        document = json.loads(''.join(gateway.stream_group('all', 'GetCPLList', {})))
+    finally:
+        gateway.close()
+    assert document["servers"] == 3
+    assert document["errors"] == 0
+    assert sorted(r["host"] for r in document["results"]) == sorted([host, host, 'localhost'])
+    assert all(r["result"]["amount"] == 10 for r in document["results"])
+
+
+def test_server_outside_groups_is_refused(simulator):
+    host, port = simulator.address
+    gateway = http.HTTPGateway(groups={'all': ['%s:%d' % (host, port)]}, timeout=5)
+    try:
+        refused = gateway.server_request('localhost:%d' % port, 'GetCPLList')
+        assert refused["status"] == "error"
+        assert gateway.workers.workers == {}
+        answered = gateway.server_request('%s:%d' % (host, port), 'GetCPLList')
+        assert answered["status"] == "success"
+        assert list(gateway.workers.workers) == [(host, port)]
+    finally:
+        gateway.close()
+
+
+def test_extra_servers_are_allowed(simulator):
+    host, port = simulator.address
+    gateway = http.HTTPGateway(servers=['localhost:%d' % port], timeout=5)
+    try:
+        assert gateway.server_request('localhost:%d' % port, 'GetCPLList')["result"]["amount"] == 10
+    finally:
+        gateway.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - library index synchronisation
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import library
+from dcitools.devices.doremi import server as doremi_server
+from dcitools.devices.doremi.enums import ContentKind
+
+
+@pytest.fixture
+def index(tmpdir):
+    i = library.LibraryIndex(str(tmpdir.join('library.sqlite')))
+    yield i
+    i.close()
+
+
+def test_sync_adds_then_tombstones(simulator, server, index):
+    report = library.LibrarySync(server, index).sync()
+    assert len(report['cpl']['added']) == 10
+    assert index.uuids('cpl') == set(simulator.library.cpls)
+
+    cpl_uuid = sorted(simulator.library.cpls)[0]
+    del simulator.library.cpls[cpl_uuid]
+    report = library.LibrarySync(server, index).sync()
+    assert report['cpl'] == {"added": [], "removed": [cpl_uuid], "failed": [], "total": 9}
+    assert index.uuids('cpl', removed=True) == set([cpl_uuid])
+
+
+def test_failed_list_keeps_index(simulator, server, index):
+    library.LibrarySync(server, index).sync()
+    simulator.respond_GetCPLList = lambda args: {'response': 1}
+    report = library.LibrarySync(server, index).sync(kinds=('cpl', ))
+    assert 'error' in report['cpl']
+    assert index.uuids('cpl') == set(simulator.library.cpls)
+    assert not index.uuids('cpl', removed=True)
+
+
+def test_failed_info_fetched_again(simulator, server, index):
+    failing = sorted(simulator.library.cpls)[3]
+    respond = simulator.respond_GetCPLInfo2
+    simulator.respond_GetCPLInfo2 = lambda args: {'response': 1} if args['uuid'] == failing else respond(args)
+    report = library.LibrarySync(server, index).sync(kinds=('cpl', ))
+    assert report['cpl']['failed'] == [failing]
+    assert failing not in index.uuids('cpl')
+
+    simulator.respond_GetCPLInfo2 = respond
+    report = library.LibrarySync(server, index).sync(kinds=('cpl', ))
+    assert report['cpl']['added'] == [failing]
+    assert index.info('cpl', failing)['cpl_uuid'] == failing
+
+
+def test_record_decoding_stored_as_json(simulator, index):
+    host, port = simulator.address
+    srv = doremi_server.DoremiServer(host, port=port, decode_options={'record': True})
+    try:
+        library.LibrarySync(srv, index).sync(kinds=('cpl', ))
+    finally:
+        srv.disconnect()
+    cpl_uuid = sorted(simulator.library.cpls)[0]
+    title = index.info('cpl', cpl_uuid)['content_title_text']
+    assert title.rstrip('\x00') == simulator.library.cpls[cpl_uuid]['content_title_text']
+
+
+@pytest.mark.parametrize('text_mode', ['lazy', 'skip'])
+def test_cpls_without_text_translations(simulator, index, text_mode):
+    host, port = simulator.address
+    srv = doremi_server.DoremiServer(host, port=port, decode_options={'text_mode': text_mode})
+    try:
+        library.LibrarySync(srv, index).sync(kinds=('cpl', ))
+    finally:
+        srv.disconnect()
+    info = index.info('cpl', sorted(simulator.library.cpls)[0])
+    assert 'content_kind_text' not in info
+    kinds = dict((cpl.uuid, cpl.kind) for cpl in index.cpls())
+    assert kinds == dict((cpl_uuid, ContentKind.get_text(cpl['content_kind']))
+                         for cpl_uuid, cpl in simulator.library.cpls.items())
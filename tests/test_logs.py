@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - log harvesting checkpoints
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import logs
+
+
+@pytest.fixture
+def checkpoint(tmpdir):
+    return logs.LogCheckpoint(str(tmpdir.join('server.logs.json')))
+
+
+def test_harvest_resumes_after_last_record(simulator, server, checkpoint):
+    simulator.library.log_last_id['playout'] = 25
+    ids = [r["id"] for r in logs.LogHarvester(server, checkpoint, window=10).harvest('playout')]
+    assert ids == list(range(1, 26))
+    assert logs.LogCheckpoint(checkpoint.path).get('playout') == 25
+
+    simulator.library.log_last_id['playout'] = 30
+    ids = [r["id"] for r in logs.LogHarvester(server, checkpoint, window=10).harvest('playout')]
+    assert ids == list(range(26, 31))
+
+
+def test_harvest_consumer_crash_keeps_record(simulator, server, checkpoint):
+    simulator.library.log_last_id['playout'] = 25
+    records = logs.LogHarvester(server, checkpoint, window=10).harvest('playout')
+    with pytest.raises(ValueError):
+        try:
+            for record in records:
+                if record["id"] == 5:
+                    raise ValueError("consumer failure")
+        finally:
+            records.close()
+    assert logs.LogCheckpoint(checkpoint.path).get('playout') == 4
+
+    ids = [r["id"] for r in logs.LogHarvester(server, checkpoint, window=10).harvest('playout')]
+    assert ids[0] == 5
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - response message decoding
+:author: Ronan Delacroix
+"""
+import json
+import uuid
+import collections
+import pytest
+from tbx.bytes import bytes_to_int, bytes_to_uuid
+from dcitools.devices.doremi import commands
+from dcitools.devices.doremi import message
+from dcitools.devices.doremi import responses
+from dcitools.devices.doremi.enums import ContentKind, PlaybackState
+from dcitools.devices.doremi.message import ResponseBatch, ResponseElement as E
+from dcitools.devices.doremi.simulator import build_payload, encode_batch
+
+
+CPL_UUID = '0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0'
+KEY_UUID = '11111111-2222-3333-4444-555555555555'
+VERSION_UUID = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+
+CPL_INFO2 = build_payload(responses.GetCPLInfo2, {
+    'cpl_uuid': CPL_UUID,
+    'storage': 1,
+    'content_title_text': 'Test_FTR_F_EN-XX_51_2K_20140101_SMPTE_OV',
+    'content_kind': 1,
+    'duration': 172800,
+    'edit_rate_a': 24,
+    'edit_rate_b': 1,
+    'picture_encoding': 2,
+    'picture_width': 1998,
+    'picture_height': 1080,
+    'picture_encryption': 1,
+    'sound_encoding': 3,
+    'sound_channel_count': 6,
+    'sound_quantization_bits': 24,
+    'sound_encryption': 1,
+    'crypto_key_id_list': [KEY_UUID, VERSION_UUID],
+    'schemas': 2,
+    'stream_type': 0,
+    'complete': 1,
+    'frame_per_edit': 1,
+    'frame_rate_a': 24,
+    'frame_rate_b': 1,
+    'sound_sample_rate_a': 48000,
+    'sound_sample_rate_b': 1,
+    'sound_sampling_rate_a': 48000,
+    'sound_sampling_rate_b': 1,
+    'content_version_id': VERSION_UUID,
+    'properties1': 3,
+    'unknown_field': 7,
+    'response': 0,
+})
+
+SCHEDULE_INFO2 = bytes(bytearray(
+    [0, 0, 0, 0, 0, 0, 1, 2] +  # schedule_id
+    list(uuid.UUID(CPL_UUID).bytes) +  # spl_id
+    list(b'1030') +  # time
+    [0, 0, 0x1c, 0x20] +  # duration
+    [1] +  # status
+    [0, 0, 0, 0, 0, 0, 0, 5] +  # flags
+    list(b'Evening show') +  # annotation_text
+    [0]  # response
+))
+
+CPL_MARKER = build_payload(responses.GetCPLMarker, {
+    'markers': [{'label': 'FFOC', 'offset': 0}, {'label': 'LFOC', 'offset': 172799}, {'label': 'FFEC', 'offset': 96}],
+    'response': 0,
+})
+
+
+def parse_elements(definition, payload):
+    """
+    Reference parser, decoding elements one by one.
+    """
+    result = collections.OrderedDict()
+    for e in definition.elements:
+        result[e.name] = e.func(payload[e.start:e.end])
+        if e.text_translate:
+            result[e.name + '_text'] = e.text_translate.get(result[e.name], 'unknown value')
+    return result
+
+
+@pytest.mark.parametrize('definition, payload', [
+    (responses.GetCPLInfo2, CPL_INFO2),
+    (responses.GetScheduleInfo2, SCHEDULE_INFO2),
+    (responses.GetCPLMarker, CPL_MARKER),
+    (responses.GetCPLList, build_payload(responses.GetCPLList, {'amount': 2, 'item_length': 16,
+                                                                  'list': [CPL_UUID, KEY_UUID]})),
+    (responses.StatusSPL2, build_payload(responses.StatusSPL2, {'playblack_state': 3, 'spl_id': CPL_UUID,
+                                                                  'flags': 9, 'current_element_kdm_uuid': 4})),
+])
+def test_compiled_decoder_matches_element_parser(definition, payload):
+    assert definition.decoder is not None
+    assert commands.parse_message(definition, payload) == parse_elements(definition, payload)
+    if commands.PAYLOAD_VIEWS:
+        assert commands.parse_message(definition, memoryview(payload)) == parse_elements(definition, payload)
+
+
+def test_head_and_tail_fields():
+    result = commands.parse_message(responses.GetCPLInfo2, CPL_INFO2)
+    assert str(result['cpl_uuid']) == CPL_UUID
+    assert result['content_title_text'].rstrip('\x00') == 'Test_FTR_F_EN-XX_51_2K_20140101_SMPTE_OV'
+    assert result['content_kind'] == 1
+    assert result['content_kind_text'] == 'Feature'
+    assert (result['picture_width'], result['picture_height']) == (1998, 1080)
+    assert result['duration'] == 172800
+    assert [str(u) for u in result['crypto_key_id_list']] == [KEY_UUID, VERSION_UUID]
+    assert result['schemas_text'] == 'SMPTE'
+    assert result['complete'] == 1
+    assert (result['frame_rate_a'], result['frame_rate_b']) == (24, 1)
+    assert result['sound_sampling_rate_a'] == 48000
+    assert str(result['content_version_id']) == VERSION_UUID
+    assert result['properties1'] == 3
+    assert result['unknown_field'] == 7
+    assert result['response'] == 0
+
+
+def test_schedule_info():
+    result = commands.parse_message(responses.GetScheduleInfo2, SCHEDULE_INFO2)
+    assert result['schedule_id'] == 258
+    assert str(result['spl_id']) == CPL_UUID
+    assert result['time'] == '1030'
+    assert result['duration'] == 7200
+    assert result['status'] == 1
+    assert result['status_text'] == 'success'
+    assert result['flags'] == 5
+    assert result['annotation_text'] == 'Evening show'
+    assert result['response'] == 0
+
+
+def test_batch():
+    result = commands.parse_message(responses.GetCPLMarker, CPL_MARKER)
+    assert [(m['label'].rstrip('\x00'), m['offset']) for m in result['markers']] == [
+        ('FFOC', 0), ('LFOC', 172799), ('FFEC', 96)]
+    assert result['response'] == 0
+
+
+def test_short_payload_falls_back():
+    # Error responses may only carry the response code.
+    payload = b'\x05'
+    assert len(payload) < responses.GetCPLList.decoder.min_size
+    result = commands.parse_message(responses.GetCPLList, payload)
+    assert result == parse_elements(responses.GetCPLList, payload)
+    assert result['list'] == []
+    assert result['response'] == 5
+
+
+STATES = ResponseBatch('states', 0, -1, [
+    E('state', 0, 1, bytes_to_int, PlaybackState),
+    E('spl_id', 1, 17, bytes_to_uuid),
+    E('position', 17, 21, bytes_to_int),
+])
+
+STATE_ROWS = [
+    {'state': 2, 'spl_id': CPL_UUID, 'position': 120},
+    {'state': 3, 'spl_id': KEY_UUID, 'position': 0},
+    {'state': 9, 'spl_id': VERSION_UUID, 'position': 4000000000},
+]
+
+
+@pytest.fixture(params=[True, False] if message.ITER_UNPACK else [False], ids=lambda v: 'iter_unpack' if v else 'unpack_from')
+def iter_unpack(request, monkeypatch):
+    monkeypatch.setattr(message, 'ITER_UNPACK', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('batch, payload', [
+    (responses.GetCPLMarker.elements[0], CPL_MARKER[:-1]),
+    (STATES, encode_batch(STATES, STATE_ROWS)),
+    (STATES, encode_batch(STATES, [])),
+])
+def test_batch_modes_match_list(batch, payload, iter_unpack):
+    rows = batch.decode(payload, 'list')
+    assert rows == batch.func(payload)
+
+    columns = batch.decode(payload, 'columns')
+    assert list(columns.keys()) == batch.column_names
+    assert columns == collections.OrderedDict((name, [row[name] for row in rows]) for name in batch.column_names)
+
+    lazy_rows = batch.decode(payload, 'rows')
+    assert len(lazy_rows) == len(rows)
+    assert list(lazy_rows) == rows
+    assert lazy_rows[-2:] == rows[-2:]
+
+    records = batch.decode(payload, 'records')
+    assert records == rows
+    assert [r._asdict() for r in records] == rows
+
+
+@pytest.mark.parametrize('payload, rows', [
+    (encode_batch(STATES, STATE_ROWS), STATE_ROWS),
+    (encode_batch(STATES, []), []),
+])
+def test_batch_array_mode(payload, rows):
+    pytest.importorskip('numpy')
+    array = STATES.decode(payload, 'array')
+    assert len(array) == len(rows)
+    assert array['state'].tolist() == [row['state'] for row in rows]
+    assert array['position'].tolist() == [row['position'] for row in rows]
+    assert [str(uuid.UUID(bytes=bytes(u))) for u in array['spl_id']] == [row['spl_id'] for row in rows]
+
+
+def test_batch_mode_in_parse_message(iter_unpack):
+    result = commands.parse_message(responses.GetCPLMarker, CPL_MARKER, batch_mode='columns')
+    assert [label.rstrip('\x00') for label in result['markers']['label']] == ['FFOC', 'LFOC', 'FFEC']
+    assert result['markers']['offset'] == [0, 172799, 96]
+    assert result['response'] == 0
+
+
+STATUS_UNKNOWN_STATE = build_payload(responses.StatusSPL2, {'playblack_state': 7, 'spl_id': CPL_UUID})
+
+
+@pytest.mark.parametrize('definition, payload', [
+    (responses.GetCPLInfo2, CPL_INFO2),
+    (responses.GetScheduleInfo2, SCHEDULE_INFO2),
+    (responses.StatusSPL2, STATUS_UNKNOWN_STATE),
+])
+def test_text_modes_match_translations(definition, payload):
+    reference = parse_elements(definition, payload)
+    translated = [e.name for e in definition.elements if e.text_translate]
+    assert translated
+
+    eager = commands.parse_message(definition, payload, text_mode='eager')
+    lazy = commands.parse_message(definition, payload, text_mode='lazy')
+    skip = commands.parse_message(definition, payload, text_mode='skip')
+    lazy_record = commands.parse_message(definition, payload, text_mode='lazy', record=True)
+    assert eager == reference
+    for name in translated:
+        text = reference[name + '_text']
+        assert lazy[name] == reference[name]
+        assert lazy[name + '_text'] == text
+        assert lazy.get(name + '_text') == text
+        assert lazy_record[name + '_text'] == text
+        assert getattr(lazy_record, name + '_text') == text
+        assert skip[name] == reference[name]
+        assert type(skip[name]) is int
+        assert name + '_text' not in skip
+    assert [k for k in skip if k.endswith('_text')] == [k for k in reference
+                                                       if k.endswith('_text') and k[:-5] not in translated]
+
+
+def test_lazy_values_are_enum_members():
+    lazy = commands.parse_message(responses.GetCPLInfo2, CPL_INFO2, text_mode='lazy')
+    assert lazy['content_kind'] is ContentKind.FEATURE
+    assert lazy['content_kind'].text == 'Feature'
+    assert json.dumps(lazy['content_kind']) == '1'
+
+    unknown = commands.parse_message(responses.StatusSPL2, STATUS_UNKNOWN_STATE, text_mode='lazy')
+    assert type(unknown['playblack_state']) is int
+    assert unknown['playblack_state_text'] == 'unknown value'
+
+
+def test_text_enum_labels():
+    assert ContentKind.labels[128] == 'Live CPL'
+    assert ContentKind.get(2) is ContentKind.TRAILER
+    assert ContentKind.get(42) == 42
+    assert ContentKind.get_text(42) == 'unknown value'
+    assert PlaybackState.PAUSE == 3
+    assert PlaybackState.PAUSE.text == 'Pause'
+    assert responses.StatusSPL2.elements[0].text_translate == {0: 'Error/Unknown', 1: 'Stop', 2: 'Play', 3: 'Pause'}
+
+
+@pytest.mark.parametrize('mode', ['list', 'columns', 'rows', 'records'])
+def test_batch_text_modes(mode, iter_unpack):
+    payload = encode_batch(STATES, STATE_ROWS)
+    eager = STATES.decode(payload, 'list')
+    lazy = STATES.decode(payload, mode, text_mode='lazy')
+    skip = STATES.decode(payload, mode, text_mode='skip')
+    if mode == 'columns':
+        assert lazy['state'] == [row['state'] for row in eager]
+        assert 'state_text' not in lazy and 'state_text' not in skip
+        assert skip['state'] == [row['state'] for row in eager]
+        return
+    for row, lazy_row, skip_row in zip(eager, lazy, skip):
+        assert lazy_row['state'] == row['state']
+        assert skip_row['state'] == row['state']
+        assert lazy_row['state_text'] == row['state_text']
+        if mode == 'records':
+            # Records always have a '_text' field, resolved when read.
+            assert skip_row['state_text'] == row['state_text']
+        else:
+            assert 'state_text' not in skip_row
+
+
+@pytest.mark.parametrize('definition, payload', [
+    (responses.GetCPLInfo2, CPL_INFO2),
+    (responses.GetScheduleInfo2, SCHEDULE_INFO2),
+    (responses.GetCPLMarker, CPL_MARKER),
+    (responses.StatusSPL2, STATUS_UNKNOWN_STATE),
+    (responses.GetSchedulerEnable, b'\x01\x00'),  # Duplicate 'response' element
+    (responses.GetCPLList, b'\x05'),  # Element by element fallback
+])
+def test_records_match_dicts(definition, payload):
+    expected = commands.parse_message(definition, payload)
+    record = commands.parse_message(definition, payload, record=True)
+    assert isinstance(record, definition.record_class)
+    assert not hasattr(record, '__dict__')
+    assert list(record.keys()) == list(expected.keys())
+    for name, value in expected.items():
+        assert record[name] == value
+        assert getattr(record, name) == value
+    assert record == expected
+    assert record._asdict() == expected
+
+
+def test_batch_records_match_dicts(iter_unpack):
+    rows = commands.parse_message(responses.GetCPLMarker, CPL_MARKER)['markers']
+    records = commands.parse_message(responses.GetCPLMarker, CPL_MARKER, batch_mode='records', record=True)['markers']
+    assert [r.offset for r in records] == [row['offset'] for row in rows]
+    assert [dict(r.items()) for r in records] == rows
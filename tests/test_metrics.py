@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - command metrics
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import metrics
+
+
+@pytest.fixture
+def registry():
+    r = metrics.install(metrics.MetricsRegistry())
+    yield r
+    metrics.uninstall()
+
+
+def test_command_phases_observed(server, registry):
+    server.command('GetCPLList')
+    histograms, counters = registry.snapshot()
+    label = '%s:%s' % (server.host, server.port)
+    for phase in ('construct', 'send', 'wait', 'read', 'parse'):
+        assert histograms[(phase, 'GetCPLList', label)][2] == 1
+    assert counters[('bytes_in', 'GetCPLList', label)] > counters[('bytes_out', 'GetCPLList', label)]
+
+
+def test_errors_counted_and_rendered(simulator, server, registry):
+    simulator.faults = {'disconnect': 1.0}
+    with pytest.raises(Exception):
+        server.command('GetCPLList')
+    text = registry.render()
+    assert 'doremi_errors_total{command="GetCPLList"' in text
+    assert 'doremi_command_phase_seconds_bucket{phase="send"' in text
+
+
+def test_pipeline_errors_counted(simulator, server, registry):
+    simulator.faults = {'wrong_id': 1.0}
+    with pytest.raises(Exception):
+        server.pipeline(['GetCPLList', 'GetSPLList', 'GetProductInfo'])
+    histograms, counters = registry.snapshot()
+    assert counters[('errors', 'pipeline', '%s:%s' % (server.host, server.port))] == 1
+
+
+def test_pipeline_phases_observed_per_command(server, registry):
+    calls = ['GetCPLList', 'GetSPLList', 'GetProductInfo']
+    server.pipeline(calls)
+    histograms, counters = registry.snapshot()
+    label = '%s:%s' % (server.host, server.port)
+    for name in calls:
+        for phase in ('construct', 'send', 'wait', 'read', 'parse'):
+            assert histograms[(phase, name, label)][2] == 1
+        assert counters[('bytes_in', name, label)] > 0
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
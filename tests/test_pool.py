@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - connection pool retries and health checks
+:author: Ronan Delacroix
+"""
+import socket
+import pytest
+from dcitools.devices.doremi import pool
+
+
+@pytest.fixture
+def doremi_pool():
+    p = pool.DoremiPool(retries=2, backoff=0.01)
+    yield p
+    p.close()
+
+
+def drop_connections(simulator):
+    for connection in list(simulator.connections):
+        connection.shutdown(socket.SHUT_RDWR)
+
+
+def test_connection_reused(simulator, doremi_pool):
+    doremi_pool.command(simulator.address, 'GetProductInfo')
+    connection = list(doremi_pool.idle[simulator.address])[0][0]
+    doremi_pool.command(simulator.address, 'GetCPLList')
+    assert doremi_pool.idle[simulator.address][0][0] is connection
+
+
+def test_read_retried_on_stale_connection(simulator, doremi_pool):
+    doremi_pool.command(simulator.address, 'GetProductInfo')
+    drop_connections(simulator)
+    assert doremi_pool.command(simulator.address, 'GetCPLList')['amount'] == 10
+
+
+def test_write_not_retried_after_send(simulator, doremi_pool):
+    doremi_pool.command(simulator.address, 'GetProductInfo')
+    drop_connections(simulator)
+    count = simulator.requests_count
+    with pytest.raises(Exception):
+        doremi_pool.command(simulator.address, 'PauseSPL')
+    assert simulator.requests_count == count
+    doremi_pool.command(simulator.address, 'PauseSPL')
+
+
+def test_health_check_drops_stale_connection(simulator):
+    doremi_pool = pool.DoremiPool(health_check_interval=0, retries=0)
+    try:
+        doremi_pool.command(simulator.address, 'GetProductInfo')
+        drop_connections(simulator)
+        assert doremi_pool.command(simulator.address, 'GetCPLList')['amount'] == 10
+    finally:
+        doremi_pool.close()
+
+
+def test_backoff_after_connection_failure():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    address = listener.getsockname()
+    listener.close()
+    doremi_pool = pool.DoremiPool(retries=0, backoff=60)
+    with pytest.raises(socket.error):
+        doremi_pool.command(address, 'GetProductInfo')
+    with pytest.raises(socket.error) as e:
+        doremi_pool.command(address, 'GetProductInfo')
+    assert 'suspended' in str(e.value)
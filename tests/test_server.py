@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - DoremiServer commands and pipelines
+:author: Ronan Delacroix
+"""
+import pytest
+
+
+def test_pipeline_results_in_request_order(server):
+    cpls = server.command('GetCPLList')['list']
+    calls = [('GetCPLInfo2', (str(cpl_uuid), )) for cpl_uuid in cpls] + ['GetProductInfo']
+    results = server.pipeline(calls, window=3)
+    assert [r['cpl_uuid'] for r in results[:-1]] == cpls
+    assert 'product_name' in results[-1]
+
+
+def test_pipeline_wrong_id_closes_connection(simulator, server):
+    simulator.faults = {'wrong_id': 1.0}
+    with pytest.raises(Exception):
+        server.pipeline(['GetCPLList', 'GetSPLList', 'GetProductInfo'] * 5)
+    assert not server.connected
+
+    simulator.faults = {}
+    assert 'product_name' in server.command('GetProductInfo')
+    assert server.command('GetCPLList')['amount'] == 10
+
+
+
+def test_callable_command_reconnects(server):
+    server.disconnect()
+    assert server.GetCPLList()['amount'] == 10
+    assert server.connected
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - protocol simulator faults
+:author: Ronan Delacroix
+"""
+import socket
+import pytest
+from dcitools.devices.doremi import commands, requests, server as doremi_server
+
+
+def test_wrong_id_outside_pipeline_window(simulator):
+    simulator.faults = {'wrong_id': 1.0}
+    sock = socket.create_connection(simulator.address, 5)
+    try:
+        reader = commands.FrameReader(sock)
+        for i in range(5):
+            request_bin = commands.construct_message(requests.get('GetCPLList'))
+            request_id = commands.get_message_id(request_bin)
+            sock.sendall(request_bin)
+            key, response_id, payload, frame = reader.read()
+            distance = (response_id - request_id) % commands.MAX_REQUEST_ID
+            assert doremi_server.PIPELINE_WINDOW < distance < commands.MAX_REQUEST_ID - doremi_server.PIPELINE_WINDOW
+    finally:
+        sock.close()
+
+
+def test_wrong_id_fails_pipeline(simulator, server):
+    simulator.faults = {'wrong_id': 1.0}
+    with pytest.raises(Exception) as e:
+        server.pipeline(['GetCPLList'] * 20, window=20)
+    assert 'Unexpected response ID' in str(e.value)
+
+
+def test_error_fault(simulator, server):
+    simulator.faults = {'error': 1.0}
+    assert server.command('GetCPLList')['response'] == 1
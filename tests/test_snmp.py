@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - SNMP poller response mapping
+:author: Ronan Delacroix
+"""
+import pytest
+from pysnmp.proto.rfc1902 import ObjectName, OctetString, Integer
+from pysnmp.proto.rfc1905 import NoSuchObject, EndOfMibView
+from dcitools.devices.doremi import snmp
+
+
+@pytest.fixture
+def poller():
+    # The response callbacks need no SNMP engine.
+    return snmp.SnmpPoller.__new__(snmp.SnmpPoller)
+
+
+def scalar_var_binds(values):
+    return [(ObjectName(oid), values[name]) for name, oid in snmp.SCALAR_OIDS.items()]
+
+
+def test_get_mapping(poller):
+    result = {'host': 'test'}
+    var_binds = scalar_var_binds({
+        'software': OctetString('2.6.2-0'),
+        'firmware': OctetString('1.2'),
+        'serial': OctetString('H12345'),
+        'date': OctetString('2014-01-01 10:00:00'),
+        'projector_vendor': OctetString('Barco'),
+        'projector_model': OctetString('DP2K'),
+        'kdm': OctetString('11111111-2222-3333-4444-555555555555'),
+        'kdm_expiry': Integer(48),
+    })
+    poller._on_get(None, None, None, 0, 0, var_binds, result)
+    assert result['Software'] == '2.6.2-0'
+    assert result['Firmware'] == '1.2'
+    assert result['Serial'] == 'H12345'
+    assert result['Date'] == '2014-01-01 10:00:00'
+    assert result['Projector'] == 'Barco - DP2K'
+    assert result['CurrentKDM'] == '11111111-2222-3333-4444-555555555555'
+    assert result['CurrentKDMExpires'] is not None
+    assert 'error' not in result
+
+
+def test_get_missing_objects_are_none(poller):
+    result = {}
+    values = dict((name, NoSuchObject('')) for name in snmp.SCALAR_OIDS)
+    values['kdm'] = OctetString(snmp.BLANK_KDM)
+    poller._on_get(None, None, None, 0, 0, scalar_var_binds(values), result)
+    assert result['Software'] is None
+    assert result['Firmware'] is None
+    assert result['Serial'] is None
+    assert result['Date'] is None
+    assert result['Projector'] == 'Unknown - Unknown'
+    assert result['CurrentKDM'] is None
+    assert result['CurrentKDMExpires'] is None
+
+
+def test_get_error(poller):
+    result = {}
+    poller._on_get(None, None, 'requestTimedOut', 0, 0, [], result)
+    assert result == {'error': 'requestTimedOut'}
+
+
+def test_bulk_table_walk(poller):
+    raid, temperature = snmp.TABLE_OIDS.values()
+    result = {'RAID': {}, 'Temperature': {}}
+    table = [
+        [(ObjectName(raid + (1, 2, 1)), OctetString('ok')), (ObjectName(temperature + (1, 2, 1)), Integer(41))],
+        [(ObjectName(raid + (1, 2, 2)), OctetString('degraded')), (ObjectName(temperature + (1, 3, 1)), Integer(7))],
+    ]
+    assert poller._on_bulk(None, None, None, 0, 0, table, result)
+    assert result['RAID'] == {'1': {2: 'ok'}, '2': {2: 'degraded'}}
+    assert result['Temperature'] == {'1': {2: '41', 3: '7'}}
+
+    # Columns past their table (next OIDs, end of the MIB) end the walk.
+    table = [[(ObjectName(raid[:-1] + (10, 0)), OctetString('2.6')), (ObjectName(temperature), EndOfMibView(''))]]
+    assert not poller._on_bulk(None, None, None, 0, 0, table, result)
+    assert result['RAID'] == {'1': {2: 'ok'}, '2': {2: 'degraded'}}
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Parsers tests - show playlists
+:author: Ronan Delacroix
+"""
+import io
+import os
+import re
+import pytest
+from dcitools.parsers.cpl import CPL, CompactCPL
+from dcitools.parsers.spl import SPL, CompactSPL, write_spl_files
+
+
+COMPOSITION = """
+                <Event>
+                    <Id>urn:uuid:{event}</Id>
+                    <ElementList>
+                        <MainElement>
+                            <Composition>
+                                <Id>urn:uuid:{event}</Id>
+                                <AnnotationText>{title}</AnnotationText>
+                                <CompositionPlaylistId>urn:uuid:{uuid}</CompositionPlaylistId>
+                                <EditRate>{rate}</EditRate>
+                                <IntrinsicDuration>{duration}</IntrinsicDuration>
+                            </Composition>
+                        </MainElement>
+                    </ElementList>
+                </Event>"""
+
+HEADER = """
+    <Id>urn:uuid:5fb55233-b406-4ef8-b589-02d269a4ddb0</Id>
+    <AnnotationText>Evening show, screen 3</AnnotationText>
+    <ShowTitleText>Evening show</ShowTitleText>
+    <ContentVersion>
+        <Id>urn:uuid:69cf865f-cf09-459b-8ab0-ccc19ad092ea</Id>
+    </ContentVersion>"""
+
+
+def events(start, count):
+    return ''.join(COMPOSITION.format(event='00000000-0000-0000-0000-%012d' % i,
+                                      uuid='11111111-0000-0000-0000-%012d' % i, title='Trailer_%d_TLR' % i,
+                                      rate='48 1' if i % 2 else '24 1', duration=1000 + i)
+                   for i in range(start, start + count))
+
+
+SPL_XML = """<ShowPlaylist>{header}
+    <PackList>
+        <Pack>
+            <Id>urn:uuid:22222222-0000-0000-0000-000000000001</Id>
+            <EventList>{pack1}
+            </EventList>
+        </Pack>
+        <Pack>
+            <Id>urn:uuid:22222222-0000-0000-0000-000000000002</Id>
+            <EventList>{pack2}
+            </EventList>
+        </Pack>
+    </PackList>
+</ShowPlaylist>""".format(header=HEADER, pack1=events(0, 3), pack2=events(3, 4))
+
+SPL_XML_WITHOUT_PACKS = """<ShowPlaylist>{header}
+    <EventList>{events}
+    </EventList>
+</ShowPlaylist>""".format(header=HEADER, events=events(0, 5))
+
+
+def describe(cpls):
+    return [(c.uuid, c.title, c.duration, c.edit_rate_a, c.edit_rate_b) for c in cpls]
+
+
+@pytest.mark.parametrize('xml', [SPL_XML, SPL_XML_WITHOUT_PACKS])
+@pytest.mark.parametrize('source', [
+    lambda xml: xml,
+    lambda xml: xml.encode('utf-8'),
+    lambda xml: io.StringIO(xml),
+    lambda xml: io.BytesIO(xml.encode('utf-8')),
+])
+def test_iter_matches_from_spl_xml(xml, source):
+    expected = SPL().from_spl_xml(xml)
+    spl = SPL()
+    cpls = list(spl.iter_spl_xml(source(xml), feed_size=256))
+    assert len(cpls) == len(expected.cpls)
+    assert describe(cpls) == describe(expected.cpls)
+    assert spl.cpls == []
+    assert (spl.uuid, spl.title, spl.annotation, spl.content_version) == (
+        expected.uuid, expected.title, expected.annotation, expected.content_version)
+
+
+def test_iter_header_with_small_chunks():
+    spl = SPL()
+    cpls = spl.iter_spl_xml(SPL_XML, feed_size=7)
+    first = next(cpls)
+    assert first.uuid == '11111111-0000-0000-0000-000000000000'
+    assert spl.uuid == '5fb55233-b406-4ef8-b589-02d269a4ddb0'
+    assert spl.title == 'Evening show'
+    assert spl.annotation == 'Evening show, screen 3'
+    assert spl.content_version == 'urn:uuid:69cf865f-cf09-459b-8ab0-ccc19ad092ea'
+    assert len(list(cpls)) == 6
+
+
+def test_iter_header_without_compositions():
+    spl = SPL()
+    assert list(spl.iter_spl_xml('<ShowPlaylist>%s</ShowPlaylist>' % HEADER, feed_size=5)) == []
+    assert spl.title == 'Evening show'
+
+
+UUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def mask_generated_uuids(xml, spl):
+    """
+    Replace the uuids generated at each rendering (packs, events...) by a fixed value.
+    """
+    known = set([spl.uuid, spl.content_version] + [c.uuid for c in spl.cpls])
+    return UUID_PATTERN.sub(lambda m: m.group(0) if m.group(0) in known else 'generated', xml)
+
+
+def make_spls(count):
+    spls = []
+    for i in range(count):
+        cpls = [CPL(uuid='11111111-0000-0000-0000-%012d' % (i * 10 + j), title='Trailer_%d_%d_TLR' % (i, j),
+                    kind='Trailer', duration=1000 + j, edit_rate_a=24, edit_rate_b=1) for j in range(i + 1)]
+        spls.append(SPL(title='Show %d' % i, annotation='Screen %d' % i, cpls=cpls))
+    return spls
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_write_spl_files(tmpdir, processes):
+    spls = make_spls(5)
+    paths = write_spl_files(spls, str(tmpdir.join('spl')), processes=processes)
+    assert [os.path.basename(p) for p in paths] == ['%s.xml' % spl.uuid for spl in spls]
+    for spl, path in zip(spls, paths):
+        with io.open(path, encoding='utf-8') as f:
+            written = f.read()
+        assert mask_generated_uuids(written, spl) == mask_generated_uuids(spl.create_xml(), spl)
+
+
+def test_render_context_after_parsing():
+    spl = SPL().from_spl_xml(SPL_XML)
+    assert hasattr(spl, 'tree')
+    context = spl.render_context()
+    for name in ('tree', 'root', 'parser'):
+        assert name not in context
+    assert context['uuid'] == spl.uuid
+    assert len(context['cpls']) == 7
+    assert '<CompositionPlaylistID>urn:uuid:11111111-0000-0000-0000-000000000006</CompositionPlaylistID>' in \
+        spl.create_xml()
+
+
+def compact_copy(spl):
+    """
+    CompactSPL holding the same values as a SPL, with CompactCPL and CompactSPL events.
+    """
+    cpls = []
+    for c in spl.cpls:
+        if isinstance(c, SPL):
+            cpls.append(compact_copy(c))
+        else:
+            cpls.append(CompactCPL(c.uuid, c.title, c.kind, c.duration, c.edit_rate_a, c.edit_rate_b))
+    compact = CompactSPL(uuid=spl.uuid, title=spl.title, annotation=spl.annotation,
+                         content_version=spl.content_version, cpls=cpls)
+    compact.issue_date = spl.issue_date
+    return compact
+
+
+def test_compact_spl_renders_like_spl():
+    spl = make_spls(3)[2]
+    spl.cpls.insert(1, SPL(title='Intermission', annotation='External pack'))
+    compact = compact_copy(spl)
+    assert not hasattr(compact, '__dict__')
+    xml = compact.create_xml()
+    assert mask_generated_uuids(xml, compact) == mask_generated_uuids(spl.create_xml(), spl)
+    assert 'Unknown event' not in xml
+    assert '<PackName>Intermission</PackName>' in xml
+
+
+def test_compact_spl_parsing():
+    spl = SPL().from_spl_xml(SPL_XML)
+    compact = CompactSPL().from_spl_xml(SPL_XML)
+    assert all(isinstance(c, CompactCPL) for c in compact.cpls)
+    assert describe(compact.cpls) == describe(spl.cpls)
+    assert (compact.uuid, compact.title, compact.content_version) == (spl.uuid, spl.title, spl.content_version)
+    assert not hasattr(compact, 'tree')
+    assert sorted(compact.render_context()) == sorted(spl.render_context())
+    with pytest.raises(AttributeError):
+        compact.extra = True
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - wire traces
+:author: Ronan Delacroix
+"""
+import pytest
+from dcitools.devices.doremi import trace
+
+
+@pytest.fixture
+def recorder():
+    recorders = []
+
+    def install(r):
+        recorders.append(r)
+        return trace.install(r)
+    yield install
+    trace.uninstall()
+    for r in recorders:
+        r.close()
+
+
+def test_file_trace_records_commands(server, recorder, tmpdir):
+    path = str(tmpdir.join('doremi.trace'))
+    file_trace = recorder(trace.FileTrace(path, 64 * 1024))
+    server.command('GetCPLList')
+    server.pipeline(['GetProductInfo', 'GetSPLList'])
+    file_trace.close()
+
+    records = trace.read_trace(path)
+    # The pipeline sends both requests before reading the responses.
+    sent, received = trace.SENT, trace.RECEIVED
+    assert [r.direction for r in records] == [sent, received, sent, sent, received, received]
+    explained = [trace.explain(r) for r in records]
+    assert [e["message"] for e in explained[:2]] == ['GetCPLList', 'GetCPLList']
+    assert explained[1]["values"]["amount"] == 10
+    assert records[0].request_id == records[1].request_id
+
+
+def test_file_trace_wraps(server, recorder, tmpdir):
+    path = str(tmpdir.join('doremi.trace'))
+    file_trace = recorder(trace.FileTrace(path, 4096))
+    for i in range(40):
+        server.command('GetSPLList')
+    file_trace.close()
+
+    records = trace.read_trace(path)
+    seqs = [r.seq for r in records]
+    assert seqs[-1] == 79
+    assert seqs == list(range(seqs[0], 80))
+    assert 0 < len(records) < 80
+    assert all(trace.explain(r)["message"] == 'GetSPLList' for r in records)
+
+
+def test_file_trace_truncates_large_frames(tmpdir):
+    path = str(tmpdir.join('doremi.trace'))
+    file_trace = trace.FileTrace(path, 1024)
+    file_trace.record(trace.RECEIVED, '127.0.0.1', 11730, 1, b'\x00' * 4096)
+    file_trace.close()
+    records = trace.read_trace(path)
+    assert records[0].truncated
+    assert "error" in trace.explain(records[0])
+
+
+def test_file_trace_continues_existing_trace(tmpdir):
+    path = str(tmpdir.join('doremi.trace'))
+    for run in range(2):
+        file_trace = trace.FileTrace(path, 64 * 1024 if run == 0 else 1024)
+        file_trace.record(trace.SENT, '127.0.0.1', 11730, run, b'\x00' * 32)
+        file_trace.close()
+    records = trace.read_trace(path)
+    assert [(r.seq, r.request_id) for r in records] == [(0, 0), (1, 1)]
+
+
+def test_file_trace_never_overwrites_other_files(tmpdir):
+    path = tmpdir.join('notes.txt')
+    path.write('not a trace')
+    with pytest.raises(Exception):
+        trace.FileTrace(str(path), 1024)
+    assert path.read() == 'not a trace'
+    trace.FileTrace(str(path), 1024, overwrite=True).close()
+    assert trace.read_trace(str(path)) == []
+
+
+def test_ring_trace_save_and_replay(simulator, server, recorder, tmpdir):
+    ring = recorder(trace.RingTrace(1024 * 1024))
+    server.command('GetCPLList')
+    server.command('GetProductInfo')
+    trace.uninstall()
+    path = str(tmpdir.join('ring.trace'))
+    ring.save(path)
+
+    records = trace.read_trace(path)
+    assert len(records) == 4
+    results = list(trace.replay(records, *simulator.address))
+    assert [r["response"] for r in results] == ['GetCPLList', 'GetProductInfo']
+    assert all(r["match"] for r in results)
+
+
+def test_replay_pairs_reused_request_ids(simulator, server, recorder):
+    ring = recorder(trace.RingTrace(1024 * 1024))
+    server.command('GetCPLList')
+    server.command('GetProductInfo')
+    trace.uninstall()
+
+    # As after the request ID wrapped : both requests were traced with the same ID.
+    records = [r._replace(request_id=1) for r in ring]
+    results = list(trace.replay(records, *simulator.address))
+    assert [r["traced_response"] for r in results] == ['GetCPLList', 'GetProductInfo']
+    assert all(r["match"] for r in results)
+
+
+def test_not_a_trace(tmpdir):
+    path = str(tmpdir.join('other.bin'))
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * 64)
+    with pytest.raises(Exception):
+        trace.read_trace(path)
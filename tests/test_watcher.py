@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - playback watcher events
+:author: Ronan Delacroix
+"""
+from dcitools.devices.doremi import watcher
+
+
+def test_play_pause_events(simulator, server):
+    w = watcher.PlaybackWatcher(server)
+    events = w.poll()
+    assert [e.kind for e in events] == ['stop', 'current_schedule', 'next_schedule']
+
+    spl_id = sorted(simulator.library.spls)[0]
+    server.command('PlaySPL', spl_id)
+    kinds = [e.kind for e in w.poll()]
+    assert 'play' in kinds and 'playlist' in kinds
+
+    server.command('PauseSPL')
+    assert [e.kind for e in w.poll()] == ['pause']
+    assert w.poll() == []
+
+
+def test_error_event_once(simulator, server):
+    w = watcher.PlaybackWatcher(server)
+    w.poll()
+    simulator.faults = {'disconnect': 1.0}
+    assert [e.kind for e in w.poll()] == ['error']
+    assert w.poll() == []
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API tests - server worker coalescing
+:author: Ronan Delacroix
+"""
+import pytest
+from concurrent.futures import TimeoutError
+from dcitools.devices.doremi import worker
+
+
+@pytest.fixture
+def server_worker(simulator):
+    host, port = simulator.address
+    w = worker.ServerWorker(host, port, timeout=5)
+    yield w
+    w.close()
+
+
+def test_reads_coalesced_writes_not(simulator, server_worker):
+    simulator.latency = 0.05
+    reads = [server_worker.submit('GetCPLList') for i in range(5)]
+    writes = [server_worker.submit('PauseSPL') for i in range(3)]
+    assert all(f.result()['amount'] == 10 for f in reads)
+    for f in writes:
+        f.result()
+    assert server_worker.coalesced >= 1
+    assert server_worker.calls == 8 - server_worker.coalesced
+    assert server_worker.calls >= 4
+
+
+def test_worker_reconnects_after_failure(simulator, server_worker):
+    simulator.faults = {'disconnect': 1.0}
+    with pytest.raises(Exception):
+        server_worker.command('GetCPLList')
+    simulator.faults = {}
+    assert server_worker.command('GetCPLList')['amount'] == 10
+
+
+def test_read_after_write_not_coalesced_with_earlier_read(simulator, server_worker):
+    simulator.playback.play()
+    simulator.latency = 0.05
+    before = server_worker.submit('StatusSPL2', 0)
+    write = server_worker.submit('PauseSPL')
+    after = server_worker.submit('StatusSPL2', 0)
+    assert after is not before
+    assert before.result()['playblack_state'] == 2
+    write.result()
+    assert after.result()['playblack_state'] == 3
+    assert server_worker.calls == 3
+    assert server_worker.coalesced == 0
+
+
+def test_timed_out_write_never_runs(simulator):
+    simulator.playback.play()
+    simulator.latency = 0.3
+    host, port = simulator.address
+    w = worker.ServerWorker(host, port, timeout=0.5)
+    try:
+        cpls = sorted(simulator.library.cpls)
+        reads = [w.submit('GetCPLInfo2', cpl_uuid) for cpl_uuid in cpls[:5]]
+        with pytest.raises(TimeoutError):
+            w.command('PauseSPL')
+        for f in reads:
+            f.result()
+        assert w.command('StatusSPL2', 0)['playblack_state'] == 2
+        assert w.calls == 6
+    finally:
+        w.close()
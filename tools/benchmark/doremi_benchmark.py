@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+"""
+(c) 2014 Ronan Delacroix
+Doremi API Benchmark - protocol layer encode/decode and round-trip throughput
+:author: Ronan Delacroix
+"""
+import os
+import sys
+import gc
+import json
+import time
+import uuid
+import socket
+import argparse
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from dcitools.devices.doremi import commands, requests, responses
+from dcitools.devices.doremi.server import DoremiServer
+from dcitools.devices.doremi.simulator import DoremiSimulator, build_payload, build_frame
+from tbx.bytes import *
+
+
+BATCH_SIZE = 10000
+REGRESSION_THRESHOLD = 0.2  # 20% slower than baseline
+
+
+def sample_arguments(definition):
+    """
+    Arguments of a request, one per element : a random uuid, an integer, a boolean or a short text.
+    """
+    args = []
+    for e in definition.elements:
+        if e.func is uuid_to_bytes:
+            args.append(str(uuid.uuid4()))
+        elif e.func is int_to_bytes:
+            args.append(1)
+        elif e.func is bool_to_bytes:
+            args.append(True)
+        else:
+            args.append('benchmark')
+    return args
+
+
+def sample_values(definition, batch_size):
+    """
+    Response values filling lists and batches with `batch_size` items.
+    """
+    values = {}
+    for e in definition.elements:
+        if getattr(e, 'sub_elements', None):
+            values[e.name] = [dict((s.name, i if s.func is bytes_to_int else None) for s in e.sub_elements)
+                              for i in range(batch_size)]
+        elif e.func is bytes_to_uuid_list:
+            values[e.name] = [str(uuid.uuid4()) for i in range(batch_size)]
+    return values
+
+
+def measure(func, iterations, repeat=5):
+    """
+    Time `func` : `repeat` rounds of `iterations` calls, plus a traced run for allocations.
+
+    :return: a dict with ops/sec, p50/p99 latency (microseconds, per call) and allocations per call.
+    """
+    func()  # Warm up (lazy imports, compiled decoders...)
+    gc.collect()
+    gc.disable()
+    samples = []
+    try:
+        for r in range(repeat):
+            for i in range(iterations):
+                start = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    samples.sort()
+    total = sum(samples)
+
+    traced = max(1, min(iterations, 100))
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peak_start = tracemalloc.get_traced_memory()[0]
+        keep = [func() for i in range(traced)]  # Results are kept so that allocations stay visible
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    size = sum(s.size_diff for s in stats if s.size_diff > 0)
+    del keep
+
+    return {
+        "calls": len(samples),
+        "ops_per_sec": round(len(samples) / total, 1) if total else None,
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 2),
+        "alloc_blocks_per_call": round(float(blocks) / traced, 1),
+        "alloc_bytes_per_call": round(float(size) / traced, 1),
+        "peak_bytes": peak - peak_start,
+    }
+
+
+def bench_construct(iterations):
+    results = {}
+    for definition in requests.REQUESTS:
+        args = sample_arguments(definition)
+        results[definition.name] = measure(lambda: commands.construct_message(definition, *args), iterations)
+    return results
+
+
+def bench_parse(iterations, batch_size=BATCH_SIZE):
+    results = {}
+    for definition in responses.RESPONSES:
+        payload = build_payload(definition, {})
+        results[definition.name] = measure(lambda: commands.parse_message(definition, payload), iterations)
+
+        values = sample_values(definition, batch_size)
+        if values:
+            payload = build_payload(definition, values)
+            name = '%s[%d]' % (definition.name, batch_size)
+            results[name] = measure(lambda: commands.parse_message(definition, payload), max(1, iterations // 100))
+            for mode in ('columns', 'rows', 'array') if any(getattr(e, 'sub_elements', None) for e in definition.elements) else ():
+                try:
+                    results['%s:%s' % (name, mode)] = measure(
+                        lambda: commands.parse_message(definition, payload, batch_mode=mode), max(1, iterations // 100))
+                except ImportError:
+                    pass  # numpy is optional
+    return results
+
+
+def bench_explain(iterations):
+    results = {}
+    for kind, definition in (('Request', requests.GetCPLInfo2), ('Response', responses.GetCPLInfo2),
+                             ('Response', responses.GetCPLList)):
+        if kind == 'Request':
+            frame = commands.construct_message(definition, *sample_arguments(definition))
+        else:
+            frame = build_frame(definition.key, 1, build_payload(definition, sample_values(definition, 100)))
+        results['%s %s' % (definition.name, kind)] = measure(lambda: commands.explain_klv(frame), iterations)
+    return results
+
+
+def bench_roundtrip(iterations, latency=0.0):
+    results = {}
+    with DoremiSimulator(latency=latency) as sim:
+        server = DoremiServer(*sim.address)
+        uuids = [str(u) for u in server.command('GetCPLList')['list']]
+        cases = (
+            ('GetAPIProtocolVersion', ()),
+            ('GetCPLList', ()),
+            ('GetCPLInfo2', (uuids[0],)),
+            ('StatusSPL2', (0,)),
+        )
+        for name, args in cases:
+            results[name] = measure(lambda: server.command(name, *args), iterations)
+        window = uuids * (max(1, iterations // len(uuids)))
+        result = measure(lambda: server.pipeline([('GetCPLInfo2', (u,)) for u in window]), 1)
+        result["commands_per_call"] = len(window)
+        results['pipeline GetCPLInfo2'] = result
+        server.close()
+    return results
+
+
+SUITES = {
+    'construct': bench_construct,
+    'parse': bench_parse,
+    'explain': bench_explain,
+    'roundtrip': bench_roundtrip,
+}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    List benchmarks whose throughput dropped by more than `threshold` compared to a baseline result file.
+    """
+    regressions = []
+    for suite, cases in results["suites"].items():
+        for name, result in cases.items():
+            old = baseline.get("suites", {}).get(suite, {}).get(name)
+            if not old or not old.get("ops_per_sec") or not result.get("ops_per_sec"):
+                continue
+            ratio = result["ops_per_sec"] / old["ops_per_sec"]
+            if ratio < 1 - threshold:
+                regressions.append((suite, name, old["ops_per_sec"], result["ops_per_sec"], ratio))
+    return regressions
+
+
+def render_text(results):
+    lines = []
+    for suite, cases in sorted(results["suites"].items()):
+        lines.append('== %s' % suite)
+        lines.append('%-48s %12s %10s %10s %10s %12s' % ('benchmark', 'ops/sec', 'p50 us', 'p99 us', 'blocks', 'bytes'))
+        for name, r in sorted(cases.items()):
+            lines.append('%-48s %12s %10s %10s %10s %12s' % (
+                name, r["ops_per_sec"], r["p50_us"], r["p99_us"], r["alloc_blocks_per_call"], r["alloc_bytes_per_call"]))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the Doremi API protocol layer.')
+    parser.add_argument('suites', nargs='*', help='Suites to run among %s (default: all).' % ', '.join(sorted(SUITES)))
+    parser.add_argument('--iterations', type=int, default=1000, help='Calls per round of each benchmark.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated server latency (roundtrip suite).')
+    parser.add_argument('--output', help='Write JSON results to this file.')
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help='Format of the standard output.')
+    parser.add_argument('--baseline', help='JSON results to compare with. Exits with code 1 on regression.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='Tolerated throughput drop ratio.')
+    args = parser.parse_args()
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error("Unknown suite '%s'" % suite)
+
+    results = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "host": socket.gethostname(),
+        "iterations": args.iterations,
+        "suites": {},
+    }
+    for suite in args.suites or sorted(SUITES.keys()):
+        if suite == 'roundtrip':
+            results["suites"][suite] = SUITES[suite](args.iterations, latency=args.latency)
+        else:
+            results["suites"][suite] = SUITES[suite](args.iterations)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.format == 'json':
+        print(json.dumps(results, indent=1, sort_keys=True))
+    else:
+        print(render_text(results))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for suite, name, old, new, ratio in regressions:
+            print("REGRESSION %s/%s : %s -> %s ops/sec (%d%%)" % (suite, name, old, new, (ratio - 1) * 100))
+        exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()